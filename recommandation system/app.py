@@ -1,16 +1,125 @@
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
+import metrics
+from catalog import ItemCatalog, Recommendation
+from filters import GenreIndex
+from genre_features import GenreFeaturizer
+from model_store import load_model, save_model, sparse_matrix
+from query_cache import QueryCache
+from topk import top_k, top_k_rows
+
+# pandas and sklearn are imported where they are needed (fitting, the
+# DataFrame views), so serving a saved model only needs NumPy
+
 class MovieRecommender:
-    def __init__(self):
-        self.movies = self.create_sample_data()
-        self.vectorizer = TfidfVectorizer(stop_words='english')
-        self.genre_matrix = self.vectorizer.fit_transform(self.movies['genres'])
+    def __init__(self, cache_size=1024, cache_ttl=300.0, similar_items_top_n=0, source=None):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        # source is any object with a movies() method, e.g. a FileDataSource
+        movies = source.movies() if source is not None else self.create_sample_data()
+        vectorizer = TfidfVectorizer(stop_words='english')
+        genre_matrix = vectorizer.fit_transform(movies['genres'])
+        catalog = ItemCatalog.from_lists(movies['title'], movies['genres'])
+        self._setup(catalog, GenreFeaturizer.from_tfidf(vectorizer, genre_matrix),
+                    GenreIndex.from_matrix(vectorizer.vocabulary_, genre_matrix),
+                    cache_size, cache_ttl)
+        self._vectorizer = vectorizer
+        self._genre_matrix = genre_matrix
+        if similar_items_top_n:
+            self.build_similar_items(similar_items_top_n)
+
+    def _setup(self, catalog, featurizer, genre_index, cache_size, cache_ttl):
+        self.catalog = catalog
+        self.featurizer = featurizer
+        self.genre_index = genre_index
+        self.cache = QueryCache(max_size=cache_size, ttl=cache_ttl)
+        self.similar_items = None
+        self.similar_scores = None
+        self._vectorizer = None
+        self._genre_matrix = None
+
+    @property
+    def vectorizer(self):
+        """The fitted TfidfVectorizer; a loaded model rebuilds it on first access"""
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+
+            vectorizer = TfidfVectorizer(stop_words='english')
+            vectorizer.vocabulary_ = dict(self.featurizer.vocabulary)
+            vectorizer.idf_ = self.featurizer.idf
+            self._vectorizer = vectorizer
+        return self._vectorizer
+
+    @property
+    def genre_matrix(self):
+        """The sparse TF-IDF item matrix; a loaded model maps it on first access"""
+        if self._genre_matrix is None:
+            self._genre_matrix = sparse_matrix(*self._genre_parts)
+        return self._genre_matrix
+
+    @property
+    def movies(self):
+        """The catalog as a title / genres DataFrame, built on each access"""
+        import pandas as pd
+
+        return pd.DataFrame({'title': self.catalog.titles.tolist(),
+                             'genres': self.catalog.genres.tolist()})
+
+    @property
+    def title_index(self):
+        return self.catalog.index
+
+    def save(self, path):
+        """Save the fitted model so load() can skip the TF-IDF fit
+
+        Besides the sparse genre matrix, the dense item vectors and genre
+        posting lists are stored as they are served, so loading maps them
+        instead of rebuilding them.
+        """
+        arrays = {
+            'idf': self.featurizer.idf,
+            'item_vectors': self.featurizer.item_vectors,
+            'genre_index.postings': self.genre_index.postings,
+            'genre_index.offsets': self.genre_index.offsets,
+            **self.catalog.arrays(),
+        }
+        if self.similar_items is not None:
+            arrays['similar_items'] = self.similar_items
+            arrays['similar_scores'] = self.similar_scores
+        save_model(
+            path, 'MovieRecommender',
+            arrays=arrays,
+            matrices={'genre_matrix': self.genre_matrix},
+            meta={
+                'vocabulary': {token: int(i) for token, i in self.featurizer.vocabulary.items()},
+            },
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True, cache_size=1024, cache_ttl=300.0):
+        """Load a model written by save(), memory-mapped by default
+
+        Only NumPy is needed: the genre matrix and vectorizer are rebuilt
+        lazily if something asks for them.
+        """
+        manifest, arrays, shapes = load_model(path, 'MovieRecommender', mmap, sparse=False)
+        vocabulary = manifest['meta']['vocabulary']
+        catalog = ItemCatalog.from_arrays(arrays)
+        featurizer = GenreFeaturizer(vocabulary, arrays['idf'], arrays['item_vectors'])
+        genre_index = GenreIndex(vocabulary, arrays['genre_index.postings'],
+                                 arrays['genre_index.offsets'], len(catalog))
+
+        recommender = cls.__new__(cls)
+        recommender._setup(catalog, featurizer, genre_index, cache_size, cache_ttl)
+        recommender._genre_parts = (arrays, 'genre_matrix', shapes['genre_matrix'])
+        recommender.similar_items = arrays.get('similar_items')
+        recommender.similar_scores = arrays.get('similar_scores')
+        return recommender
         
     def create_sample_data(self):
         """Create a sample dataset of movies with genres"""
+        import pandas as pd
+
         data = {
             'title': [
                 'The Shawshank Redemption', 'The Godfather', 'The Dark Knight', 
@@ -58,28 +167,119 @@ class MovieRecommender:
         preferences = input("\nEnter your preferred genres (comma-separated, e.g., Action, Drama, Sci-Fi): ")
         return preferences.strip()
     
-    def recommend_movies(self, user_preferences, top_n=5):
-        """Recommend movies based on user preferences"""
-        # Vectorize user preferences
-        user_vector = self.vectorizer.transform([user_preferences])
-        
-        # Calculate similarity scores
-        similarity_scores = cosine_similarity(user_vector, self.genre_matrix).flatten()
-        
-        # Get top N recommendations
-        top_indices = similarity_scores.argsort()[-top_n:][::-1]
-        
-        recommendations = []
-        for idx in top_indices:
-            movie = self.movies.iloc[idx]
-            recommendations.append({
-                'title': movie['title'],
-                'genres': movie['genres'],
-                'similarity_score': similarity_scores[idx]
-            })
-        
-        return recommendations
-    
+    def canonical_query(self, user_preferences):
+        """Normalise a preference string into a cache key
+
+        TF-IDF only sees the bag of known tokens, so "Sci-Fi, Action" and
+        "action sci-fi" map to the same key while repeats still count.
+        """
+        return tuple(sorted(self.featurizer.tokens(user_preferences)))
+
+    def recommend_movies(self, user_preferences, top_n=5, item_filter=None):
+        """Recommend movies based on user preferences
+
+        item_filter is an optional filters.ItemFilter, e.g. "must be a
+        Comedy" or "not these already watched ids"; it is applied before
+        ranking, so top_n places are still filled when enough movies pass.
+        """
+        return self.recommend_batch([user_preferences], top_n, [item_filter])[0]
+
+    def recommend_batch(self, preferences, top_n=5, filters=None):
+        """Recommend for many preference strings with one vectorized scoring pass
+
+        filters is an optional list of ItemFilters (or None) parallel to
+        preferences.
+        """
+        with metrics.profiled('content'), metrics.timer('content.recommend'):
+            return self._recommend_batch(preferences, top_n, filters or [None] * len(preferences))
+
+    def _recommend_batch(self, preferences, top_n, filters):
+        with metrics.timer('content.cache'):
+            keys = [(self.canonical_query(query), top_n, item_filter)
+                    for query, item_filter in zip(preferences, filters)]
+            results = [self.cache.get(key) for key in keys]
+        missing = [i for i, cached in enumerate(results) if cached is None]
+        metrics.observe('content.batch_size', len(preferences))
+        metrics.count('content.cache_hits', len(preferences) - len(missing))
+        metrics.count('content.cache_misses', len(missing))
+
+        if missing:
+            # Vectorize user preferences from the tokens already in the cache keys
+            with metrics.timer('content.vectorize'):
+                user_vectors = self.featurizer.transform_tokens([keys[i][0] for i in missing])
+
+            ranked = {}
+            unfiltered = [row for row, i in enumerate(missing) if filters[i] is None]
+            if unfiltered:
+                # Calculate similarity scores
+                with metrics.timer('content.similarity'):
+                    similarity_scores = self.featurizer.similarity(user_vectors[unfiltered])
+                metrics.count('content.candidates_scored', similarity_scores.size)
+
+                # Get top N recommendations
+                with metrics.timer('content.top_k'):
+                    top_indices = top_k_rows(similarity_scores, top_n)
+                top_scores = np.take_along_axis(similarity_scores, np.maximum(top_indices, 0),
+                                                axis=1)
+                ranked.update(zip(unfiltered, zip(top_indices, top_scores)))
+
+            for row, i in enumerate(missing):
+                if filters[i] is not None:
+                    with metrics.timer('content.filtered'):
+                        ranked[row] = self._filtered(user_vectors[row], filters[i], top_n)
+
+            # Resolve metadata for the final ids only; the cache keeps
+            # immutable (item, title, genres, score) rows
+            for row, i in enumerate(missing):
+                results[i] = self.catalog.rows(*ranked[row])
+                self.cache.put(keys[i], results[i])
+
+        return [[Recommendation(*row) for row in rows] for rows in results]
+
+    def _filtered(self, vector, item_filter, top_n):
+        """Top-n (ids, scores) of one query vector among the movies a filter allows
+
+        With a genre constraint only the movies on its posting lists are
+        scored, so the cost follows the filter's selectivity.
+        """
+        candidates, excluded = item_filter.resolve(
+            len(self.catalog), self.catalog.lookup, self.genre_index)
+        if candidates is None:
+            scores = self.featurizer.similarity(vector)
+            scores[excluded] = -np.inf
+        else:
+            scores = self.featurizer.similarity(vector, candidates)
+        metrics.count('content.candidates_scored', len(scores))
+        top = top_k(scores, top_n)
+        return (top if candidates is None else candidates[top]), scores[top]
+
+    def build_similar_items(self, top_n=10, block_size=1024):
+        """Precompute each movie's top-N most similar movies (itself excluded)"""
+        item_vectors = self.featurizer.item_vectors
+        n_movies = len(item_vectors)
+        top_n = min(top_n, n_movies - 1)
+        self.similar_items = np.empty((n_movies, top_n), dtype=np.int32)
+        self.similar_scores = np.empty((n_movies, top_n), dtype=np.float32)
+        for start in range(0, n_movies, block_size):
+            block = self.featurizer.similarity(item_vectors[start:start + block_size])
+            block[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf
+            top = top_k_rows(block, top_n)
+            self.similar_items[start:start + len(block)] = top
+            self.similar_scores[start:start + len(block)] = np.take_along_axis(block, top, axis=1)
+
+    def more_like_this(self, title, top_n=5):
+        """Movies most similar to a given title"""
+        idx = self.catalog.id_of(title)
+        if self.similar_items is not None and top_n <= self.similar_items.shape[1]:
+            indices = self.similar_items[idx, :top_n]
+            scores = self.similar_scores[idx, :top_n]
+        else:
+            similarity_scores = self.featurizer.similarity(self.featurizer.item_vectors[idx])
+            indices = top_k(similarity_scores, top_n, exclude=[idx])
+            scores = similarity_scores[indices]
+
+        return self.catalog.records(indices, scores)
+
     def display_recommendations(self, recommendations):
         """Display the recommendations in a formatted way"""
         print(f"\n{'='*60}")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Offline batch job: top-N recommendations for every user of a saved
+collaborative model, streamed to chunked output files
+
+    python batch_job.py --model models/collaborative --output out/ --top-n 10 --workers 8
+
+Users are split into chunks of --chunk-users rows. Each worker process
+loads the memory-mapped model once (so all workers share its pages),
+scores a chunk in blocks of --block-users with the model's batched scorer
+and writes the chunk's part file itself:
+
+    part-00000.npz      user_rows, items and scores arrays in the model's
+                        id space; items are -1 and scores NaN past a
+                        user's last recommendation (see read_results)
+    part-00000.parquet  user, rank, title, score rows (needs pyarrow)
+
+A part file only appears, atomically, once it is complete, so rerunning
+the same command after a crash resumes with the missing chunks. job.json
+records the settings, and a rerun with different ones is refused.
+
+Memory per worker is one chunk's results plus one block's scores.
+Neighbourhood models are fastest here when saved with a
+ShardedNeighborIndex, whose precomputed neighbour table turns each user's
+neighbour search into a lookup. With several workers, limit BLAS threads
+(e.g. OMP_NUM_THREADS=1) so workers x threads does not exceed the cores.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from collaborative_filtering import CollaborativeRecommender
+from data_sources import Progress, report_progress
+
+FORMATS = ('npz', 'parquet')
+JOB = 'job.json'
+
+_job = {}
+
+
+def _load_job(model_path):
+    """Process-pool initializer: map the saved model once per worker"""
+    _job['recommender'] = CollaborativeRecommender.load(model_path)
+
+
+def part_path(output, index, fmt):
+    return os.path.join(output, f'part-{index:05d}.{fmt}')
+
+
+def score_users(recommender, user_rows, top_n, block_users=4096):
+    """Padded (len(user_rows) x top_n) item id and score arrays for stored users"""
+    items = np.full((len(user_rows), top_n), -1, dtype=np.int32)
+    scores = np.full((len(user_rows), top_n), np.nan, dtype=np.float32)
+    for start in range(0, len(user_rows), block_users):
+        ranked = recommender.scorer.recommend_batch(user_rows[start:start + block_users], top_n)
+        for row, (ids, values) in enumerate(ranked, start):
+            items[row, :len(ids)] = ids
+            scores[row, :len(ids)] = values
+    return items, scores
+
+
+def _write_parquet(path, ratings, user_rows, items, scores):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("writing Parquet files requires pyarrow") from e
+    users, ranks = np.nonzero(items >= 0)
+    table = pa.table({
+        'user': [ratings.user_ids[row] for row in user_rows[users]],
+        'rank': (ranks + 1).astype(np.int16),
+        'title': [ratings.item_titles[item] for item in items[users, ranks]],
+        'score': scores[users, ranks],
+    })
+    pq.write_table(table, path)
+
+
+def _run_chunk(index, start, stop, output, top_n, block_users, fmt):
+    """Score users start:stop and write their part file; runs in a worker"""
+    recommender = _job['recommender']
+    user_rows = np.arange(start, stop, dtype=np.int64)
+    items, scores = score_users(recommender, user_rows, top_n, block_users)
+    path = part_path(output, index, fmt)
+    # Write under a temporary name so a part file is never seen half-written
+    partial = path + '.tmp'
+    if fmt == 'npz':
+        with open(partial, 'wb') as f:
+            np.savez(f, user_rows=user_rows, items=items, scores=scores)
+    else:
+        _write_parquet(partial, recommender.ratings, user_rows, items, scores)
+    os.replace(partial, path)
+    return stop - start
+
+
+def _check_settings(output, settings):
+    """Record the job settings, or check them against those of an earlier run"""
+    path = os.path.join(output, JOB)
+    if not os.path.exists(path):
+        with open(path, 'w') as f:
+            json.dump(settings, f)
+        return
+    with open(path) as f:
+        previous = json.load(f)
+    if previous != settings:
+        raise ValueError(f"{output} holds the results of another job ({previous}); "
+                         f"use a new output directory")
+
+
+def run_job(model_path, output, top_n=10, chunk_users=100_000, n_workers=None, fmt='npz',
+            block_users=4096, progress=None):
+    """Write top-n recommendations for every user of a saved model to output
+
+    Chunks whose part file already exists are skipped, so calling this
+    again with the same arguments resumes an interrupted run. progress is
+    called with throughput stats after every chunk (see data_sources).
+    Returns the job settings with chunk counts and throughput.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown output format: {fmt}")
+    recommender = CollaborativeRecommender.load(model_path)
+    n_users = recommender.ratings.n_users
+    settings = {
+        'model': os.path.abspath(model_path),
+        'n_users': n_users,
+        'n_items': recommender.ratings.n_items,
+        'top_n': top_n,
+        'chunk_users': chunk_users,
+        'format': fmt,
+    }
+    os.makedirs(output, exist_ok=True)
+    _check_settings(output, settings)
+
+    chunks = [(index, start, min(start + chunk_users, n_users))
+              for index, start in enumerate(range(0, n_users, chunk_users))]
+    todo = [chunk for chunk in chunks if not os.path.exists(part_path(output, chunk[0], fmt))]
+    tracker = Progress('users', progress)
+    n_workers = min(n_workers or os.cpu_count() or 1, max(len(todo), 1))
+    if n_workers == 1:
+        _job['recommender'] = recommender
+        try:
+            for chunk in todo:
+                tracker.update(_run_chunk(*chunk, output, top_n, block_users, fmt))
+        finally:
+            _job.clear()
+    else:
+        with ProcessPoolExecutor(n_workers, initializer=_load_job,
+                                 initargs=(model_path,)) as pool:
+            futures = [pool.submit(_run_chunk, *chunk, output, top_n, block_users, fmt)
+                       for chunk in todo]
+            for future in as_completed(futures):
+                tracker.update(future.result())
+    stats = tracker.stats()
+    return {**settings, 'chunks': len(chunks), 'written': len(todo),
+            'skipped': len(chunks) - len(todo), 'users_scored': stats['rows'],
+            'elapsed': stats['elapsed'], 'rate': stats['rate']}
+
+
+def read_results(output):
+    """Yield (user_rows, items, scores) per part file of a finished npz job, in user order"""
+    with open(os.path.join(output, JOB)) as f:
+        settings = json.load(f)
+    if settings['format'] != 'npz':
+        raise ValueError(f"{output} holds {settings['format']} results")
+    n_chunks = -(-settings['n_users'] // settings['chunk_users'])
+    for index in range(n_chunks):
+        with np.load(part_path(output, index, 'npz')) as part:
+            yield part['user_rows'], part['items'], part['scores']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-N recommendations for all users")
+    parser.add_argument('--model', required=True,
+                        help="directory written by CollaborativeRecommender.save")
+    parser.add_argument('--output', required=True, help="directory for the part files")
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--chunk-users', type=int, default=100_000, help="users per part file")
+    parser.add_argument('--block-users', type=int, default=4096,
+                        help="users per scoring call inside a chunk")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes")
+    parser.add_argument('--format', choices=FORMATS, default='npz')
+    args = parser.parse_args()
+
+    result = run_job(args.model, args.output, args.top_n, args.chunk_users, args.workers,
+                     args.format, args.block_users, report_progress)
+    print(f"{result['written']} chunks written, {result['skipped']} already done; "
+          f"{result['users_scored']:,} users in {result['elapsed']:.1f}s "
+          f"({result['rate'] * 3600:,.0f} users/hour)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Benchmark: offline batch job throughput (users/hour) versus one
+recommend_movies call per user
+"""
+
+import os
+import tempfile
+import time
+
+from batch_job import run_job
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from neighbors import ShardedNeighborIndex
+from synthetic_data import synthetic_ratings
+
+
+def per_user_rate(recommender, n=200):
+    users = recommender.ratings.user_ids[:n]
+    start = time.perf_counter()
+    for user in users:
+        recommender.recommend_movies(10, user)
+    return n / (time.perf_counter() - start)
+
+
+def benchmark(name, recommender, workers):
+    print(f"\n{name}: {recommender.ratings.n_users} users x {recommender.ratings.n_items} movies")
+    print(f"  {'mode':<24} {'users/s':>10} {'users/hour':>14}")
+    rate = per_user_rate(recommender)
+    print(f"  {'recommend_movies loop':<24} {rate:>10,.0f} {rate * 3600:>14,.0f}")
+    with tempfile.TemporaryDirectory() as path:
+        recommender.save(os.path.join(path, 'model'))
+        for n_workers in workers:
+            output = os.path.join(path, f'out-{n_workers}')
+            result = run_job(os.path.join(path, 'model'), output, top_n=10, chunk_users=25_000,
+                             n_workers=n_workers)
+            label = f"batch job, {n_workers} worker(s)"
+            print(f"  {label:<24} {result['rate']:>10,.0f} {result['rate'] * 3600:>14,.0f}")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BATCH JOB BENCHMARK (top-10 for every user)")
+    print("=" * 60)
+    workers = sorted({1, os.cpu_count() or 1})
+    store = synthetic_ratings(200_000, 5000, 0.002, n_groups=50)
+    benchmark("ALS (32 factors)",
+              CollaborativeRecommender(store, model=ALSModel(n_factors=32, n_iter=5)), workers)
+    store = synthetic_ratings(50_000, 5000, 0.005, n_groups=50)
+    benchmark("neighbourhood (precomputed top-50 table)",
+              CollaborativeRecommender(store, ShardedNeighborIndex(n_neighbors=50)), workers)
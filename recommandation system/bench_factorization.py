@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ALS training scaling and serving latency against neighbourhood CF
+"""
+
+import time
+
+import numpy as np
+
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from neighbors import ExactNeighborIndex
+from synthetic_data import synthetic_ratings
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def benchmark_training(n_users, n_items=5000, ratings_per_user=50):
+    ratings = synthetic_ratings(n_users, n_items, ratings_per_user / n_items, n_groups=50)
+    model, elapsed = timed(lambda: ALSModel(n_iter=5, patience=5).fit(ratings))
+    sweeps = len(model.history)
+    print(f"  {n_users:>9,}  {ratings.nnz:>11,}  {elapsed / sweeps:10.2f}  "
+          f"{elapsed / sweeps / ratings.nnz * 1e6:10.2f}  {model.history[-1]:8.3f}")
+
+
+def benchmark_serving(n_users=50000, n_items=5000, batch=256):
+    ratings = synthetic_ratings(n_users, n_items, 0.005, n_groups=50)
+    users = np.random.default_rng(0).choice(ratings.user_ids, batch, replace=False).tolist()
+    for name, build in [
+        ("neighbourhood (exact)", lambda: CollaborativeRecommender(ratings, ExactNeighborIndex())),
+        ("ALS (32 factors)", lambda: CollaborativeRecommender(ratings, model=ALSModel(n_iter=5))),
+    ]:
+        recommender, build_time = timed(build)
+        _, single = timed(lambda: [recommender.recommend_movies(10, user) for user in users[:32]])
+        _, batched = timed(lambda: recommender.recommend_batch(users, 10))
+        print(f"  {name:<24}  {build_time:9.2f}  {single / 32 * 1e3:12.2f}  {batch / batched:12,.0f}")
+
+
+if __name__ == "__main__":
+    print("=" * 64)
+    print("ALS TRAINING (5,000 items, 50 ratings per user)")
+    print("=" * 64)
+    print(f"  {'users':>9}  {'ratings':>11}  {'s/sweep':>10}  {'us/rating':>10}  {'RMSE':>8}")
+    for n_users in [10000, 20000, 40000, 80000]:
+        benchmark_training(n_users)
+
+    print("\n" + "=" * 64)
+    print("SERVING (50,000 users, 5,000 items)")
+    print("=" * 64)
+    print(f"  {'backend':<24}  {'build (s)':>9}  {'single (ms)':>12}  {'batch users/s':>12}")
+    benchmark_serving()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark: staged hybrid ranking (candidates + re-rank) versus blending
+both engines' scores over the whole catalog
+"""
+
+import time
+
+import numpy as np
+
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from hybrid import HybridRecommender, _normalize
+from synthetic_data import GENRES, SyntheticMovies, synthetic_ratings
+from topk import top_k_rows
+
+
+def full_catalog(hybrid, users, preferences, top_n):
+    """Both engines score every movie, then blend"""
+    content = hybrid.content
+    rows = [hybrid.collaborative.ratings.user_index[user] for user in users]
+    content_scores = content.featurizer.similarity(content.featurizer.transform(preferences))
+    collaborative = hybrid.collaborative.scorer.score(rows).astype(np.float64)
+    blended = 0.5 * _normalize(content_scores) + 0.5 * _normalize(collaborative)
+    rated = hybrid.collaborative.ratings.user_rows(rows).toarray() != 0
+    return top_k_rows(blended, top_n, exclude=rated)
+
+
+def benchmark(n_users, n_items, batch=64, top_n=10, repeats=5):
+    print(f"\n{n_users} users x {n_items} movies, batch of {batch}")
+    store = synthetic_ratings(n_users, n_items, 0.005, n_groups=50)
+    content = MovieRecommender(source=SyntheticMovies(store.item_titles))
+    collaborative = CollaborativeRecommender(store, model=ALSModel(n_factors=32, n_iter=5))
+    hybrid = HybridRecommender(content, collaborative)
+    rng = np.random.default_rng(1)
+    users = [store.user_ids[i] for i in rng.choice(n_users, batch, replace=False)]
+    preferences = [' '.join(rng.choice(GENRES, 2, replace=False)) for _ in range(batch)]
+
+    for name, func in [
+        ('full catalog blend', lambda: full_catalog(hybrid, users, preferences, top_n)),
+        ('staged hybrid', lambda: hybrid.recommend_batch(users, preferences, top_n)),
+    ]:
+        func()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            func()
+        elapsed = (time.perf_counter() - start) / repeats
+        print(f"  {name:<20}  {elapsed * 1e3:9.1f} ms/batch  {elapsed / batch * 1e6:9.0f} us/request")
+    for stage, stats in hybrid.stats().items():
+        print(f"    {stage:<14} {stats['seconds'] / max(stats['batches'], 1) * 1e3:8.2f} ms/batch")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("HYBRID PIPELINE BENCHMARK")
+    print("=" * 80)
+    benchmark(20000, 5000)
+    benchmark(50000, 30000)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark: streaming a large ratings CSV into a RatingStore
+"""
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_sources import FileDataSource, report_progress
+
+
+def peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_ratings(path, n_ratings, n_users, n_items, chunk_size=1_000_000, seed=0):
+    """MovieLens-style ratings.csv written chunk by chunk"""
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, n_items + 1) ** 0.8
+    popularity /= popularity.sum()
+    for start in range(0, n_ratings, chunk_size):
+        size = min(chunk_size, n_ratings - start)
+        pd.DataFrame({
+            'userId': rng.integers(1, n_users + 1, size),
+            'movieId': rng.choice(n_items, size, p=popularity) + 1,
+            'rating': rng.integers(1, 11, size) / 2,
+            'timestamp': rng.integers(0, 10 ** 9, size),
+        }).to_csv(path, mode='a', header=start == 0, index=False)
+
+
+if __name__ == "__main__":
+    n_ratings = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    n_users, n_items = 160_000, 60_000
+    print("=" * 70)
+    print(f"STREAMING LOADER BENCHMARK ({n_ratings:,} ratings)")
+    print("=" * 70)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ratings.csv')
+        write_ratings(path, n_ratings, n_users, n_items)
+        size = os.path.getsize(path) / 2 ** 20
+        before = peak_rss_mib()
+
+        start = time.perf_counter()
+        store = FileDataSource(path, progress=report_progress).ratings()
+        elapsed = time.perf_counter() - start
+
+    print(f"\n  file size:      {size:10.1f} MiB")
+    print(f"  load time:      {elapsed:10.2f} s ({n_ratings / elapsed:,.0f} ratings/s)")
+    print(f"  store size:     {store.nbytes / 2 ** 20:10.1f} MiB ({store.nnz:,} ratings)")
+    print(f"  peak RSS:       {peak_rss_mib():10.1f} MiB (before load: {before:.1f} MiB)")
+    print(f"  dense frame:    {store.n_users * store.n_items * 8 / 2 ** 20:10.1f} MiB (not built)")
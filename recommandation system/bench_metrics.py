@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of the instrumentation when disabled, enabled, and with
+every request profiled
+"""
+
+import tempfile
+import time
+
+import metrics
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from synthetic_data import synthetic_ratings
+
+
+def per_call(func, repeat):
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(name, func, repeat):
+    disabled = per_call(func, repeat)
+    metrics.enable()
+    enabled = per_call(func, repeat)
+    metrics.disable()
+    with tempfile.TemporaryDirectory() as path:
+        metrics.enable_profiling(path, rate=1.0)
+        profiled = per_call(func, max(1, repeat // 10))
+        metrics.disable_profiling()
+    print(f"  {name:<28}  {disabled * 1e6:10.1f}  {enabled * 1e6:10.1f}  {profiled * 1e6:10.1f}  "
+          f"{(enabled / disabled - 1) * 100:+8.1f}%")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("INSTRUMENTATION OVERHEAD (us per call)")
+    print("=" * 80)
+    noop = per_call(lambda: metrics.timer('stage').__enter__(), 1_000_000)
+    print(f"  disabled timer: {noop * 1e9:.0f} ns per stage\n")
+    print(f"  {'call':<28}  {'disabled':>10}  {'enabled':>10}  {'profiled':>10}  {'overhead':>9}")
+
+    content = MovieRecommender()
+
+    def content_call():
+        content.cache.clear()
+        content.recommend_movies('Action, Sci-Fi')
+
+    collaborative = CollaborativeRecommender(synthetic_ratings(5000, 2000, 0.01, n_groups=20))
+    users = collaborative.ratings.user_ids[:64]
+    benchmark("content recommend_movies", content_call, 2000)
+    benchmark("collaborative recommend_movies",
+              lambda: collaborative.recommend_movies(user='User1'), 500)
+    benchmark("collaborative batch of 64", lambda: collaborative.recommend_batch(users), 50)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark neighbour indexes: recall@k against the exact similarity matrix
+and per-query latency
+"""
+
+import time
+
+import numpy as np
+
+from collaborative_filtering import CollaborativeRecommender
+from neighbors import ExactNeighborIndex, IVFNeighborIndex, LSHNeighborIndex, SimilarityMatrixIndex
+from synthetic_data import synthetic_ratings
+
+
+def recall_at_k(found, exact):
+    """Fraction of the exact top-k neighbours that the index returned"""
+    hits = total = 0
+    for got, want in zip(found, exact):
+        want = set(want[want >= 0])
+        hits += len(want & set(got[got >= 0]))
+        total += len(want)
+    return hits / max(total, 1)
+
+
+def benchmark(n_users, n_items, density, k=10, n_queries=500):
+    print(f"\n{n_users} users x {n_items} movies, density {density:.1%}, k={k}")
+    store = synthetic_ratings(n_users, n_items, density, n_groups=50)
+    queries = np.random.default_rng(1).choice(n_users, n_queries, replace=False)
+
+    exact = ExactNeighborIndex().build(store.user_item)
+    truth, _ = exact.query(queries, k)
+
+    indexes = [
+        ('exact blocked', exact),
+        ('LSH 16x6', LSHNeighborIndex(n_tables=16, n_bits=6)),
+        ('LSH 24x6 (default)', LSHNeighborIndex()),
+        ('LSH 32x5', LSHNeighborIndex(n_tables=32, n_bits=5)),
+        ('IVF 64/2', IVFNeighborIndex(n_lists=64, n_probe=2)),
+        ('IVF 64/8', IVFNeighborIndex(n_lists=64, n_probe=8)),
+        ('IVF 256/4', IVFNeighborIndex(n_lists=256, n_probe=4)),
+    ]
+    if n_users <= 20000:
+        indexes.insert(0, ('similarity matrix', SimilarityMatrixIndex()))
+
+    for name, index in indexes:
+        start = time.perf_counter()
+        if index is not exact:
+            index.build(store.user_item)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found, _ = index.query(queries, k)
+        latency = (time.perf_counter() - start) / n_queries
+        print(f"  {name:19s} build {build:7.2f} s  query {latency * 1e3:7.3f} ms  "
+              f"recall@{k} {recall_at_k(found, truth):.3f}")
+
+
+def benchmark_updates(n_users, n_items, density, index, n_changes=3000):
+    """Single-rating ingest rate with incremental index updates"""
+    recommender = CollaborativeRecommender(
+        synthetic_ratings(n_users, n_items, density, n_groups=50), neighbor_index=index
+    )
+    store = recommender.ratings
+    rng = np.random.default_rng(2)
+    users = rng.integers(0, store.n_users, n_changes)
+    items = rng.integers(0, store.n_items, n_changes)
+    ratings = rng.integers(0, 6, n_changes)
+
+    start = time.perf_counter()
+    for user, item, rating in zip(users, items, ratings):
+        recommender.rate(store.user_ids[user], store.item_titles[item], int(rating))
+    elapsed = time.perf_counter() - start
+    print(f"  {type(index).__name__:22s} {n_users} users: {n_changes / elapsed:8.0f} ratings/s")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("NEIGHBOUR INDEX BENCHMARK")
+    print("=" * 60)
+    benchmark(5000, 2000, 0.01)
+    benchmark(100000, 2000, 0.03, n_queries=300)
+
+    print("\nIncremental updates (insert / update / delete mix)")
+    benchmark_updates(4000, 2000, 0.01, SimilarityMatrixIndex())
+    benchmark_updates(50000, 5000, 0.005, ExactNeighborIndex())
+    benchmark_updates(50000, 5000, 0.005, IVFNeighborIndex())
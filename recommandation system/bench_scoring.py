@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized collaborative scoring engine against the original
+per-movie Python loop
+"""
+
+import time
+
+from collaborative_filtering import CollaborativeRecommender
+from synthetic_data import synthetic_ratings
+
+
+def legacy_recommend(ratings, similarity, user, top_n=3):
+    """The original loop: .loc lookups and list.index per movie and neighbour"""
+    user_names = ratings.columns.tolist()
+    current_user_idx = user_names.index(user)
+    similarities = similarity[current_user_idx].copy()
+    similarities[current_user_idx] = 0
+    similar_users = [user_names[i] for i in similarities.argsort()[-3:][::-1]]
+
+    predictions = {}
+    for movie in ratings.index:
+        if ratings.loc[movie, user] == 0:
+            weighted_sum = 0
+            similarity_sum = 0
+            for other in similar_users:
+                rating = ratings.loc[movie, other]
+                if rating > 0:
+                    similarity = similarities[user_names.index(other)]
+                    weighted_sum += similarity * rating
+                    similarity_sum += abs(similarity)
+            if similarity_sum > 0:
+                predictions[movie] = weighted_sum / similarity_sum
+    return sorted(predictions.items(), key=lambda x: x[1], reverse=True)[:top_n]
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(n_users, n_items, density, batch_size=1000, legacy_requests=5):
+    print(f"\n{n_users} users x {n_items} movies, density {density:.1%}")
+    store = synthetic_ratings(n_users, n_items, density)
+    recommender = CollaborativeRecommender(store)
+    users = store.user_ids[:batch_size]
+
+    if legacy_requests:
+        dense = store.to_dataframe()
+        similarity = recommender.user_similarity.toarray()
+        legacy = timed(lambda: legacy_recommend(dense, similarity, users[0]), legacy_requests)
+        print(f"  legacy loop:       {legacy * 1e3:9.2f} ms/request  {1 / legacy:12.0f} users/s")
+
+    single = timed(lambda: recommender.recommend_movies(user=users[0]), 20)
+    print(f"  vectorized single: {single * 1e3:9.2f} ms/request  {1 / single:12.0f} users/s")
+
+    batch = timed(lambda: recommender.recommend_batch(users), 3)
+    print(f"  recommend_batch:   {batch * 1e3 / len(users):9.3f} ms/user     "
+          f"{len(users) / batch:12.0f} users/s ({len(users)} per call)")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("COLLABORATIVE SCORING BENCHMARK")
+    print("=" * 60)
+    benchmark(500, 200, 0.05)
+    benchmark(2000, 1000, 0.02)
+    benchmark(20000, 5000, 0.005, legacy_requests=0)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark: top-k neighbour table built by a process pool versus the full
+similarity matrix (build time, memory held, query latency)
+"""
+
+import os
+import time
+
+import numpy as np
+
+from neighbors import ShardedNeighborIndex, SimilarityMatrixIndex
+from synthetic_data import synthetic_ratings
+
+
+def held_bytes(index):
+    if isinstance(index, SimilarityMatrixIndex):
+        matrix = index.similarity
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return index.neighbors.nbytes + index.similarities.nbytes
+
+
+def benchmark(n_users, n_items, density, k=10, n_queries=500):
+    print(f"\n{n_users} users x {n_items} movies, density {density:.1%}, k={k}")
+    store = synthetic_ratings(n_users, n_items, density, n_groups=50)
+    queries = np.random.default_rng(1).choice(n_users, n_queries, replace=False)
+
+    indexes = [
+        (f"sharded, {n} worker(s)", ShardedNeighborIndex(n_neighbors=k, n_workers=n))
+        for n in sorted({1, 2, 4, os.cpu_count() or 1})
+    ]
+    if n_users <= 20000:
+        indexes.insert(0, ('similarity matrix', SimilarityMatrixIndex()))
+
+    print(f"  {'index':<24}  {'build s':>8}  {'MiB held':>9}  {'query ms':>9}")
+    for name, index in indexes:
+        start = time.perf_counter()
+        index.build(store.user_item)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        index.query(queries, k)
+        query = (time.perf_counter() - start) / n_queries
+        print(f"  {name:<24}  {build:8.2f}  {held_bytes(index) / 2 ** 20:9.1f}  "
+              f"{query * 1e3:9.3f}")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print(f"SHARDED NEIGHBOUR TABLE BENCHMARK ({os.cpu_count()} CPUs)")
+    print("=" * 80)
+    benchmark(5000, 2000, 0.01)
+    benchmark(20000, 5000, 0.005)
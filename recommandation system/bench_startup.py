@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start by training versus loading a saved, memory-mapped model
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from neighbors import IVFNeighborIndex, SimilarityMatrixIndex
+from synthetic_data import synthetic_ratings
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def benchmark(name, build, load):
+    model, train = timed(build)
+    with tempfile.TemporaryDirectory() as path:
+        _, save = timed(lambda: model.save(path))
+        _, start = timed(lambda: load(path))
+    print(f"  {name:<32}  {train * 1e3:10.1f}  {save * 1e3:10.1f}  {start * 1e3:10.1f}  "
+          f"{train / start:8.0f}x")
+
+
+def process_start(name, code):
+    """Wall time of a fresh interpreter running code, and its -X importtime total"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    imports = sum(int(line.split('|')[1]) for line in result.stderr.splitlines()
+                  if line.startswith('import time:') and '| ' in line
+                  and not line.split('|')[2].startswith('  ') and 'cumulative' not in line)
+    print(f"  {name:<40}  {imports / 1e3:10.1f}  {wall * 1e3:10.1f}")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("COLD START BENCHMARK (times in ms)")
+    print("=" * 80)
+    print(f"  {'model':<32}  {'train':>10}  {'save':>10}  {'load':>10}  {'speedup':>9}")
+    benchmark("content (50 movies)", lambda: MovieRecommender(similar_items_top_n=10),
+              MovieRecommender.load)
+    ratings = synthetic_ratings(4000, 2000, 0.01, n_groups=20)
+    benchmark("collaborative matrix (4k users)",
+              lambda: CollaborativeRecommender(ratings, SimilarityMatrixIndex()),
+              CollaborativeRecommender.load)
+    ratings = synthetic_ratings(50000, 5000, 0.005, n_groups=50)
+    benchmark("collaborative IVF (50k users)",
+              lambda: CollaborativeRecommender(ratings, IVFNeighborIndex()),
+              CollaborativeRecommender.load)
+
+    print(f"\n  {'process':<40}  {'imports':>10}  {'total':>10}")
+    with tempfile.TemporaryDirectory() as path:
+        MovieRecommender().save(path)
+        process_start("content-only serving (saved model)",
+                      f"import server; server.load_models({path!r}, content_only=True)")
+        process_start("both recommenders (saved content)",
+                      f"import server; server.load_models({path!r})")
+        process_start("content (fit from scratch)", "import app; app.MovieRecommender()")
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Benchmark and regression suite for both recommenders
+
+    python bench_suite.py                       # run and compare with the baseline
+    python bench_suite.py --update-baseline     # record this run as the baseline
+    python bench_suite.py --scales small --cases collaborative
+
+Each scale generates synthetic ratings (users x items at a density) and
+a movie catalog over the same titles. Every case is timed over
+--repeats runs (the fastest counts), and its peak resident memory
+(growth in VmHWM, Linux only) and peak traced allocations (tracemalloc,
+in one extra run) are recorded. A case slower than the baseline by more
+than --threshold, or allocating that much more, fails the run with exit
+status 1. Tiny absolute differences (--min-seconds, --min-mib) never fail.
+
+Baselines are machine specific: record one on the machine that runs the
+comparison.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from neighbors import IVFNeighborIndex, SimilarityMatrixIndex
+from synthetic_data import GENRES, SyntheticMovies, synthetic_ratings
+
+# name: (users, items, density, neighbour index)
+SCALES = {
+    'tiny': (500, 200, 0.05, SimilarityMatrixIndex),
+    'small': (5000, 2000, 0.01, SimilarityMatrixIndex),
+    'medium': (20000, 5000, 0.005, SimilarityMatrixIndex),
+    'large': (100000, 20000, 0.002, IVFNeighborIndex),
+}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+MIB = 2 ** 20
+
+
+def _status(field):
+    """A /proc/self/status memory field in bytes, or None off Linux"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset VmHWM to the current RSS; False if the kernel does not allow it"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def measure(func, repeats):
+    """Fastest and median seconds, peak RSS growth and peak traced allocations"""
+    times, peak_rss = [], None
+    for _ in range(repeats):
+        gc.collect()
+        tracked = _reset_peak_rss()
+        before = _status('VmRSS')
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+        if tracked and before is not None:
+            peak_rss = max(peak_rss or 0, _status('VmHWM') - before)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, allocated = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds': min(times),
+        'median_seconds': float(np.median(times)),
+        'peak_rss_mib': None if peak_rss is None else peak_rss / MIB,
+        'alloc_peak_mib': allocated / MIB,
+    }
+
+
+def cases(scale, workdir):
+    """(name, operations per run, callable) for one scale, after any setup"""
+    n_users, n_items, density, index = SCALES[scale]
+    store = synthetic_ratings(n_users, n_items, density, n_groups=50)
+    source = SyntheticMovies(store.item_titles)
+    rng = np.random.default_rng(1)
+    queries = [' '.join(rng.choice(GENRES, 2, replace=False)) for _ in range(256)]
+    users = [store.user_ids[i] for i in rng.choice(n_users, 256, replace=False)]
+
+    content = MovieRecommender(source=source)
+    content.save(os.path.join(workdir, 'content'))
+    collaborative = CollaborativeRecommender(store, index())
+    collaborative.save(os.path.join(workdir, 'collaborative'))
+
+    def recommend_content():
+        for query in queries[:64]:
+            content.cache.clear()
+            content.recommend_movies(query)
+
+    def recommend_collaborative():
+        for user in users[:64]:
+            collaborative.recommend_movies(user=user)
+
+    return [
+        ('content/tfidf_fit', 1, lambda: MovieRecommender(source=source)),
+        ('content/tfidf_transform', len(queries), lambda: content.vectorizer.transform(queries)),
+        ('content/featurize', len(queries),
+         lambda: content.featurizer.similarity(content.featurizer.transform(queries))),
+        ('content/recommend_movies', 64, recommend_content),
+        ('content/load', 1, lambda: MovieRecommender.load(os.path.join(workdir, 'content'))),
+        ('collaborative/calculate_similarity', 1, collaborative.calculate_similarity),
+        ('collaborative/als_fit', 1,
+         lambda: ALSModel(n_factors=32, n_iter=5, validation=0).fit(store)),
+        ('collaborative/recommend_movies', 64, recommend_collaborative),
+        ('collaborative/recommend_batch', len(users),
+         lambda: collaborative.recommend_batch(users)),
+        ('collaborative/load', 1,
+         lambda: CollaborativeRecommender.load(os.path.join(workdir, 'collaborative'))),
+    ]
+
+
+def run(scales, repeats=5, case_filter=None, report=print):
+    """Measure every case of the given scales; returns {scale/case: result}"""
+    results = {}
+    for scale in scales:
+        report(f"\n{scale}: {SCALES[scale][0]} users x {SCALES[scale][1]} movies, "
+               f"density {SCALES[scale][2]:.1%}")
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, ops, func in cases(scale, workdir):
+                if case_filter and case_filter not in name:
+                    continue
+                result = measure(func, repeats)
+                result['ops'] = ops
+                results[f"{scale}/{name}"] = result
+                report(format_result(name, result))
+    return results
+
+
+def format_result(name, result):
+    rss = result['peak_rss_mib']
+    return (f"  {name:<36} {result['seconds'] * 1e3:10.2f} ms  "
+            f"{result['seconds'] / result['ops'] * 1e6:10.1f} us/op  "
+            f"{'-' if rss is None else f'{rss:.1f}':>8} MiB RSS  "
+            f"{result['alloc_peak_mib']:8.1f} MiB alloc")
+
+
+def compare(results, baseline, threshold=0.25, min_seconds=5e-3, min_mib=4.0):
+    """Regressions of results against a baseline, as readable messages
+
+    A case regresses when its time or one of its memory peaks exceeds the
+    baseline by more than the threshold fraction and by more than the
+    absolute minimum. Cases missing from either side are skipped.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        checks = [('seconds', min_seconds, 1e3, 'ms'),
+                  ('peak_rss_mib', min_mib, 1, 'MiB RSS'),
+                  ('alloc_peak_mib', min_mib, 1, 'MiB allocated')]
+        for key, minimum, factor, unit in checks:
+            now, before = result.get(key), base.get(key)
+            if now is None or before is None:
+                continue
+            if now > before * (1 + threshold) and now - before > minimum:
+                regressions.append(
+                    f"{name}: {now * factor:.2f} {unit} vs baseline {before * factor:.2f} "
+                    f"(+{(now / before - 1) * 100 if before else float('inf'):.0f}%)"
+                )
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommendation benchmark and regression suite")
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=list(SCALES))
+    parser.add_argument('--cases', help="only run cases whose name contains this")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="merge this run into the baseline instead of comparing")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed fractional slowdown or memory growth")
+    parser.add_argument('--min-seconds', type=float, default=5e-3)
+    parser.add_argument('--min-mib', type=float, default=4.0)
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("RECOMMENDATION BENCHMARK SUITE")
+    print("=" * 80)
+    results = run(args.scales, args.repeats, args.cases)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+    baseline = {'environment': environment(), 'results': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline['environment'] = environment()
+        baseline['results'].update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline updated: {args.baseline}")
+        return 0
+
+    if not baseline['results']:
+        print(f"\nNo baseline at {args.baseline}; record one with --update-baseline")
+        return 0
+    if baseline.get('environment') != environment():
+        print(f"\nWarning: baseline recorded on {baseline.get('environment')}")
+    regressions = compare(results, baseline['results'], args.threshold, args.min_seconds,
+                          args.min_mib)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: full argsort versus partial top-k selection
+"""
+
+import time
+
+import numpy as np
+
+from topk import top_k
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(n_items, k=5):
+    rng = np.random.default_rng(0)
+    scores = rng.random(n_items)
+    exclude = rng.random(n_items) < 0.01
+    repeat = max(3, 10 ** 6 // n_items)
+
+    full = timed(lambda: scores.argsort()[-k:][::-1], repeat)
+    partial = timed(lambda: top_k(scores, k), repeat)
+    masked = timed(lambda: top_k(scores, k, exclude=exclude), repeat)
+    print(f"  {n_items:>10}  {full * 1e3:10.3f}  {partial * 1e3:10.3f}  {masked * 1e3:10.3f}  "
+          f"{full / partial:7.1f}x")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("TOP-K SELECTION BENCHMARK (k=5, times in ms)")
+    print("=" * 60)
+    print(f"  {'items':>10}  {'argsort':>10}  {'top_k':>10}  {'masked':>10}  {'speedup':>8}")
+    for exponent in range(3, 8):
+        benchmark(10 ** exponent)
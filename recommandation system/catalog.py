@@ -0,0 +1,150 @@
+import numpy as np
+
+
+class StringColumn:
+    """Strings packed into one UTF-8 byte buffer plus int64 offsets
+
+    String i is data[offsets[i]:offsets[i + 1]]. Two flat arrays instead of
+    a list of str objects, so a column costs one allocation, saves as two
+    .npy files and can be memory-mapped and shared between processes.
+    Strings are only decoded when they are read.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        # Slicing a memoryview is much cheaper than slicing an ndarray
+        self._buffer = memoryview(data)
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [str(value).encode('utf-8') for value in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self._buffer[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def take(self, ids):
+        """The strings at an integer id array, as a list"""
+        ids = np.asarray(ids)
+        starts, ends = self.offsets[ids].tolist(), self.offsets[ids + 1].tolist()
+        buffer = self._buffer
+        return [buffer[start:end].tobytes().decode('utf-8') for start, end in zip(starts, ends)]
+
+    def tolist(self):
+        return self.take(np.arange(len(self)))
+
+
+class Recommendation:
+    """One recommended movie: catalog id, title, genres and match score
+
+    A slotted record rather than a dict: four fields and no per-instance
+    __dict__. It reads like the dicts the recommender used to return
+    (rec['title'], dict(rec)) and compares equal to them; to_dict() gives
+    the plain dict for JSON.
+    """
+
+    __slots__ = ('item', 'title', 'genres', 'similarity_score')
+
+    def __init__(self, item, title, genres, similarity_score):
+        self.item = item
+        self.title = title
+        self.genres = genres
+        self.similarity_score = similarity_score
+
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __eq__(self, other):
+        if isinstance(other, (Recommendation, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return (f"Recommendation(item={self.item!r}, title={self.title!r}, "
+                f"genres={self.genres!r}, similarity_score={self.similarity_score!r})")
+
+
+class ItemCatalog:
+    """Movie metadata addressed by dense int32 item ids
+
+    Item i is row i of the recommender's matrices; its title and genres
+    live in packed StringColumns. Scoring works on id arrays only, and
+    records() turns the final ids into results. The title -> id dict is
+    built on the first lookup, so loading a catalog decodes nothing.
+    """
+
+    def __init__(self, titles, genres):
+        self.titles = titles
+        self.genres = genres
+        self.ids = np.arange(len(titles), dtype=np.int32)
+        self._index = None
+
+    @classmethod
+    def from_lists(cls, titles, genres):
+        return cls(StringColumn.from_strings(titles), StringColumn.from_strings(genres))
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """A catalog from the arrays() of a saved one (memory-mapped or not)"""
+        return cls(StringColumn(arrays['title_data'], arrays['title_offsets']),
+                   StringColumn(arrays['genre_data'], arrays['genre_offsets']))
+
+    def arrays(self):
+        """The flat arrays to persist with model_store.save_model"""
+        return {
+            'title_data': self.titles.data, 'title_offsets': self.titles.offsets,
+            'genre_data': self.genres.data, 'genre_offsets': self.genres.offsets,
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def index(self):
+        """{title: item id}; the first id wins for repeated titles"""
+        if self._index is None:
+            index = {}
+            for i, title in enumerate(self.titles.tolist()):
+                index.setdefault(title, i)
+            self._index = index
+        return self._index
+
+    def id_of(self, title):
+        """Item id of a title; KeyError if the catalog lacks it"""
+        return self.index[title]
+
+    def lookup(self, titles):
+        """Item ids of many titles as an int32 array, -1 for unknown ones"""
+        index = self.index
+        return np.fromiter((index.get(title, -1) for title in titles), dtype=np.int32,
+                           count=len(titles))
+
+    def rows(self, ids, scores):
+        """(item, title, genres, score) tuples for parallel id / score arrays
+
+        ids < 0 are padding and are dropped. The tuples are immutable, so
+        they can be cached and turned into records per response.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        keep = ids >= 0
+        ids = ids[keep]
+        return list(zip(ids.tolist(), self.titles.take(ids), self.genres.take(ids),
+                        np.asarray(scores)[keep].tolist()))
+
+    def records(self, ids, scores):
+        """Recommendation records for parallel id / score arrays"""
+        return [Recommendation(*row) for row in self.rows(ids, scores)]
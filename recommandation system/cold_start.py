@@ -0,0 +1,79 @@
+import numpy as np
+
+from hybrid import ItemSpace
+
+
+class ColdStartRecommender:
+    """Recommendations for users the collaborative model has never seen
+
+    A user with a few ratings is folded into the collaborative recommender
+    on the fly (see CollaborativeRecommender.recommend_for_ratings). A user
+    with none, or too few for the fold-in to fill top_n, gets movies from a
+    fallback ranking precomputed once from the rating store: a damped mean
+    rating, (sum + prior_weight * global mean) / (count + prior_weight), so
+    a handful of 5-star ratings does not beat hundreds of 4s.
+
+    With a content recommender (MovieRecommender) and a genre preference
+    string, the fallback ranks by genre match first, using the content
+    model's TF-IDF genre vectors, and by popularity within equal matches.
+    The popularity ranking reflects the ratings at construction time; call
+    refresh() to pick up later ones.
+    """
+
+    def __init__(self, collaborative, content=None, prior_weight=5.0):
+        self.collaborative = collaborative
+        self.content = content
+        self.prior_weight = prior_weight
+        self.content_ids = None
+        if content is not None:
+            items = ItemSpace(content.catalog.titles.tolist(), collaborative.ratings.item_titles)
+            # Content id of every catalog item, -1 where it has no genres
+            self.content_ids = items.to_content[items.from_collaborative]
+        self.refresh()
+
+    def refresh(self):
+        """Recompute the popularity ranking from the current ratings"""
+        user_item = self.collaborative.ratings.user_item
+        counts = user_item.getnnz(axis=0)
+        sums = np.asarray(user_item.sum(axis=0, dtype=np.float64)).ravel()
+        mean = sums.sum() / max(counts.sum(), 1)
+        self.popularity = (sums + self.prior_weight * mean) / (counts + self.prior_weight)
+        self.popular = np.lexsort((-counts, -self.popularity))
+
+    def fallback(self, genres=None, exclude=()):
+        """Catalog item ids in fallback order, skipping the ids in exclude"""
+        order = self.popular
+        if genres and self.content is not None:
+            featurizer = self.content.featurizer
+            matches = featurizer.similarity(featurizer.transform([genres]))[0]
+            # Items outside the content catalog have no genres to match
+            ids = self.content_ids
+            genre_scores = np.where(ids >= 0, matches[np.maximum(ids, 0)], 0.0)
+            # Genre match first; popularity order breaks ties
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            order = np.lexsort((rank, -genre_scores))
+        if len(exclude):
+            order = order[~np.isin(order, list(exclude))]
+        return order
+
+    def recommend(self, ratings=None, genres=None, top_n=3):
+        """Top-n (title, score) for a new user's {title: rating} dict
+
+        Folded-in predictions come first; the fallback fills any remaining
+        places with its damped mean rating as the score.
+        """
+        ratings = ratings or {}
+        recommendations = []
+        if any(ratings.values()):
+            recommendations = self.collaborative.recommend_for_ratings(ratings, top_n)
+        if len(recommendations) < top_n:
+            index = self.collaborative.ratings.item_index
+            seen = {index[title] for title, rating in ratings.items() if rating and title in index}
+            seen.update(index[title] for title, _ in recommendations)
+            titles = self.collaborative.movies
+            recommendations += [
+                (titles[item], float(self.popularity[item]))
+                for item in self.fallback(genres, sorted(seen))[:top_n - len(recommendations)]
+            ]
+        return recommendations
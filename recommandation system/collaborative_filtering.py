@@ -1,15 +1,86 @@
-import pandas as pd
+import os
+
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import scipy.sparse as sp
+
+import metrics
+from factorization import ALSModel
+from neighbors import SimilarityMatrixIndex, load_index
+from rating_store import RatingStore
+from scoring import NeighborhoodScorer
+from topk import top_k_rows
+
+CURRENT_USER = 'Current_User'
 
 class CollaborativeRecommender:
-    def __init__(self):
-        self.user_movie_ratings, self.movies = self.create_sample_data()
-        self.user_similarity = None
+    """User-based neighbourhood CF, or a latent-factor model when model= is set
+
+    model is an ALSModel (or anything with fit / update_rating /
+    recommend_batch, plus score_columns for filtered requests); it
+    replaces the neighbour index and scorer.
+    """
+
+    def __init__(self, ratings=None, neighbor_index=None, source=None, model=None):
+        # source is any object with a ratings() method, e.g. a FileDataSource
+        if ratings is None and source is not None:
+            ratings = source.ratings()
+        if ratings is None:
+            sample_ratings, _ = self.create_sample_data()
+            ratings = RatingStore.from_dataframe(sample_ratings)
+            ratings.add_user(CURRENT_USER)
+        if model is None:
+            neighbor_index = neighbor_index or SimilarityMatrixIndex()
+        self._setup(ratings, neighbor_index, model)
         self.calculate_similarity()
+
+    def _setup(self, ratings, neighbor_index, model=None):
+        self.ratings = ratings
+        self.movies = ratings.item_titles
+        self.neighbor_index = neighbor_index
+        self.model = model
+        self.genre_index = None
+        if model is not None:
+            self.scorer = model
+        else:
+            self.scorer = NeighborhoodScorer(self.ratings, self.neighbor_index)
+
+    def save(self, path):
+        """Save the ratings and the built neighbour index or model"""
+        self.ratings.save(os.path.join(path, 'ratings'))
+        if self.model is not None:
+            self.model.save(os.path.join(path, 'model'))
+        else:
+            self.neighbor_index.save(os.path.join(path, 'index'))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a model written by save() without rebuilding the index"""
+        recommender = cls.__new__(cls)
+        ratings = RatingStore.load(os.path.join(path, 'ratings'), mmap)
+        if os.path.isdir(os.path.join(path, 'model')):
+            model = ALSModel.load(os.path.join(path, 'model'), ratings, mmap)
+            recommender._setup(ratings, None, model)
+        else:
+            recommender._setup(ratings, load_index(os.path.join(path, 'index'), mmap))
+        return recommender
     
+    def attach_genres(self, content):
+        """Take genres from a MovieRecommender so filters can ask for them
+
+        The content catalog's genre posting lists are remapped onto this
+        catalog by title; movies without content metadata have no genres.
+        """
+        ids = self._title_ids(content.catalog.titles.tolist())
+        self.genre_index = content.genre_index.remap(ids, self.ratings.n_items)
+
+    def _title_ids(self, titles):
+        index = self.ratings.item_index
+        return np.array([index.get(title, -1) for title in titles], dtype=np.int64)
+
     def create_sample_data(self):
         """Create sample user-movie rating data"""
+        import pandas as pd
+
         # Sample movie titles
         movies = [
             'The Shawshank Redemption', 'The Godfather', 'The Dark Knight',
@@ -30,11 +101,32 @@ class CollaborativeRecommender:
         return pd.DataFrame(user_ratings, index=movies), movies
     
     def calculate_similarity(self):
-        """Calculate user similarity matrix"""
-        # Replace 0 with NaN for better similarity calculation
-        ratings = self.user_movie_ratings.replace(0, np.nan)
-        self.user_similarity = cosine_similarity(ratings.fillna(0).T)
+        """Calculate user similarity matrix (or train the factor model)"""
+        if self.model is not None:
+            self.model.fit(self.ratings)
+            return
+        self.neighbor_index.build(self.ratings.user_item)
+        self.scorer = NeighborhoodScorer(self.ratings, self.neighbor_index)
     
+    @property
+    def user_similarity(self):
+        """Full users x users similarity matrix, if the index keeps one"""
+        # Only the materialised-matrix index keeps the full result
+        if not isinstance(self.neighbor_index, SimilarityMatrixIndex):
+            return None
+        self.neighbor_index.compact()
+        return self.neighbor_index.similarity
+
+    def rate(self, user, movie, rating):
+        """Record a rating and update only the similarities it affects"""
+        old = self.ratings.get_rating(user, movie)
+        if rating == old:
+            return
+        self.ratings.set_rating(user, movie, rating)
+        self.scorer.update_rating(
+            self.ratings, self.ratings.user_index[user], self.ratings.item_index[movie], old, rating
+        )
+
     def get_user_ratings(self):
         """Get ratings from the current user"""
         print("Welcome to Collaborative Filtering Recommendation System!")
@@ -45,56 +137,102 @@ class CollaborativeRecommender:
                 try:
                     rating = int(input(f"{i}. {movie}: "))
                     if 0 <= rating <= 5:
-                        self.user_movie_ratings.loc[movie, 'Current_User'] = rating
+                        self.rate(CURRENT_USER, movie, rating)
                         break
                     else:
                         print("Please enter a rating between 0 and 5.")
                 except ValueError:
                     print("Please enter a valid number.")
     
-    def recommend_movies(self, top_n=3):
-        """Recommend movies using collaborative filtering"""
-        # Get current user's ratings
-        current_user_ratings = self.user_movie_ratings['Current_User']
-        
-        # Find similar users (excluding current user)
-        user_names = self.user_movie_ratings.columns.tolist()
-        current_user_idx = user_names.index('Current_User')
-        
-        # Get similarity scores with other users
-        similarities = self.user_similarity[current_user_idx]
-        
-        # Exclude similarity with self
-        similarities[current_user_idx] = 0
-        
-        # Get top similar users
-        similar_users_idx = similarities.argsort()[-3:][::-1]
-        similar_users = [user_names[i] for i in similar_users_idx]
-        
-        # Predict ratings for unrated movies
-        predictions = {}
-        for movie in self.movies:
-            if current_user_ratings[movie] == 0:  # Movie not rated by current user
-                weighted_sum = 0
-                similarity_sum = 0
-                
-                for user in similar_users:
-                    rating = self.user_movie_ratings.loc[movie, user]
-                    if rating > 0:  # If the similar user rated this movie
-                        user_idx = user_names.index(user)
-                        similarity = similarities[user_idx]
-                        weighted_sum += similarity * rating
-                        similarity_sum += abs(similarity)
-                
-                if similarity_sum > 0:
-                    predicted_rating = weighted_sum / similarity_sum
-                    predictions[movie] = predicted_rating
-        
-        # Get top recommendations
-        recommendations = sorted(predictions.items(), key=lambda x: x[1], reverse=True)[:top_n]
-        
-        return recommendations
-    
+    def recommend_movies(self, top_n=3, user=CURRENT_USER, item_filter=None):
+        """Recommend movies using collaborative filtering
+
+        item_filter is an optional filters.ItemFilter; genre constraints
+        need attach_genres() first.
+        """
+        return self.recommend_batch([user], top_n, [item_filter])[0]
+
+    def recommend_batch(self, user_ids, top_n=3, filters=None):
+        """Recommend movies for many users with one vectorized scoring pass
+
+        filters is an optional list of ItemFilters (or None) parallel to
+        user_ids; users sharing a filter are scored together.
+        """
+        with metrics.profiled('collaborative'), metrics.timer('collaborative.recommend'):
+            user_rows = np.array([self.ratings.user_index[user] for user in user_ids],
+                                 dtype=np.int64)
+            metrics.observe('collaborative.batch_size', len(user_rows))
+            groups = {}
+            for i, item_filter in enumerate(filters or [None] * len(user_rows)):
+                groups.setdefault(item_filter, []).append(i)
+            ranked = [None] * len(user_rows)
+            for item_filter, members in groups.items():
+                rows = user_rows[members]
+                if item_filter is None:
+                    results = self.scorer.recommend_batch(rows, top_n)
+                else:
+                    results = self._filtered(rows, item_filter, top_n)
+                for i, result in zip(members, results):
+                    ranked[i] = result
+            return [
+                [(self.movies[item], float(score)) for item, score in zip(items, scores)]
+                for items, scores in ranked
+            ]
+
+    def _filtered(self, user_rows, item_filter, top_n):
+        """Top-n (item ids, scores) per user among the items a filter allows"""
+        candidates, excluded = item_filter.resolve(
+            self.ratings.n_items, self._title_ids, self.genre_index)
+        if candidates is None:
+            # The excluded items can take at most len(excluded) of the places
+            results = []
+            for items, scores in self.scorer.recommend_batch(user_rows, top_n + len(excluded)):
+                keep = ~np.isin(items, excluded)
+                results.append((items[keep][:top_n], scores[keep][:top_n]))
+            return results
+
+        # Score only the allowed items, then drop those each user rated
+        with metrics.timer('collaborative.filtered'):
+            scores = self.scorer.score_columns(user_rows, candidates)
+            rated = self.ratings.user_rows(user_rows)[:, candidates].toarray() != 0
+            metrics.count('collaborative.candidates_scored', scores.size)
+            top = top_k_rows(scores, top_n, exclude=rated | np.isnan(scores))
+        return [(candidates[row[row >= 0]], scores[i, row[row >= 0]]) for i, row in enumerate(top)]
+
+    def rating_vectors(self, ratings):
+        """Sparse (len(ratings) x items) matrix of {title: rating} dicts
+
+        Titles missing from the catalog and ratings of 0 are ignored.
+        """
+        rows, items, values = [], [], []
+        for row, user_ratings in enumerate(ratings):
+            for title, rating in user_ratings.items():
+                item = self.ratings.item_index.get(title)
+                if item is not None and rating:
+                    rows.append(row)
+                    items.append(item)
+                    values.append(rating)
+        return sp.csr_matrix(
+            (np.array(values, dtype=np.float32), (rows, items)),
+            shape=(len(ratings), self.ratings.n_items),
+        )
+
+    def recommend_for_ratings(self, ratings, top_n=3):
+        """Recommend for a new user's {title: rating} dict without adding them
+
+        The ratings are folded into the existing neighbour index or factor
+        model on the fly; nothing stored changes, so there is no column to
+        add and no similarity to recompute.
+        """
+        return self.recommend_for_ratings_batch([ratings], top_n)[0]
+
+    def recommend_for_ratings_batch(self, ratings, top_n=3):
+        """recommend_for_ratings for a list of {title: rating} dicts"""
+        return [
+            [(self.movies[item], float(score)) for item, score in zip(items, scores)]
+            for items, scores in self.scorer.recommend_vectors(self.rating_vectors(ratings), top_n)
+        ]
+
     def display_recommendations(self, recommendations):
         """Display the recommendations"""
         print(f"\n{'='*60}")
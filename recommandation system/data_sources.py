@@ -0,0 +1,212 @@
+import time
+
+import numpy as np
+
+from rating_store import RatingStore
+
+
+def read_chunks(path, columns, chunk_size=1_000_000):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Parquet file
+
+    Only the requested columns are read. Parquet needs pyarrow, which is
+    imported on first use so CSV loading works without it.
+    """
+    if str(path).endswith(('.parquet', '.pq')):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("reading Parquet files requires pyarrow") from e
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+def report_progress(stats):
+    """Default progress callback: one line per chunk with throughput"""
+    print(f"  {stats['name']}: {stats['rows']:>12,} rows  {stats['rate']:>12,.0f} rows/s  "
+          f"{stats['elapsed']:7.1f}s")
+
+
+class Progress:
+    """Counts streamed rows and reports throughput after every chunk"""
+
+    def __init__(self, name, callback=None):
+        self.name = name
+        self.callback = callback
+        self.rows = 0
+        self.start = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def stats(self):
+        elapsed = self.elapsed
+        return {
+            'name': self.name,
+            'rows': self.rows,
+            'elapsed': elapsed,
+            'rate': self.rows / elapsed if elapsed else 0.0,
+        }
+
+    def update(self, rows):
+        self.rows += rows
+        if self.callback is not None:
+            self.callback(self.stats())
+
+
+class IdMap:
+    """Maps raw ids to contiguous integers in order of first appearance
+
+    Each chunk is factorised and its distinct ids are looked up in one
+    vectorised pass against a pandas Index of the ids seen so far.
+    """
+
+    def __init__(self, ids=()):
+        import pandas as pd
+
+        self.ids = []
+        self._index = None
+        if len(ids):
+            self.lookup(pd.Series(list(ids)).to_numpy())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, values, add=True):
+        """Integer ids of a chunk of raw ids; unknown ids are -1 unless added"""
+        import pandas as pd
+
+        inverse, uniques = pd.factorize(values)
+        if self._index is None:
+            codes = np.full(len(uniques), -1, dtype=np.int64)
+        else:
+            codes = self._index.get_indexer(uniques)
+        new = codes < 0
+        if add and new.any():
+            codes[new] = np.arange(len(self.ids), len(self.ids) + new.sum())
+            added = pd.Index(uniques[new])
+            self.ids.extend(added.tolist())
+            self._index = added if self._index is None else self._index.append(added)
+        return codes.astype(np.int32)[inverse]
+
+
+class FileDataSource:
+    """Ratings and movie metadata streamed from CSV or Parquet files
+
+    The column names default to the MovieLens layout (ratings.csv with
+    userId, movieId, rating and movies.csv with movieId, title, genres).
+    Files are read chunk_size rows at a time and each chunk goes straight
+    into compact int32 / float32 triple buffers, so no dense DataFrame of
+    the whole file is ever built. progress is called with a stats dict
+    after every chunk (see report_progress).
+
+    With a movies file the item ids follow its row order, so the content
+    and collaborative recommenders share one id space, and ratings of
+    movies missing from it are dropped. Without one, items are numbered in
+    order of first appearance and titled by their raw id.
+    """
+
+    def __init__(self, ratings_path=None, movies_path=None, chunk_size=1_000_000,
+                 progress=None, user_col='userId', item_col='movieId', rating_col='rating',
+                 title_col='title', genres_col='genres'):
+        self.ratings_path = ratings_path
+        self.movies_path = movies_path
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.user_col = user_col
+        self.item_col = item_col
+        self.rating_col = rating_col
+        self.title_col = title_col
+        self.genres_col = genres_col
+        self._movies = None
+        self.dropped = 0
+
+    def _read_movies(self):
+        """(item IdMap, titles, genres) from the movies file, cached
+
+        A movie id listed twice keeps its first row.
+        """
+        if self._movies is None:
+            progress = Progress('movies', self.progress)
+            items, titles, genres = IdMap(), [], []
+            columns = [self.item_col, self.title_col, self.genres_col]
+            for chunk in read_chunks(self.movies_path, columns, self.chunk_size):
+                before = len(items)
+                codes = items.lookup(chunk[self.item_col].to_numpy())
+                _, first = np.unique(codes, return_index=True)
+                rows = chunk.iloc[first[codes[first] >= before]]
+                titles.extend(rows[self.title_col].astype(str).tolist())
+                # MovieLens separates genres with '|'
+                genres.extend(
+                    rows[self.genres_col].fillna('').astype(str).str.replace('|', ' ').tolist()
+                )
+                progress.update(len(chunk))
+            self._movies = (items, titles, genres)
+        return self._movies
+
+    def movies(self):
+        """Movie corpus for MovieRecommender: a DataFrame of title and genres"""
+        import pandas as pd
+
+        _, titles, genres = self._read_movies()
+        return pd.DataFrame({'title': titles, 'genres': genres})
+
+    def triples(self, users, items):
+        """Yield (user ids, item ids, ratings) arrays, one per chunk
+
+        users and items are IdMaps that grow as new ids stream in; items is
+        left fixed when a movies file defines the catalog.
+        """
+        grow_items = self.movies_path is None
+        columns = [self.user_col, self.item_col, self.rating_col]
+        for chunk in read_chunks(self.ratings_path, columns, self.chunk_size):
+            item_ids = items.lookup(chunk[self.item_col].to_numpy(), add=grow_items)
+            known = item_ids >= 0
+            self.dropped += int(len(known) - known.sum())
+            yield (
+                users.lookup(chunk[self.user_col].to_numpy()[known]),
+                item_ids[known],
+                chunk[self.rating_col].to_numpy(dtype=np.float32)[known],
+            )
+
+    def ratings(self):
+        """Stream the ratings file into a RatingStore"""
+        if self.movies_path is not None:
+            catalog, titles, _ = self._read_movies()
+            items = IdMap(catalog.ids)
+        else:
+            items, titles = IdMap(), None
+        users = IdMap()
+        self.dropped = 0
+        progress = Progress('ratings', self.progress)
+        parts = []
+        for part in self.triples(users, items):
+            parts.append(part)
+            progress.update(len(part[0]))
+        user_rows, item_cols, values = (
+            np.concatenate([part[i] for part in parts]) if parts else np.empty(0)
+            for i in range(3)
+        )
+        del parts
+        if titles is None:
+            titles = [str(raw) for raw in items.ids]
+        return RatingStore.from_triples(user_rows, item_cols, values, users.ids, titles)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("usage: python data_sources.py RATINGS_FILE [MOVIES_FILE]")
+        sys.exit(1)
+    source = FileDataSource(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None,
+                            progress=report_progress)
+    if source.movies_path is not None:
+        print(f"{len(source.movies())} movies")
+    store = source.ratings()
+    print(f"{store.nnz:,} ratings, {store.n_users:,} users, {store.n_items:,} movies, "
+          f"{store.nbytes / 2 ** 20:.1f} MiB; {source.dropped:,} ratings of unknown movies dropped")
@@ -3,13 +3,16 @@
 Demo script showing the recommendation system logic
 """
 
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
+from topk import top_k
+
 def demo_content_based():
     """Demonstrate content-based filtering"""
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     print("=== CONTENT-BASED RECOMMENDATION DEMO ===\n")
     
     # Sample movie data
@@ -50,7 +53,7 @@ def demo_content_based():
         print(f"{title}: {score:.3f}")
     
     # Get recommendations
-    top_indices = similarity_scores.argsort()[-3:][::-1]
+    top_indices = top_k(similarity_scores, 3)
     print("\nTop Recommendations:")
     for idx in top_indices:
         movie = movies.iloc[idx]
@@ -58,6 +61,9 @@ def demo_content_based():
 
 def demo_collaborative():
     """Demonstrate collaborative filtering concepts"""
+    import pandas as pd
+    from sklearn.metrics.pairwise import cosine_similarity
+
     print("\n=== COLLABORATIVE FILTERING CONCEPTS ===\n")
     
     # Sample user-item matrix
@@ -0,0 +1,309 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+import metrics
+from model_store import load_model, save_model, writable
+from topk import top_k_rows
+
+
+class ALSModel:
+    """Latent-factor collaborative filtering trained by alternating least squares
+
+    Users and items get n_factors-dimensional vectors. Each half-sweep
+    fixes one side and solves a small regularised least-squares system per
+    user (or item); the systems of a block of rows are assembled from
+    the rated items' factors with batched matmuls and solved together with one batched
+    np.linalg.solve, and blocks run on n_threads threads (NumPy and LAPACK
+    release the GIL). Work and memory grow with the number of ratings,
+    never with users x users.
+
+    explicit (default): fits the observed ratings around their global mean
+    with weighted-lambda regularisation (regularization * ratings count).
+    implicit=True: Hu, Koren & Volinsky confidence weighting, where every
+    rating is a positive preference with confidence 1 + alpha * rating
+    and every unrated item a weak negative.
+
+    A `validation` fraction of ratings is held out, and training stops
+    once the held-out RMSE has not improved for `patience` sweeps, keeping
+    the best factors. For implicit models the RMSE is of the held-out
+    preferences (all 1).
+
+    Serving is one dot product against the item-factor matrix. The model
+    is a drop-in scorer for CollaborativeRecommender (pass it as model=).
+    """
+
+    def __init__(self, n_factors=32, regularization=0.1, n_iter=15, implicit=False, alpha=10.0,
+                 validation=0.1, patience=2, tol=1e-4, n_threads=None, block_elements=1 << 22,
+                 seed=0):
+        if n_iter < 1:
+            raise ValueError("n_iter must be at least 1")
+        self.n_factors = n_factors
+        self.regularization = regularization
+        self.n_iter = n_iter
+        self.implicit = implicit
+        self.alpha = alpha
+        self.validation = validation
+        self.patience = patience
+        self.tol = tol
+        self.n_threads = n_threads or min(8, os.cpu_count() or 1)
+        self.block_elements = block_elements
+        self.seed = seed
+        self.ratings = None
+        self.user_factors = None
+        self.item_factors = None
+        self.mean = 0.0
+        self.history = []
+
+    def fit(self, ratings):
+        """Train on a RatingStore; returns self"""
+        self.ratings = ratings
+        matrix = ratings.user_item.tocoo()
+        rng = np.random.default_rng(self.seed)
+        held_out = rng.random(matrix.nnz) < self.validation
+        train = sp.csr_matrix(
+            (matrix.data[~held_out], (matrix.row[~held_out], matrix.col[~held_out])),
+            shape=matrix.shape, dtype=np.float32,
+        )
+        valid = (matrix.row[held_out], matrix.col[held_out], matrix.data[held_out])
+
+        self.mean = 0.0 if self.implicit else float(train.data.mean()) if train.nnz else 0.0
+        if not self.implicit:
+            train.data -= self.mean
+        train_items = train.T.tocsr()
+
+        items = rng.normal(0, 0.1, (matrix.shape[1], self.n_factors))
+        users = np.zeros((matrix.shape[0], self.n_factors))
+        best, stale = np.inf, 0
+        self.history = []
+        for _ in range(self.n_iter):
+            users = self._half_step(train, items)
+            items = self._half_step(train_items, users)
+            if not held_out.any():
+                best_factors = (users, items)
+                continue
+            rmse = self._rmse(users, items, *valid)
+            self.history.append(rmse)
+            if rmse < best - self.tol:
+                best, stale, best_factors = rmse, 0, (users, items)
+            else:
+                stale += 1
+                if stale >= self.patience:
+                    break
+
+        users, items = best_factors
+        self.user_factors = users.astype(np.float32)
+        self.item_factors = np.ascontiguousarray(items, dtype=np.float32)
+        self._gram = items.T @ items
+        return self
+
+    def _rmse(self, users, items, rows, cols, values):
+        predictions = np.einsum('ij,ij->i', users[rows], items[cols]) + self.mean
+        targets = np.ones(len(values)) if self.implicit else values
+        return float(np.sqrt(np.mean((predictions - targets) ** 2)))
+
+    def _blocks(self, indptr):
+        """Split rows into (start, stop) blocks of a bounded number of ratings and rows
+
+        Each row costs an n_factors x n_factors system however few ratings
+        it has, so rows are capped as well as ratings.
+        """
+        budget = max(1, self.block_elements // self.n_factors)
+        max_rows = max(1, self.block_elements // self.n_factors ** 2)
+        blocks, start = [], 0
+        n_rows = len(indptr) - 1
+        while start < n_rows:
+            stop = max(start + 1, np.searchsorted(indptr, indptr[start] + budget, side='right') - 1)
+            stop = min(stop, start + max_rows, n_rows)
+            blocks.append((start, stop))
+            start = stop
+        return blocks
+
+    def _half_step(self, matrix, fixed):
+        """Solve every row of a CSR matrix against the fixed factors"""
+        solved = np.empty((matrix.shape[0], self.n_factors))
+        gram = fixed.T @ fixed if self.implicit else None
+
+        def solve(block):
+            start, stop = block
+            solved[start:stop] = self._solve_rows(matrix, start, stop, fixed, gram)
+
+        with ThreadPoolExecutor(self.n_threads) as pool:
+            list(pool.map(solve, self._blocks(matrix.indptr)))
+        return solved
+
+    def _solve_rows(self, matrix, start, stop, fixed, gram):
+        """Least-squares factors for rows start:stop of a CSR matrix"""
+        indptr = matrix.indptr[start:stop + 1]
+        lo, hi = indptr[0], indptr[-1]
+        cols = matrix.indices[lo:hi]
+        values = matrix.data[lo:hi].astype(np.float64)
+        counts = np.diff(indptr)
+        n_factors = self.n_factors
+
+        if self.implicit:
+            # Confidence 1 + alpha * r on a preference of 1; the 1s of
+            # every item are already in the shared gram matrix
+            weights = self.alpha * values
+            targets = 1.0 + weights
+        else:
+            weights = np.ones_like(values)
+            targets = values
+
+        # Only the rated rows are cast, never the whole fixed matrix
+        vectors = fixed[cols].astype(np.float64, copy=False)
+        offsets = indptr - lo
+        b = sp.csr_matrix(
+            (targets, np.arange(hi - lo), offsets), shape=(stop - start, hi - lo)
+        ) @ vectors
+
+        # A = V_r^T diag(weights) V_r per row. Rows of similar length are
+        # padded to a common length and multiplied as one batched matmul;
+        # bucketing lengths by powers of two bounds the padding at 2x
+        A = np.zeros((stop - start, n_factors, n_factors))
+        buckets = np.ceil(np.log2(np.maximum(counts, 1))).astype(np.int64)
+        for bucket in np.unique(buckets[counts > 0]):
+            rows = np.flatnonzero((buckets == bucket) & (counts > 0))
+            positions = np.arange(counts[rows].max())
+            valid = positions < counts[rows][:, None]
+            entries = np.where(valid, offsets[rows][:, None] + positions, 0)
+            padded = vectors[entries] * valid[:, :, None]
+            A[rows] = np.matmul(padded.transpose(0, 2, 1), padded * weights[entries][:, :, None])
+
+        eye = np.eye(n_factors)
+        if self.implicit:
+            A += gram + self.regularization * eye
+        else:
+            A += self.regularization * np.maximum(counts, 1)[:, None, None] * eye
+        return np.linalg.solve(A, b[:, :, None])[:, :, 0]
+
+    def user_vector(self, items, ratings):
+        """Factors for one user's (item ids, ratings), items held fixed"""
+        matrix = sp.csr_matrix(
+            (np.asarray(ratings, dtype=np.float64) - self.mean, items, [0, len(items)]),
+            shape=(1, self.item_factors.shape[0]),
+        )
+        return self._solve_rows(matrix, 0, 1, self.item_factors, self._gram)[0]
+
+    def update_rating(self, ratings, user_row, item, old, new):
+        """Fold a changed rating in by re-solving only that user's factors"""
+        if user_row >= len(self.user_factors):
+            missing = user_row + 1 - len(self.user_factors)
+            self.user_factors = np.pad(self.user_factors, ((0, missing), (0, 0)))
+        self.user_factors = writable(self.user_factors)
+        self.user_factors[user_row] = self.user_vector(*ratings.user_row(user_row))
+
+    def score(self, user_rows):
+        """Dense (users x items) predicted scores"""
+        user_rows = np.asarray(user_rows)
+        known = user_rows < len(self.user_factors)
+        users = np.zeros((len(user_rows), self.n_factors), dtype=np.float32)
+        users[known] = self.user_factors[user_rows[known]]
+        return users @ self.item_factors.T + np.float32(self.mean)
+
+    def score_items(self, user_rows, items):
+        """Predicted scores of chosen items as a dense (users x m) array
+
+        items is a (users x m) array of item ids with -1 as padding. Padding,
+        and every item of a user with no ratings, scores NaN.
+        """
+        user_rows = np.asarray(user_rows)
+        items = np.asarray(items)
+        known = user_rows < len(self.user_factors)
+        users = np.zeros((len(user_rows), self.n_factors), dtype=np.float32)
+        users[known] = self.user_factors[user_rows[known]]
+        scores = np.einsum('ik,ijk->ij', users, self.item_factors[np.maximum(items, 0)])
+        scores = scores.astype(np.float64) + self.mean
+        has_ratings = np.diff(self.ratings.user_rows(user_rows).indptr) > 0
+        scores[(items < 0) | ~has_ratings[:, None]] = np.nan
+        return scores
+
+    def score_columns(self, user_rows, items):
+        """Predicted scores of one item id array shared by every user
+
+        A dense (users x len(items)) array from one matrix product; users
+        with no ratings score NaN.
+        """
+        user_rows = np.asarray(user_rows)
+        known = user_rows < len(self.user_factors)
+        users = np.zeros((len(user_rows), self.n_factors), dtype=np.float32)
+        users[known] = self.user_factors[user_rows[known]]
+        scores = (users @ self.item_factors[items].T).astype(np.float64) + self.mean
+        scores[np.diff(self.ratings.user_rows(user_rows).indptr) == 0] = np.nan
+        return scores
+
+    def recommend_batch(self, user_rows, top_n=3):
+        """Top-n unrated (item ids, scores) per user, best first"""
+        user_rows = np.asarray(user_rows)
+        step = self._step()
+        results = []
+        for start in range(0, len(user_rows), step):
+            rows = user_rows[start:start + step]
+            with metrics.timer('collaborative.predict'):
+                scores = self.score(rows)
+            results.extend(self._top(scores, self.ratings.user_rows(rows), top_n))
+        return results
+
+    def recommend_vectors(self, vectors, top_n=3):
+        """Top-n (item ids, scores) per unseen user's rating vector
+
+        Each (users x items) rating row is folded in by one least-squares
+        solve against the fixed item factors, O(ratings * n_factors^2 +
+        n_factors^3) per user, and the stored factors are left untouched.
+        """
+        vectors = sp.csr_matrix(vectors, dtype=np.float64)
+        step = self._step()
+        results = []
+        for start in range(0, vectors.shape[0], step):
+            rated = vectors[start:start + step]
+            centered = rated.copy()
+            centered.data -= self.mean
+            with metrics.timer('collaborative.fold_in'):
+                users = self._solve_rows(centered, 0, rated.shape[0], self.item_factors, self._gram)
+            with metrics.timer('collaborative.predict'):
+                scores = users.astype(np.float32) @ self.item_factors.T + np.float32(self.mean)
+            results.extend(self._top(scores, rated, top_n))
+        return results
+
+    def _step(self):
+        """Users per scoring block"""
+        return max(1, self.block_elements // max(self.item_factors.shape[0], 1))
+
+    def _top(self, scores, rated, top_n):
+        metrics.count('collaborative.candidates_scored', scores.size)
+        with metrics.timer('collaborative.top_k'):
+            top = top_k_rows(scores, top_n, exclude=rated.toarray() != 0)
+        # Users with no ratings have no factors to score with
+        has_ratings = np.diff(rated.indptr) > 0
+        results = []
+        for i, row in enumerate(top):
+            row = row[row >= 0] if has_ratings[i] else row[:0]
+            results.append((row, scores[i, row].astype(np.float64)))
+        return results
+
+    def save(self, path):
+        """Write the trained factors to a model directory"""
+        save_model(
+            path, 'ALSModel',
+            params={name: getattr(self, name) for name in (
+                'n_factors', 'regularization', 'n_iter', 'implicit', 'alpha', 'validation',
+                'patience', 'tol', 'n_threads', 'block_elements', 'seed')},
+            arrays={'user_factors': self.user_factors, 'item_factors': self.item_factors,
+                    'gram': self._gram},
+            meta={'mean': self.mean, 'history': self.history},
+        )
+
+    @classmethod
+    def load(cls, path, ratings=None, mmap=True):
+        """Load a model written by save(), memory-mapped by default"""
+        manifest, arrays, _ = load_model(path, 'ALSModel', mmap)
+        model = cls(**manifest['params'])
+        model.ratings = ratings
+        model.user_factors = arrays['user_factors']
+        model.item_factors = arrays['item_factors']
+        model._gram = arrays['gram']
+        model.mean = manifest['meta']['mean']
+        model.history = manifest['meta']['history']
+        return model
@@ -0,0 +1,111 @@
+import numpy as np
+
+from genre_features import TOKEN
+
+
+class GenreIndex:
+    """Inverted index from genre tokens to the items that have them
+
+    Each vocabulary token has a posting list of sorted item ids; the lists
+    are stored CSC-style as one flat int32 array plus int64 offsets. A
+    genre filter intersects the lists, shortest first, so its cost grows
+    with the posting list lengths rather than with the catalog size.
+    """
+
+    def __init__(self, vocabulary, postings, offsets, n_items):
+        self.vocabulary = dict(vocabulary)
+        self.postings = postings
+        self.offsets = offsets
+        self.n_items = n_items
+
+    @classmethod
+    def from_matrix(cls, vocabulary, genre_matrix):
+        """Index of an (items x vocabulary) matrix, nonzero where an item has a token"""
+        import scipy.sparse as sp
+
+        columns = sp.csc_matrix(genre_matrix)
+        columns.sort_indices()
+        return cls(vocabulary, columns.indices.astype(np.int32),
+                   columns.indptr.astype(np.int64), columns.shape[0])
+
+    def items(self, token):
+        """Sorted ids of the items with a token (none for unknown tokens)"""
+        column = self.vocabulary.get(token)
+        if column is None:
+            return self.postings[:0]
+        return self.postings[self.offsets[column]:self.offsets[column + 1]]
+
+    def matching(self, genres):
+        """Sorted ids of the items with every token of every genre string"""
+        tokens = {token for genre in genres for token in TOKEN.findall(genre.lower())}
+        if not tokens:
+            return np.arange(self.n_items, dtype=np.int32)
+        lists = sorted((self.items(token) for token in tokens), key=len)
+        result = lists[0]
+        for postings in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, postings, assume_unique=True)
+        return result
+
+    def remap(self, ids, n_items):
+        """The same index over another id space; item i becomes ids[i], dropped if -1"""
+        ids = np.asarray(ids)
+        counts = np.diff(self.offsets)
+        new_ids = ids[self.postings]
+        keep = new_ids >= 0
+        columns = np.repeat(np.arange(len(counts), dtype=np.int64), counts)[keep]
+        # Sorting (column, id) keys orders each posting list and drops
+        # duplicates where two items map to the same new id
+        keys = np.unique(columns * n_items + new_ids[keep])
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n_items, minlength=len(counts)), out=offsets[1:])
+        return GenreIndex(self.vocabulary, (keys % n_items).astype(np.int32), offsets, n_items)
+
+
+class ItemFilter:
+    """Constraints on the items one request may return
+
+    genres: genre strings every result must have (all of them, e.g.
+    ['Sci-Fi', 'Comedy']); exclude_ids: item ids never to return, in the
+    id space of the recommender the filter is used with (e.g. already
+    watched items); exclude_titles: titles never to return. Filters are
+    hashable, so they can be part of cache and micro-batch keys.
+    """
+
+    def __init__(self, genres=(), exclude_ids=(), exclude_titles=()):
+        self.genres = tuple(sorted(set(genres)))
+        self.exclude_ids = tuple(sorted({int(i) for i in exclude_ids}))
+        self.exclude_titles = tuple(sorted(set(exclude_titles)))
+
+    def _key(self):
+        return self.genres, self.exclude_ids, self.exclude_titles
+
+    def __eq__(self, other):
+        return isinstance(other, ItemFilter) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return (f"ItemFilter(genres={self.genres!r}, exclude_ids={self.exclude_ids!r}, "
+                f"exclude_titles={self.exclude_titles!r})")
+
+    def resolve(self, n_items, lookup, genre_index=None):
+        """(candidates, excluded) item id arrays for one recommender
+
+        lookup maps a list of titles to item ids (-1 for unknown ones);
+        ids outside range(n_items) are ignored. candidates holds the sorted
+        ids the genre constraint allows minus the excluded ones, or is None
+        when there is no genre constraint and every item but the excluded
+        ones may be returned.
+        """
+        excluded = np.union1d(np.asarray(self.exclude_ids, dtype=np.int64),
+                              np.asarray(lookup(list(self.exclude_titles)), dtype=np.int64))
+        excluded = excluded[(excluded >= 0) & (excluded < n_items)]
+        if not self.genres:
+            return None, excluded
+        if genre_index is None:
+            raise ValueError("genre filters need a genre index")
+        candidates = genre_index.matching(self.genres)
+        return np.setdiff1d(candidates, excluded, assume_unique=True), excluded
@@ -0,0 +1,71 @@
+import re
+
+import numpy as np
+
+# Scores are rounded to this many decimals (see GenreFeaturizer.similarity)
+DECIMALS = 6
+
+# TfidfVectorizer's default token_pattern. Its English stop words never
+# reach a fitted vocabulary, so keeping only vocabulary tokens drops them too
+TOKEN = re.compile(r"(?u)\b\w\w+\b")
+
+
+class GenreFeaturizer:
+    """Dense TF-IDF genre vectors over a fitted vectorizer's small vocabulary
+
+    Reproduces TfidfVectorizer.transform for the default settings the
+    recommender fits with (lowercase, raw counts, the fitted idf weights,
+    L2 norm): a query vector is its token counts times idf, L2-normalised.
+    The item vectors are the fitted genre matrix as one C-contiguous float32
+    (items x vocabulary) array, so scoring a batch of queries against the
+    whole catalog is a single BLAS matrix product and no sparse matrices or
+    sklearn calls are involved per request.
+    """
+
+    def __init__(self, vocabulary, idf, item_vectors):
+        self.vocabulary = dict(vocabulary)
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.item_vectors = np.ascontiguousarray(item_vectors, dtype=np.float32)
+
+    @classmethod
+    def from_tfidf(cls, vectorizer, genre_matrix):
+        """Featurizer for a fitted TfidfVectorizer and its L2-normalised item matrix"""
+        return cls(vectorizer.vocabulary_, vectorizer.idf_, genre_matrix.toarray())
+
+    def tokens(self, text):
+        """The vocabulary tokens of a preference string, in order, repeats kept"""
+        vocabulary = self.vocabulary
+        return [token for token in TOKEN.findall(text.lower()) if token in vocabulary]
+
+    def transform_tokens(self, token_lists):
+        """L2-normalised float32 (len(token_lists) x vocabulary) query vectors
+
+        Each entry of token_lists holds vocabulary tokens only (see tokens()).
+        A query without any gets a zero vector, which matches nothing.
+        """
+        vectors = np.zeros((len(token_lists), len(self.vocabulary)))
+        rows = [row for row, tokens in enumerate(token_lists) for _ in tokens]
+        columns = [self.vocabulary[token] for tokens in token_lists for token in tokens]
+        np.add.at(vectors, (rows, columns), 1.0)
+        vectors *= self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors.astype(np.float32)
+
+    def transform(self, texts):
+        """Query vectors of preference strings"""
+        return self.transform_tokens([self.tokens(text) for text in texts])
+
+    def similarity(self, vectors, items=None):
+        """Cosine similarity of query (or item) vectors to every item, or to
+        the item ids in items only
+
+        Both sides are L2-normalised, so this is one (queries x items)
+        float32 matrix product. Movies whose true scores are equal can come
+        out a few ulps apart depending on which tokens they match; rounding
+        to DECIMALS makes them exact ties again, which top_k breaks by the
+        lower id.
+        """
+        item_vectors = self.item_vectors if items is None else self.item_vectors[items]
+        scores = vectors @ item_vectors.T
+        return np.round(scores, DECIMALS, out=scores)
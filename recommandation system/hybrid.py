@@ -0,0 +1,273 @@
+import time
+
+import numpy as np
+
+import metrics
+from topk import top_k, top_k_rows
+
+STAGES = ('content', 'collaborative', 'rerank')
+
+
+class ItemSpace:
+    """One integer id per movie title across both recommenders' catalogs
+
+    The content catalog's titles come first, in its own order, followed by
+    the titles only the rating store knows. from_content / from_collaborative
+    map each engine's item ids to shared ids, and to_content /
+    to_collaborative map shared ids back (-1 where an engine lacks the movie).
+    """
+
+    def __init__(self, content_titles, collaborative_titles):
+        import pandas as pd
+
+        content = pd.Index(list(content_titles))
+        collaborative = pd.Index(list(collaborative_titles))
+        shared = content.append(collaborative).unique()
+        self.titles = shared.tolist()
+        self.from_content = shared.get_indexer(content).astype(np.int32)
+        self.from_collaborative = shared.get_indexer(collaborative).astype(np.int32)
+        self.to_content = self._inverse(self.from_content)
+        self.to_collaborative = self._inverse(self.from_collaborative)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _inverse(self, ids):
+        inverse = np.full(len(self.titles), -1, dtype=np.int32)
+        inverse[ids] = np.arange(len(ids), dtype=np.int32)
+        return inverse
+
+
+def _pad(rows, width):
+    """Stack ragged id arrays into a (len(rows) x width) array padded with -1"""
+    padded = np.full((len(rows), width), -1, dtype=np.int64)
+    for i, row in enumerate(rows):
+        row = row[:width]
+        padded[i, :len(row)] = row
+    return padded
+
+
+def merge_candidates(content_ids, collaborative_ids, max_candidates):
+    """Interleave two (requests x n) shared-id arrays by rank, deduplicated
+
+    Rank r of the content list comes before rank r of the collaborative
+    list, a repeated id keeps its first position, and at most
+    max_candidates ids are kept per row. Unused slots hold -1.
+    """
+    width = max(content_ids.shape[1], collaborative_ids.shape[1])
+    merged = np.full((len(content_ids), 2 * width), -1, dtype=np.int64)
+    merged[:, 0:2 * content_ids.shape[1]:2] = content_ids
+    merged[:, 1:2 * collaborative_ids.shape[1]:2] = collaborative_ids
+
+    # A stable sort puts the first occurrence of each id ahead of its repeats
+    order = np.argsort(merged, axis=1, kind='stable')
+    ordered = np.take_along_axis(merged, order, axis=1)
+    repeat = np.zeros(merged.shape, dtype=bool)
+    repeat[:, 1:] = (ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] >= 0)
+    merged[np.arange(len(merged))[:, None], order] = np.where(repeat, -1, ordered)
+
+    # Shift the surviving ids left, keeping their rank order
+    keep = np.argsort(merged < 0, axis=1, kind='stable')[:, :max_candidates]
+    return np.take_along_axis(merged, keep, axis=1)
+
+
+def _normalize(scores):
+    """Min-max scale each row to [0, 1] over its non-NaN entries; NaN -> 0"""
+    present = ~np.isnan(scores)
+    low = np.min(np.where(present, scores, np.inf), axis=1, keepdims=True)
+    high = np.max(np.where(present, scores, -np.inf), axis=1, keepdims=True)
+    spread = np.where(high > low, high - low, 1.0)
+    return np.where(present, (scores - np.where(present, low, 0)) / spread, 0.0)
+
+
+class HybridRecommender:
+    """Staged content + collaborative ranking over a shared item id space
+
+    A request is a user (of the collaborative recommender), a genre
+    preference string (for the content recommender), or both. A batch of
+    requests runs through three stages:
+
+    1. content: TF-IDF match of the preferences, top content_candidates
+    2. collaborative: the scorer's top collaborative_candidates unrated items
+    3. rerank: the candidates are merged by rank on shared ids and capped
+       at max_candidates, then each gets both engines' scores, min-max
+       normalised per request, and the blend
+       content_weight * content + (1 - content_weight) * collaborative
+       picks the top_n. A request with only one signal ranks by that one.
+
+    Only the candidates are scored by both engines, never the whole
+    catalog. budgets maps stage names to seconds per batch: a stage that
+    would start after the batch has used up the budgets of all stages
+    before it is skipped (a skipped rerank falls back to the merged rank
+    order) and counted in stats(). A stage without a budget never ends
+    the batch's time, but is still skipped once an earlier budget is spent.
+    """
+
+    def __init__(self, content, collaborative, content_candidates=200,
+                 collaborative_candidates=200, max_candidates=300, content_weight=0.5,
+                 budgets=None, clock=time.perf_counter):
+        self.content = content
+        self.collaborative = collaborative
+        self.content_candidates = content_candidates
+        self.collaborative_candidates = collaborative_candidates
+        self.max_candidates = max_candidates
+        self.content_weight = content_weight
+        self.budgets = dict(budgets or {})
+        self.clock = clock
+        self.items = ItemSpace(content.catalog.titles.tolist(), collaborative.ratings.item_titles)
+        self._stats = {stage: {'batches': 0, 'seconds': 0.0, 'skipped': 0, 'overruns': 0}
+                       for stage in STAGES}
+
+    def recommend(self, user=None, preferences=None, top_n=10):
+        """Top-n blended recommendations for one user and/or preference string"""
+        return self.recommend_batch([user], [preferences], top_n)[0]
+
+    def recommend_batch(self, users, preferences, top_n=10):
+        """Blended recommendations for parallel lists of users and preferences
+
+        Either entry of a request may be None. Each result is a list of
+        dicts with the title, the blended score and both engines' raw
+        scores (None where an engine has no score for the movie).
+        """
+        n = len(users)
+        deadline = None
+
+        def run(stage, func):
+            # A stage may start only while the budgets of the stages before
+            # it (run or skipped) have not all been used up
+            nonlocal deadline
+            stats = self._stats[stage]
+            budget = self.budgets.get(stage)
+            now = self.clock()
+            late = deadline is not None and now > deadline
+            if budget is not None:
+                deadline = (now if deadline is None else deadline) + budget
+            if late:
+                stats['skipped'] += 1
+                return None
+            with metrics.timer('hybrid.' + stage):
+                result = func()
+            elapsed = self.clock() - now
+            stats['batches'] += 1
+            stats['seconds'] += elapsed
+            stats['overruns'] += budget is not None and elapsed > budget
+            return result
+
+        with_preferences = [i for i, query in enumerate(preferences) if query]
+        with_user = [i for i, user in enumerate(users) if user is not None]
+        user_rows = np.array([self.collaborative.ratings.user_index[users[i]] for i in with_user],
+                             dtype=np.int64)
+
+        queries = None
+        content_ids = np.full((n, 0), -1, dtype=np.int64)
+        if with_preferences:
+            generated = run('content', lambda: self._content_stage(
+                [preferences[i] for i in with_preferences]))
+            if generated is not None:
+                vectors, top = generated
+                queries = (with_preferences, vectors)
+                content_ids = np.full((n, top.shape[1]), -1, dtype=np.int64)
+                content_ids[with_preferences] = np.where(
+                    top >= 0, self.items.from_content[np.maximum(top, 0)], -1)
+
+        collaborative_ids = np.full((n, 0), -1, dtype=np.int64)
+        if with_user:
+            top = run('collaborative', lambda: self._collaborative_stage(user_rows))
+            if top is not None:
+                collaborative_ids = np.full((n, top.shape[1]), -1, dtype=np.int64)
+                collaborative_ids[with_user] = np.where(
+                    top >= 0, self.items.from_collaborative[np.maximum(top, 0)], -1)
+
+        candidates = merge_candidates(content_ids, collaborative_ids, self.max_candidates)
+        ranked = run('rerank', lambda: self._rerank(
+            candidates, queries, with_user, user_rows, top_n))
+        if ranked is None:
+            ranked = self._unranked(candidates, queries, with_user, user_rows, top_n)
+        return ranked
+
+    def _content_stage(self, preferences):
+        """Query genre vectors and each query's top matching movies"""
+        featurizer = self.content.featurizer
+        vectors = featurizer.transform(preferences)
+        top = []
+        for scores in featurizer.similarity(vectors):
+            # Only movies sharing a genre with the query are ranked
+            matches = np.flatnonzero(scores > 0)
+            top.append(matches[top_k(scores[matches], self.content_candidates)])
+        return vectors, _pad(top, self.content_candidates)
+
+    def _collaborative_stage(self, user_rows):
+        ranked = self.collaborative.scorer.recommend_batch(user_rows, self.collaborative_candidates)
+        return _pad([items for items, _ in ranked], self.collaborative_candidates)
+
+    def _signals(self, candidates, queries, with_user, user_rows):
+        """Raw (content, collaborative) scores of every candidate, NaN if missing,
+        plus a mask of candidates the user already rated"""
+        valid = candidates >= 0
+        content = np.full(candidates.shape, np.nan)
+        if queries is not None:
+            with_preferences, vectors = queries
+            ids = np.where(valid, self.items.to_content[np.maximum(candidates, 0)], -1)
+            ids = ids[with_preferences]
+            # One genre vector dot product per (query, candidate) pair
+            genres = self.content.featurizer.item_vectors[np.maximum(ids, 0)]
+            dots = np.einsum('qcv,qv->qc', genres, vectors)
+            content[with_preferences] = np.where(ids >= 0, dots, np.nan)
+
+        collaborative = np.full(candidates.shape, np.nan)
+        rated = np.zeros(candidates.shape, dtype=bool)
+        if with_user:
+            item_ids = np.where(valid, self.items.to_collaborative[np.maximum(candidates, 0)], -1)
+            item_ids = item_ids[with_user]
+            collaborative[with_user] = self.collaborative.scorer.score_items(user_rows, item_ids)
+            user_item = self.collaborative.ratings.user_rows(user_rows)
+            columns, inverse = np.unique(np.maximum(item_ids, 0).ravel(), return_inverse=True)
+            seen = user_item[:, columns].toarray()[
+                np.arange(len(user_rows))[:, None], inverse.reshape(item_ids.shape)]
+            rated[with_user] = (seen != 0) & (item_ids >= 0)
+        return content, collaborative, rated
+
+    def _rerank(self, candidates, queries, with_user, user_rows, top_n):
+        content, collaborative, rated = self._signals(candidates, queries, with_user, user_rows)
+        has_content = ~np.isnan(content).all(axis=1, keepdims=True)
+        has_collaborative = ~np.isnan(collaborative).all(axis=1, keepdims=True)
+        content_weight = self.content_weight * has_content
+        collaborative_weight = (1 - self.content_weight) * has_collaborative
+        total = np.maximum(content_weight + collaborative_weight, 1e-12)
+        blended = (content_weight * _normalize(content)
+                   + collaborative_weight * _normalize(collaborative)) / total
+
+        top = top_k_rows(blended, top_n, exclude=(candidates < 0) | rated)
+        scores = np.take_along_axis(blended, np.maximum(top, 0), axis=1)
+        return self._results(candidates, top, scores, content, collaborative)
+
+    def _unranked(self, candidates, queries, with_user, user_rows, top_n):
+        """Over-budget fallback: candidates in merged rank order, unblended"""
+        content, collaborative, rated = self._signals(candidates, queries, with_user, user_rows)
+        keep = (candidates >= 0) & ~rated
+        top = np.argsort(~keep, axis=1, kind='stable')[:, :top_n]
+        top = np.where(np.take_along_axis(keep, top, axis=1), top, -1)
+        return self._results(candidates, top, np.full(top.shape, np.nan), content, collaborative)
+
+    def _results(self, candidates, top, scores, content, collaborative):
+        picked = np.maximum(top, 0)
+        ids = np.take_along_axis(candidates, picked, axis=1).tolist()
+        # Plain floats with NaN (x != x) turned into None
+        columns = [
+            [[None if x != x else x for x in row] for row in values.tolist()]
+            for values in (scores, np.take_along_axis(content, picked, axis=1),
+                           np.take_along_axis(collaborative, picked, axis=1))
+        ]
+        titles = self.items.titles
+        return [
+            [
+                {'title': titles[ids[i][rank]], 'score': columns[0][i][rank],
+                 'content_score': columns[1][i][rank], 'collaborative_score': columns[2][i][rank]}
+                for rank in range(int((row >= 0).sum()))
+            ]
+            for i, row in enumerate(top)
+        ]
+
+    def stats(self):
+        """Per-stage batch counts, total seconds, skips and budget overruns"""
+        return {stage: dict(values) for stage, values in self._stats.items()}
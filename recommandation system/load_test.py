@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Local load test for server.py: p50/p99 latency and throughput
+
+    python load_test.py --spawn                  # start a server and test it
+    python load_test.py --url http://host:8000   # test a running server
+
+With --spawn a synthetic collaborative model is trained, saved and served
+from a child process, so the test exercises the real loading path.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote, urlsplit
+
+GENRES = ['Action', 'Adventure', 'Comedy', 'Crime', 'Drama', 'Fantasy', 'Horror', 'Mystery',
+          'Romance', 'Sci-Fi', 'Thriller', 'Animation', 'Biography', 'History', 'Music', 'War']
+
+
+async def request(reader, writer, host, path):
+    """One keep-alive GET; returns (status, parsed JSON body)"""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, paths, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, host, path)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def make_paths(n_requests, users, mix, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(n_requests):
+        if users and rng.random() >= mix:
+            paths.append(f"/recommend/collaborative?user={quote(str(rng.choice(users)))}&top_n=10")
+        else:
+            query = ','.join(rng.sample(GENRES, rng.randint(1, 3)))
+            paths.append(f"/recommend/content?q={quote(query)}&top_n=5")
+    return paths
+
+
+async def run(host, port, n_requests, concurrency, users, mix):
+    paths = make_paths(n_requests, users, mix)
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, paths[i::concurrency], latencies, errors) for i in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, stats = await request(reader, writer, host, '/stats')
+    writer.close()
+    return sorted(latencies), errors, elapsed, stats
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def wait_for_server(host, port, timeout=60):
+    async def ping():
+        reader, writer = await asyncio.open_connection(host, port)
+        await request(reader, writer, host, '/health')
+        writer.close()
+
+    deadline = time.time() + timeout
+    while True:
+        try:
+            asyncio.run(ping())
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def spawn_server(directory, args):
+    """Train and save a synthetic model, then serve it from a child process"""
+    from collaborative_filtering import CollaborativeRecommender
+    from neighbors import IVFNeighborIndex
+    from synthetic_data import synthetic_ratings
+
+    ratings = synthetic_ratings(args.users, args.items, 0.005, n_groups=50)
+    CollaborativeRecommender(ratings, IVFNeighborIndex()).save(directory)
+    server = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py'),
+        '--port', str(args.port), '--workers', str(args.workers),
+        '--max-delay-ms', str(args.max_delay_ms), '--collaborative-model', directory,
+    ])
+    return server, ratings.user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the recommendation server")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--mix', type=float, default=0.5, help="share of content requests")
+    parser.add_argument('--users', type=int, default=20000, help="synthetic users with --spawn")
+    parser.add_argument('--items', type=int, default=2000, help="synthetic items with --spawn")
+    parser.add_argument('--spawn', action='store_true', help="start a local server first")
+    parser.add_argument('--port', type=int, default=8765, help="port for --spawn")
+    parser.add_argument('--workers', type=int, default=1, help="server workers for --spawn")
+    parser.add_argument('--max-delay-ms', type=float, default=2.0, help="batching window for --spawn")
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as directory:
+        if args.spawn:
+            host, port = '127.0.0.1', args.port
+            server, users = spawn_server(directory, args)
+        else:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+            users = ['User1', 'User2', 'User3', 'User4', 'User5']
+        try:
+            wait_for_server(host, port)
+            latencies, errors, elapsed, stats = asyncio.run(
+                run(host, port, args.requests, args.concurrency, users, args.mix)
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    print("=" * 60)
+    print(f"LOAD TEST: {args.requests} requests, concurrency {args.concurrency}")
+    print("=" * 60)
+    print(f"  QPS:          {len(latencies) / elapsed:10.0f}")
+    for q in (50, 90, 99):
+        print(f"  p{q} latency:  {percentile(latencies, q) * 1e3:10.2f} ms")
+    print(f"  max latency:  {latencies[-1] * 1e3:10.2f} ms")
+    print(f"  errors:       {len(errors):10d}")
+    for name in ('content', 'collaborative'):
+        print(f"  {name} mean batch size: {stats[name]['mean_batch_size']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+In-process instrumentation: stage timers, counters, histograms and
+sampled cProfile captures
+
+Instrumentation is off by default. Until enable() installs a Registry,
+timer() and profiled() return one shared no-op context manager and
+count() / observe() return straight away, so instrumented code pays a
+global lookup and a call per stage and never touches a clock or a lock.
+
+    import metrics
+    registry = metrics.enable()
+    ...
+    print(registry.prometheus())       # Prometheus text exposition format
+    registry.dump_json('metrics.json')
+
+    metrics.enable_profiling('profiles', rate=0.01)   # cProfile 1% of requests
+
+Stage names are dotted ('content.vectorize'); the Prometheus names
+replace dots with underscores under a 'recommender_' prefix. Timers are
+histograms of seconds, and counters are exported as '<name>_total'.
+"""
+
+import cProfile
+import contextlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds: 10 us to 10 s
+TIME_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2,
+                5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144,
+                1048576)
+
+_NULL = contextlib.nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {
+            'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'],
+                                itertools.accumulate(self.counts))),
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name + '.seconds', time.perf_counter() - self.start,
+                              TIME_BUCKETS)
+        return False
+
+
+class Registry:
+    """Thread-safe store of named counters and histograms"""
+
+    def __init__(self, prefix='recommender'):
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value, buckets=SIZE_BUCKETS):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def timer(self, name):
+        """Context manager recording its duration in the '<name>.seconds' histogram"""
+        return _Timer(self, name)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """All values as a JSON-serialisable dict"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {name: histogram.snapshot()
+                               for name, histogram in self.histograms.items()},
+            }
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+
+    def _metric_name(self, name):
+        return re.sub(r'[^a-zA-Z0-9_]', '_', f"{self.prefix}_{name}")
+
+    def prometheus(self):
+        """All values in the Prometheus text exposition format (0.0.4)"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = self._metric_name(name) + '_total'
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            metric = self._metric_name(name)
+            lines.append(f"# TYPE {metric} histogram")
+            lines += [f'{metric}_bucket{{le="{bound}"}} {count}'
+                      for bound, count in histogram['buckets'].items()]
+            lines += [f"{metric}_sum {histogram['sum']}", f"{metric}_count {histogram['count']}"]
+        return '\n'.join(lines) + '\n'
+
+
+class ProfileSampler:
+    """Runs a random fraction of requests under cProfile and saves the stats
+
+    Each sampled request writes <directory>/<name>-<pid>-<n>.prof, readable
+    with pstats or snakeviz. Requests nested inside a sampled one are not
+    sampled again.
+    """
+
+    def __init__(self, directory, rate=0.01, seed=None):
+        self.directory = directory
+        self.rate = rate
+        self.written = 0
+        self._random = random.Random(seed)
+        self._ids = itertools.count()
+        self._local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+
+    @contextlib.contextmanager
+    def sample(self, name):
+        if getattr(self._local, 'active', False) or self._random.random() >= self.rate:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler already owns this thread
+            yield
+            return
+        self._local.active = True
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._local.active = False
+            path = os.path.join(self.directory, f"{name}-{os.getpid()}-{next(self._ids):06d}.prof")
+            profile.dump_stats(path)
+            self.written += 1
+
+
+_registry = None
+_sampler = None
+
+
+def enable(registry=None):
+    """Start recording into registry (a new Registry by default); returns it"""
+    global _registry
+    _registry = registry if registry is not None else Registry()
+    return _registry
+
+
+def disable():
+    global _registry
+    _registry = None
+
+
+def registry():
+    """The active Registry, or None while instrumentation is off"""
+    return _registry
+
+
+def enable_profiling(directory, rate=0.01, seed=None):
+    """Profile a `rate` fraction of requests into directory; returns the sampler"""
+    global _sampler
+    _sampler = ProfileSampler(directory, rate, seed)
+    return _sampler
+
+
+def disable_profiling():
+    global _sampler
+    _sampler = None
+
+
+def timer(name):
+    """Time a stage into '<name>.seconds'; a shared no-op while disabled"""
+    if _registry is None:
+        return _NULL
+    return _registry.timer(name)
+
+
+def count(name, value=1):
+    if _registry is not None:
+        _registry.count(name, value)
+
+
+def observe(name, value, buckets=SIZE_BUCKETS):
+    if _registry is not None:
+        _registry.observe(name, value, buckets)
+
+
+def profiled(name):
+    """Maybe run a request under cProfile; a shared no-op while disabled"""
+    if _sampler is None:
+        return _NULL
+    return _sampler.sample(name)
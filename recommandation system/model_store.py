@@ -0,0 +1,113 @@
+import json
+import os
+
+import numpy as np
+
+# 2: ids, titles and genres moved from the manifest into arrays
+FORMAT_VERSION = 2
+MANIFEST = 'model.json'
+
+
+def save_model(path, kind, params=None, arrays=None, matrices=None, meta=None):
+    """Write a model directory: one .npy file per array plus a JSON manifest
+
+    Sparse matrices are split into their data / indices / indptr arrays so
+    every buffer can be memory-mapped on load (np.load cannot map arrays
+    inside an .npz archive). The manifest is written last, so a directory
+    without one is an incomplete save.
+
+    Every file is written under a temporary name and renamed into place, so
+    a model loaded memory-mapped from path can be saved back to it: its
+    mappings keep the old files alive instead of seeing them truncated.
+    """
+    os.makedirs(path, exist_ok=True)
+    # Any earlier save in path is incomplete from here until the new manifest
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        os.remove(os.path.join(path, MANIFEST))
+    arrays = dict(arrays or {})
+    shapes = {}
+    if matrices:
+        import scipy.sparse as sp
+    for name, matrix in (matrices or {}).items():
+        matrix = sp.csr_matrix(matrix)
+        matrix.sort_indices()
+        arrays[f'{name}.data'] = matrix.data
+        arrays[f'{name}.indices'] = matrix.indices
+        arrays[f'{name}.indptr'] = matrix.indptr
+        shapes[name] = list(matrix.shape)
+    for name, array in arrays.items():
+        _replace(os.path.join(path, f'{name}.npy'),
+                 lambda f: np.save(f, np.ascontiguousarray(array)))
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'kind': kind,
+        'params': params or {},
+        'arrays': sorted(arrays),
+        'matrices': shapes,
+        'meta': meta or {},
+    }
+    _replace(os.path.join(path, MANIFEST), lambda f: f.write(json.dumps(manifest).encode()))
+
+
+def _replace(path, write):
+    """Call write(f) on a temporary file, then rename it over path"""
+    partial = path + '.tmp'
+    with open(partial, 'wb') as f:
+        write(f)
+    os.replace(partial, path)
+
+
+def read_manifest(path):
+    """The manifest of a saved model directory"""
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"unsupported model format in {path}: {manifest.get('format')} "
+                         f"(expected {FORMAT_VERSION}); save the model again")
+    return manifest
+
+
+def load_model(path, kind=None, mmap=True, sparse=True):
+    """Read a model directory written by save_model
+
+    Returns (manifest, arrays, matrices). With mmap=True every array is a
+    read-only np.memmap, so processes loading the same files share pages
+    and start without copying or recomputing anything. With sparse=False
+    the matrices stay as their data / indices / indptr entries in arrays
+    and matrices maps their names to shapes (see sparse_matrix), so
+    loading does not import scipy.
+    """
+    manifest = read_manifest(path)
+    if kind is not None and manifest['kind'] != kind:
+        raise ValueError(f"{path} holds a {manifest['kind']}, not a {kind}")
+    mmap_mode = 'r' if mmap else None
+    arrays = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in manifest['arrays']
+    }
+    shapes = {name: tuple(shape) for name, shape in manifest['matrices'].items()}
+    if not sparse:
+        return manifest, arrays, shapes
+    matrices = {name: sparse_matrix(arrays, name, shape) for name, shape in shapes.items()}
+    for name in matrices:
+        for part in ('data', 'indices', 'indptr'):
+            del arrays[f'{name}.{part}']
+    return manifest, arrays, matrices
+
+
+def sparse_matrix(arrays, name, shape):
+    """The CSR matrix stored as name.data / .indices / .indptr in arrays, without copying"""
+    import scipy.sparse as sp
+
+    matrix = sp.csr_matrix(
+        (arrays[f'{name}.data'], arrays[f'{name}.indices'], arrays[f'{name}.indptr']),
+        shape=tuple(shape), copy=False,
+    )
+    matrix.has_sorted_indices = True
+    return matrix
+
+
+def writable(array):
+    """The array itself, or a private copy if it is a read-only mapping"""
+    return array if array.flags.writeable else np.array(array)
@@ -0,0 +1,851 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.sparse as sp
+
+from model_store import load_model, read_manifest, save_model, writable
+from topk import top_k_rows
+
+
+def normalize(vectors):
+    """Rows scaled to unit L2 norm (all-zero rows stay zero), as a copy
+
+    Sparse input gives a CSR matrix, dense input an array.
+    """
+    if sp.issparse(vectors):
+        vectors = sp.csr_matrix(vectors, copy=True)
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        vectors.data /= np.repeat(norms, np.diff(vectors.indptr)).astype(vectors.dtype)
+        return vectors
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _pad(neighbors, sims, k):
+    """Pad (neighbours, similarities) to k columns; missing slots are -1 / 0"""
+    missing = k - neighbors.shape[1]
+    if missing > 0:
+        neighbors = np.pad(neighbors, ((0, 0), (0, missing)), constant_values=-1)
+        sims = np.pad(sims, ((0, 0), (0, missing)))
+    # Users with nothing in common are not neighbours
+    neighbors = np.where(sims > 0, neighbors, -1)
+    sims = np.where(sims > 0, sims, 0.0)
+    return neighbors, sims
+
+
+def _exclude_self(block, rows):
+    """Zero each query user's similarity with itself, if it is in the block"""
+    inside = rows < block.shape[1]
+    block[np.flatnonzero(inside), rows[inside]] = 0
+
+
+class ExactNeighborIndex:
+    """Exact top-k cosine neighbours computed block by block
+
+    Users are stored as L2-normalised sparse rows, so cosine similarity is a
+    sparse dot product. Queries are scored against every user in blocks of
+    at most block_elements similarities, so the full users x users matrix is
+    never held in memory. Subclasses only change how candidates are found.
+
+    query() returns two (n_queries x k) arrays: neighbour user ids and their
+    similarities, best first. Empty slots hold id -1 and similarity 0.
+
+    update_rating() keeps the index fresh as ratings change: the affected
+    user's new vector is buffered and used by every search straight away,
+    and compact() folds the buffer into the base index once it holds more
+    than max_updates users.
+
+    save() writes the compacted index to a model directory and load() maps
+    it back read-only, so worker processes share one copy of it.
+    """
+
+    # Constructor arguments and built state written by save()
+    _params = ('block_elements', 'max_updates')
+    _arrays = ()
+    _matrices = ('vectors',)
+
+    def __init__(self, block_elements=1 << 22, max_updates=1024):
+        self.block_elements = block_elements
+        self.max_updates = max_updates
+        self.vectors = None
+        self._updates = {}
+        self._updated = None
+
+    @property
+    def n_users(self):
+        if self._updates:
+            return max(self.vectors.shape[0], max(self._updates) + 1)
+        return self.vectors.shape[0]
+
+    def build(self, user_item):
+        """Index the rows of a users x items rating matrix"""
+        self.vectors = normalize(sp.csr_matrix(user_item, dtype=np.float32))
+        self._updates = {}
+        self._updated = None
+        return self
+
+    def update_rating(self, ratings, user_row, item, old, new):
+        """Refresh the index after one rating insert, update or delete
+
+        ratings is the RatingStore the change was already written to; old
+        and new are the previous and current rating (0 = not rated).
+        """
+        items, values = ratings.user_row(user_row)
+        norm = np.linalg.norm(values)
+        self._updates[user_row] = sp.csr_matrix(
+            (values / norm if norm else values, items, [0, len(items)]),
+            shape=(1, ratings.n_items), dtype=np.float32,
+        )
+        self._updated = None
+        if len(self._updates) > self.max_updates:
+            self.compact()
+
+    def _updated_vectors(self):
+        """(sorted user ids, stacked vectors) of the buffered updates"""
+        if self._updated is None:
+            ids = np.array(sorted(self._updates), dtype=np.int64)
+            self._updated = (ids, sp.vstack([self._updates[i] for i in ids.tolist()]).tocsr())
+        return self._updated
+
+    def _stale(self, rows):
+        """Mask of rows with a buffered update, and their position in it"""
+        if not self._updates:
+            return np.zeros(len(rows), dtype=bool), None
+        ids, _ = self._updated_vectors()
+        pos = np.minimum(np.searchsorted(ids, rows), len(ids) - 1)
+        return ids[pos] == rows, pos
+
+    def compact(self):
+        """Fold buffered user updates into the base index"""
+        if not self._updates:
+            return
+        ids, updated = self._updated_vectors()
+        base = self.vectors.tocoo()
+        updated = updated.tocoo()
+        keep = ~np.isin(base.row, ids)
+        self.vectors = sp.csr_matrix(
+            (np.concatenate([base.data[keep], updated.data]),
+             (np.concatenate([base.row[keep], ids[updated.row]]),
+              np.concatenate([base.col[keep], updated.col]))),
+            shape=(self.n_users, base.shape[1]),
+        )
+        self._updates = {}
+        self._updated = None
+        self._reindex(ids)
+
+    def _reindex(self, user_rows):
+        """Refresh backend structures for users whose vectors changed"""
+
+    def save(self, path):
+        """Compact the index and write it to a model directory"""
+        self.compact()
+        save_model(
+            path, type(self).__name__,
+            params={name: getattr(self, name) for name in self._params},
+            arrays={name: getattr(self, name) for name in self._arrays},
+            matrices={name: getattr(self, name) for name in self._matrices},
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load an index written by save(), memory-mapped by default"""
+        manifest, arrays, matrices = load_model(path, cls.__name__, mmap)
+        index = cls(**manifest['params'])
+        for name, value in {**arrays, **matrices}.items():
+            setattr(index, name, value)
+        return index
+
+    def _vectors_for(self, rows):
+        """Current vectors of the given users, buffered updates included"""
+        rows = np.asarray(rows)
+        stale, pos = self._stale(rows)
+        # Users added after the last build with no ratings yet are empty
+        known = rows < self.vectors.shape[0]
+        if not stale.any() and known.all():
+            return self.vectors[rows]
+        base = self.vectors[np.where(stale | ~known, 0, rows)]
+        parts = [base, sp.csr_matrix((1, base.shape[1]), dtype=np.float32)]
+        if stale.any():
+            parts.append(self._updated_vectors()[1])
+        stacked = sp.vstack(parts).tocsr()
+        index = np.where(known, np.arange(len(rows)), len(rows))
+        if stale.any():
+            index = np.where(stale, len(rows) + 1 + pos, index)
+        return stacked[index]
+
+    def query(self, user_rows, k):
+        """Top-k neighbours of stored users, excluding each user itself"""
+        user_rows = np.asarray(user_rows)
+        return self._search(self._vectors_for(user_rows), k, exclude=user_rows)
+
+    def query_vectors(self, vectors, k):
+        """Top-k stored users for arbitrary users x items rating vectors"""
+        return self._search(normalize(sp.csr_matrix(vectors, dtype=np.float32)), k)
+
+    def _search(self, vectors, k, exclude=None):
+        n_queries, n_users = vectors.shape[0], self.n_users
+        step = max(1, self.block_elements // max(n_users, 1))
+        neighbors = np.full((n_queries, k), -1, dtype=np.int64)
+        sims = np.zeros((n_queries, k))
+        for start in range(0, n_queries, step):
+            stop = min(start + step, n_queries)
+            block = np.zeros((stop - start, n_users))
+            block[:, :self.vectors.shape[0]] = (vectors[start:stop] @ self.vectors.T).toarray()
+            if self._updates:
+                ids, updated = self._updated_vectors()
+                block[:, ids] = (vectors[start:stop] @ updated.T).toarray()
+            if exclude is not None:
+                _exclude_self(block, exclude[start:stop])
+            top = top_k_rows(block, k)
+            neighbors[start:stop, :top.shape[1]] = top
+            sims[start:stop, :top.shape[1]] = np.take_along_axis(block, top, axis=1)
+        return _pad(neighbors, sims, k)
+
+    def _rerank(self, vectors, candidates, k, exclude=None):
+        """Exact scoring of one candidate id array per query
+
+        Queries are taken in blocks of candidate pairs. A block whose
+        candidates overlap a lot is scored against their union with one
+        sparse product; otherwise every pair is scored as a row-wise sparse
+        dot product. Either way the work grows with the number of candidates
+        rather than with the number of users.
+        """
+        n_queries = vectors.shape[0]
+        neighbors = np.full((n_queries, k), -1, dtype=np.int64)
+        sims = np.zeros((n_queries, k))
+        sizes = np.array([len(cands) for cands in candidates])
+        ends = np.cumsum(sizes)
+        start = 0
+        while start < n_queries:
+            # Take as many queries as fit in one block of candidate pairs
+            budget = ends[start] - sizes[start] + self.block_elements
+            stop = max(start + 1, np.searchsorted(ends, budget, side='right'))
+            rows = np.repeat(np.arange(start, stop), sizes[start:stop])
+            cols = np.concatenate(candidates[start:stop]).astype(np.int64)
+            if len(cols):
+                union = np.sort(cols)
+                union = union[np.diff(union, prepend=-1) != 0]
+                # A dense score costs a small fraction of a gathered pair
+                if (stop - start) * len(union) <= 16 * len(cols):
+                    self._rerank_union(vectors, rows, cols, union, k, exclude, neighbors, sims)
+                else:
+                    self._rerank_pairs(vectors, rows, cols, k, exclude, neighbors, sims)
+            start = stop
+        return _pad(neighbors, sims, k)
+
+    def _rerank_pairs(self, vectors, rows, cols, k, exclude, neighbors, sims):
+        """Score each (query, candidate) pair and keep the best k per query"""
+        stale, pos = self._stale(cols)
+        base = self.vectors[np.where(stale, 0, cols)]
+        scores = np.asarray(base.multiply(vectors[rows]).sum(axis=1), dtype=np.float64).ravel()
+        if stale.any():
+            updated = self._updated_vectors()[1][pos[stale]]
+            scores[stale] = np.asarray(updated.multiply(vectors[rows[stale]]).sum(axis=1)).ravel()
+        if exclude is not None:
+            scores[cols == exclude[rows]] = 0
+
+        # Best k per query: sort pairs by (query, -score, user id)
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        top = rank < k
+        neighbors[rows[top], rank[top]] = cols[top]
+        sims[rows[top], rank[top]] = scores[top]
+
+    def _rerank_union(self, vectors, rows, cols, union, k, exclude, neighbors, sims):
+        """Score the queries against the union of their candidates, block by block"""
+        columns = np.searchsorted(union, cols)
+        transposed = self._vectors_for(union).T.tocsr()
+        start, stop = rows[0], rows[-1] + 1
+        step = max(1, self.block_elements // len(union))
+        bounds = np.searchsorted(rows, np.arange(start, stop + step, step))
+        for first, lo, hi in zip(range(start, stop, step), bounds[:-1], bounds[1:]):
+            last = min(first + step, stop)
+            block = (vectors[first:last] @ transposed).toarray()
+            # Pairs that are not candidates stay 0 and are never returned
+            scores = np.zeros_like(block)
+            pairs = (rows[lo:hi] - first, columns[lo:hi])
+            scores[pairs] = block[pairs]
+            if exclude is not None:
+                own = np.searchsorted(union, exclude[first:last])
+                own[union[np.minimum(own, len(union) - 1)] != exclude[first:last]] = len(union)
+                _exclude_self(scores, own)
+            top = top_k_rows(scores, k)
+            neighbors[first:last, :top.shape[1]] = union[top]
+            sims[first:last, :top.shape[1]] = np.take_along_axis(scores, top, axis=1)
+
+
+class SimilarityMatrixIndex(ExactNeighborIndex):
+    """Exact neighbours read from a materialised users x users similarity matrix
+
+    The matrix is sparse (only users sharing a rated movie get an entry),
+    but can still grow quadratically with users; it is the original
+    behaviour and stays the default for small catalogs.
+
+    Rating changes are applied incrementally from per-user norms and dot
+    products: only the changed user's similarity row and column are
+    recomputed. The matrix is symmetric, so the new row is kept in an
+    overlay that also patches that user's column until compact() folds the
+    overlay into the matrix. Overlay rows are applied in update order, so
+    the later of two updated users decides their similarity.
+    """
+
+    _params = ExactNeighborIndex._params + ('max_patches',)
+    _arrays = ('norms',)
+    _matrices = ('vectors', 'similarity')
+
+    def __init__(self, block_elements=1 << 22, max_updates=1024, max_patches=1 << 20):
+        super().__init__(block_elements, max_updates)
+        self.max_patches = max_patches
+        self._clear_overlay()
+
+    def _clear_overlay(self):
+        # Overlay rows are appended to one flat buffer as segments keyed by
+        # (segment << 32 | user id), so the keys are globally sorted and one
+        # searchsorted finds a user's similarity in any number of segments
+        self._rows = {}
+        self._users = np.empty(0, dtype=np.int64)
+        self._segments = np.empty(0, dtype=np.int64)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._sims = np.empty(0)
+        self._n_patches = 0
+
+    def build(self, user_item):
+        super().build(user_item)
+        user_item = sp.csr_matrix(user_item, dtype=np.float32)
+        # The rows are unit length, so their dot products are the cosines
+        self.similarity = (self.vectors @ self.vectors.T).tocsr()
+        self.norms = np.sqrt(
+            np.asarray(user_item.multiply(user_item).sum(axis=1), dtype=np.float64).ravel()
+        )
+        self._clear_overlay()
+        return self
+
+    def _norms_for(self, rows):
+        known = rows < len(self.norms)
+        return np.where(known, self.norms[np.where(known, rows, 0)], 0.0)
+
+    def _append_row(self, user, cols, sims):
+        """Make (cols, sims) the overlay row of user, the latest update"""
+        segment = self._segments[-1] + 1 if len(self._segments) else 0
+        start, end = self._n_patches, self._n_patches + len(cols)
+        if end > len(self._keys):
+            capacity = max(2 * len(self._keys), end, 1024)
+            keys, sims_buffer = np.empty(capacity, dtype=np.int64), np.empty(capacity)
+            keys[:start], sims_buffer[:start] = self._keys[:start], self._sims[:start]
+            self._keys, self._sims = keys, sims_buffer
+        self._keys[start:end] = (np.int64(segment) << 32) | cols
+        self._sims[start:end] = sims
+        self._n_patches = end
+        # Users and segments stay in update order: a re-rated user moves to the end
+        if user in self._rows:
+            keep = self._users != user
+            self._users, self._segments = self._users[keep], self._segments[keep]
+        self._users = np.append(self._users, user)
+        self._segments = np.append(self._segments, segment)
+        self._rows[user] = (segment, start, end)
+
+    def _columns(self, segments, rows):
+        """(len(rows) x len(segments)) similarities read from overlay rows"""
+        keys = (segments[None, :] << 32) | np.asarray(rows, dtype=np.int64)[:, None]
+        stored = self._keys[:self._n_patches]
+        pos = np.minimum(np.searchsorted(stored, keys), self._n_patches - 1)
+        return np.where(stored[pos] == keys, self._sims[pos], 0.0)
+
+    def _current_row(self, row):
+        """(user ids, similarities) of one row, overlay rows and columns applied"""
+        users, segments = self._users, self._segments
+        newer = np.ones(len(users), dtype=bool)
+        if row in self._rows:
+            segment, start, end = self._rows[row]
+            cols = self._keys[start:end] & 0xFFFFFFFF
+            sims = self._sims[start:end]
+            # Only users updated after this one still patch its row
+            newer = segments > segment
+        elif row < self.similarity.shape[0]:
+            start, end = self.similarity.indptr[row], self.similarity.indptr[row + 1]
+            cols = self.similarity.indices[start:end].astype(np.int64)
+            sims = self.similarity.data[start:end].astype(np.float64)
+        else:
+            cols, sims = np.empty(0, dtype=np.int64), np.empty(0)
+        if newer.any():
+            patched = users[newer]
+            values = self._columns(segments[newer], [row])[0]
+            keep = ~np.isin(cols, patched)
+            cols = np.concatenate([cols[keep], patched[values > 0]])
+            sims = np.concatenate([sims[keep], values[values > 0]])
+        keep = cols != row
+        return cols[keep], sims[keep]
+
+    def _block(self, rows):
+        """Current similarity rows as a dense (len(rows) x n_users) block"""
+        block = np.zeros((len(rows), self.n_users))
+        base = rows < self.similarity.shape[0]
+        block[base, :self.similarity.shape[1]] = self.similarity[rows[base]].toarray()
+        if self._rows:
+            # Every overlay row patches its user's column; rows with an
+            # overlay of their own are rebuilt whole
+            users, segments = self._users, self._segments
+            block[:, users] = self._columns(segments, rows)
+            for i in np.flatnonzero(np.isin(rows, users)):
+                cols, sims = self._current_row(rows[i])
+                block[i] = 0
+                block[i, cols] = sims
+        return block
+
+    def update_rating(self, ratings, user_row, item, old, new):
+        previous, previous_sims = self._current_row(user_row)
+        norm = self._norms_for(np.array([user_row]))[0]
+
+        # Recover dot products from the current similarities and norms, then
+        # apply the change: dot(u, v) moves by (new - old) * r(v, item)
+        raters, rater_ratings = ratings.item_column(item)
+        others = raters != user_row
+        cols = np.concatenate([previous, raters[others]])
+        dots = np.concatenate([
+            previous_sims * norm * self._norms_for(previous),
+            (new - old) * rater_ratings[others].astype(np.float64),
+        ])
+        cols, inverse = np.unique(cols, return_inverse=True)
+        dots = np.bincount(inverse, weights=dots, minlength=len(cols))
+
+        if user_row >= len(self.norms):
+            self.norms = np.pad(self.norms, (0, user_row + 1 - len(self.norms)))
+        self.norms = writable(self.norms)
+        self.norms[user_row] = np.sqrt(max(norm ** 2 + new ** 2 - old ** 2, 0.0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sims = dots / (self.norms[user_row] * self._norms_for(cols))
+        sims[~np.isfinite(sims) | (sims <= 1e-12)] = 0
+
+        kept = sims > 0
+        self._append_row(user_row, cols[kept], sims[kept])
+
+        super().update_rating(ratings, user_row, item, old, new)
+        if self._n_patches > self.max_patches:
+            self.compact()
+
+    def compact(self):
+        touched = self._users.tolist()
+        if touched:
+            rows = [self._current_row(row) for row in touched]
+            row_ids = np.repeat(np.array(touched, dtype=np.int64), [len(c) for c, _ in rows])
+            cols = np.concatenate([cols for cols, _ in rows])
+            sims = np.concatenate([sims for _, sims in rows])
+            # Each overlay row is also its user's column, except where the
+            # other user has an overlay row of its own
+            outside = ~np.isin(cols, touched)
+            base = self.similarity.tocoo()
+            keep = ~(np.isin(base.row, touched) | np.isin(base.col, touched))
+            n_users = self.n_users
+            self.similarity = sp.csr_matrix(
+                (np.concatenate([base.data[keep], sims, sims[outside]]),
+                 (np.concatenate([base.row[keep], row_ids, cols[outside]]),
+                  np.concatenate([base.col[keep], cols, row_ids[outside]]))),
+                shape=(n_users, n_users),
+            )
+            self._clear_overlay()
+        super().compact()
+
+    def query(self, user_rows, k):
+        user_rows = np.asarray(user_rows)
+        step = max(1, self.block_elements // max(self.n_users, 1))
+        neighbors = np.full((len(user_rows), k), -1, dtype=np.int64)
+        sims = np.zeros((len(user_rows), k))
+        for start in range(0, len(user_rows), step):
+            rows = user_rows[start:start + step]
+            block = self._block(rows)
+
+            # Exclude similarity with self
+            _exclude_self(block, rows)
+            top = top_k_rows(block, k)
+            neighbors[start:start + step, :top.shape[1]] = top
+            sims[start:start + step, :top.shape[1]] = np.take_along_axis(block, top, axis=1)
+        return _pad(neighbors, sims, k)
+
+
+class LSHNeighborIndex(ExactNeighborIndex):
+    """Random-projection LSH over user rating vectors
+
+    Each of n_tables hash tables signs n_bits random hyperplane projections,
+    so users pointing the same way land in the same bucket. Queries re-rank
+    the union of their buckets exactly. More tables raise recall; more bits
+    shrink buckets and lower latency.
+
+    Sparse rating vectors share few items, so hyperplanes drawn over the
+    whole item space barely separate neighbours from strangers. They are
+    drawn in the span of the top n_components principal directions of the
+    users instead, where the users' taste structure lives.
+    """
+
+    _params = ('n_tables', 'n_bits', 'n_components', 'seed') + ExactNeighborIndex._params
+    _arrays = ('projections', 'offsets', 'codes', 'order', 'sorted_codes')
+
+    def __init__(self, n_tables=24, n_bits=6, n_components=32, seed=0, block_elements=1 << 22,
+                 max_updates=1024):
+        super().__init__(block_elements, max_updates)
+        if not 0 < n_bits <= 62:
+            raise ValueError("n_bits must be between 1 and 62")
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.n_components = n_components
+        self.seed = seed
+
+    def _codes(self, vectors):
+        # Centre on the mean user: rating vectors all live in the positive
+        # orthant, where uncentred hyperplanes barely split them
+        projected = np.asarray(vectors @ self.projections) > self.offsets
+        bits = projected.reshape(vectors.shape[0], self.n_tables, self.n_bits)
+        return (bits * (np.int64(1) << np.arange(self.n_bits))).sum(axis=2)
+
+    def _basis(self, rng):
+        """(n_items x d) orthonormal basis of the top principal directions"""
+        from scipy.sparse.linalg import svds
+
+        n_components = min(self.n_components, min(self.vectors.shape) - 1)
+        if n_components < 1:
+            return np.eye(self.vectors.shape[1], dtype=np.float32)
+        v0 = rng.standard_normal(min(self.vectors.shape))
+        return svds(self.vectors, n_components, v0=v0)[2].T
+
+    def build(self, user_item):
+        super().build(user_item)
+        rng = np.random.default_rng(self.seed)
+        basis = self._basis(rng)
+        self.projections = (
+            basis @ rng.standard_normal((basis.shape[1], self.n_tables * self.n_bits))
+        ).astype(np.float32)
+        self.offsets = np.asarray(self.vectors.mean(axis=0) @ self.projections).ravel()
+        self.codes = self._codes(self.vectors)
+        self._sort_tables()
+        return self
+
+    def _sort_tables(self):
+        # One sorted code array per table; a bucket is a contiguous run
+        self.order = np.argsort(self.codes, axis=0, kind='stable').T.copy()
+        self.sorted_codes = np.take_along_axis(self.codes, self.order.T, axis=0).T.copy()
+
+    def _reindex(self, user_rows):
+        if self.n_users > len(self.codes):
+            self.codes = np.pad(self.codes, ((0, self.n_users - len(self.codes)), (0, 0)))
+        self.codes = writable(self.codes)
+        self.codes[user_rows] = self._codes(self.vectors[user_rows])
+        self._sort_tables()
+
+    def _candidates(self, vectors):
+        codes = self._codes(vectors)
+        n_queries, n_users = codes.shape[0], self.n_users
+        lo = np.empty_like(codes)
+        hi = np.empty_like(codes)
+        for t in range(self.n_tables):
+            lo[:, t] = np.searchsorted(self.sorted_codes[t], codes[:, t], side='left')
+            hi[:, t] = np.searchsorted(self.sorted_codes[t], codes[:, t], side='right')
+        lo += np.arange(self.n_tables) * self.order.shape[1]
+        hi += np.arange(self.n_tables) * self.order.shape[1]
+        order = self.order.ravel()
+
+        # Buffered users are bucketed by their current codes
+        if self._updates:
+            ids, updated = self._updated_vectors()
+            matches = (codes[:, None, :] == self._codes(updated)[None, :, :]).any(axis=2)
+
+        # Mark the users of every (query, table) bucket, a block of queries
+        # at a time, which also drops users found in several tables
+        candidates = []
+        step = max(1, self.block_elements // max(n_users, 1))
+        for start in range(0, n_queries, step):
+            stop = min(start + step, n_queries)
+            sizes = (hi[start:stop] - lo[start:stop]).ravel()
+            within = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+            users = order[np.repeat(lo[start:stop].ravel(), sizes) + within]
+            queries = np.repeat(np.arange(stop - start), sizes.reshape(stop - start, -1).sum(axis=1))
+            found = np.zeros((stop - start, n_users), dtype=bool)
+            found[queries, users] = True
+            if self._updates:
+                query_rows, update_rows = np.nonzero(matches[start:stop])
+                found[query_rows, ids[update_rows]] = True
+            rows, users = np.nonzero(found)
+            candidates.extend(np.split(users, np.searchsorted(rows, np.arange(1, stop - start))))
+        return candidates
+
+    def _search(self, vectors, k, exclude=None):
+        return self._rerank(vectors, self._candidates(vectors), k, exclude)
+
+
+class IVFNeighborIndex(ExactNeighborIndex):
+    """Inverted-file index: users clustered with spherical k-means
+
+    Queries score the n_lists centroids, then re-rank the members of the
+    n_probe closest lists exactly. Raising n_probe trades latency for
+    recall; n_probe == n_lists is an exact search.
+    """
+
+    _params = ('n_lists', 'n_probe', 'n_iter', 'seed') + ExactNeighborIndex._params
+    _arrays = ('centroids', 'assignment', 'list_members', 'list_offsets')
+
+    def __init__(self, n_lists=64, n_probe=4, n_iter=10, seed=0, block_elements=1 << 22,
+                 max_updates=1024):
+        super().__init__(block_elements, max_updates)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+
+    def _assign(self, vectors):
+        step = max(1, self.block_elements // self.centroids.shape[0])
+        return np.concatenate([
+            np.asarray(vectors[start:start + step] @ self.centroids.T).argmax(axis=1)
+            for start in range(0, vectors.shape[0], step)
+        ])
+
+    def build(self, user_item):
+        super().build(user_item)
+        rng = np.random.default_rng(self.seed)
+        n_lists = min(self.n_lists, self.n_users)
+        seeds = rng.choice(self.n_users, n_lists, replace=False)
+        self.centroids = self.vectors[seeds].toarray()
+
+        for _ in range(self.n_iter):
+            assignment = self._assign(self.vectors)
+            members = sp.csr_matrix(
+                (np.ones(self.n_users, dtype=np.float32), (assignment, np.arange(self.n_users))),
+                shape=(n_lists, self.n_users),
+            )
+            centroids = np.asarray((members @ self.vectors).todense())
+
+            # Re-seed empty lists from random users
+            empty = np.flatnonzero(np.asarray(members.sum(axis=1)).ravel() == 0)
+            centroids[empty] = self.vectors[rng.choice(self.n_users, len(empty))].toarray()
+            self.centroids = normalize(centroids)
+
+        self.assignment = self._assign(self.vectors)
+        self._sort_lists()
+        return self
+
+    def _sort_lists(self):
+        self.list_members = np.argsort(self.assignment, kind='stable')
+        self.list_offsets = np.searchsorted(
+            self.assignment[self.list_members], np.arange(self.centroids.shape[0] + 1)
+        )
+
+    def _reindex(self, user_rows):
+        if self.n_users > len(self.assignment):
+            self.assignment = np.pad(self.assignment, (0, self.n_users - len(self.assignment)))
+        self.assignment = writable(self.assignment)
+        self.assignment[user_rows] = self._assign(self.vectors[user_rows])
+        self._sort_lists()
+
+    def _search(self, vectors, k, exclude=None):
+        centroid_scores = np.asarray(vectors @ self.centroids.T)
+        probes = top_k_rows(centroid_scores, self.n_probe)
+        candidates = [
+            [self.list_members[self.list_offsets[p]:self.list_offsets[p + 1]] for p in row]
+            for row in probes
+        ]
+
+        # Buffered users are listed under their current nearest centroid
+        if self._updates:
+            ids, updated = self._updated_vectors()
+            lists = self._assign(updated)
+            for i, row in enumerate(probes):
+                candidates[i].append(ids[np.isin(lists, row)])
+        candidates = [np.unique(np.concatenate(parts)) for parts in candidates]
+        return self._rerank(vectors, candidates, k, exclude)
+
+
+def _top_k_for_rows(vectors, transposed, rows, k, block_elements):
+    """Exact top-k neighbours of the given users against every user"""
+    n_users = vectors.shape[0]
+    step = max(1, block_elements // max(n_users, 1))
+    neighbors = np.empty((len(rows), k), dtype=np.int32)
+    sims = np.empty((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), step):
+        block_rows = rows[start:start + step]
+        block = (vectors[block_rows] @ transposed).toarray()
+        _exclude_self(block, block_rows)
+        top = top_k_rows(block, k)
+        found, found_sims = _pad(top, np.take_along_axis(block, top, axis=1), k)
+        neighbors[start:start + step] = found
+        sims[start:start + step] = found_sims
+    return neighbors, sims
+
+
+def _share(arrays):
+    """Copy arrays into new shared-memory segments
+
+    Returns the segments (the caller must close and unlink them) and
+    picklable (name, segment, shape, dtype) specs for the workers.
+    """
+    segments, specs = [], []
+    for name, array in arrays.items():
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+        segments.append(segment)
+        specs.append((name, segment.name, array.shape, array.dtype.str))
+    return segments, specs
+
+
+_shard = {}
+
+
+def _attach_shard(specs, shape, k, block_elements):
+    """Process-pool initializer: map the shared input matrices, zero-copy"""
+    arrays = {}
+    for name, segment_name, array_shape, dtype in specs:
+        # Pool workers share the parent's resource tracker, which unlinks
+        # the segments when the parent does
+        segment = shared_memory.SharedMemory(name=segment_name)
+        _shard.setdefault('segments', []).append(segment)
+        arrays[name] = np.ndarray(array_shape, dtype, buffer=segment.buf)
+    _shard['vectors'] = sp.csr_matrix(
+        (arrays['data'], arrays['indices'], arrays['indptr']), shape=shape, copy=False
+    )
+    _shard['transposed'] = sp.csr_matrix(
+        (arrays['t_data'], arrays['t_indices'], arrays['t_indptr']), shape=shape[::-1], copy=False
+    )
+    _shard['k'] = k
+    _shard['block_elements'] = block_elements
+
+
+def _shard_top_k(start, stop):
+    """Top-k neighbours of users start:stop, run inside a pool worker"""
+    neighbors, sims = _top_k_for_rows(
+        _shard['vectors'], _shard['transposed'], np.arange(start, stop),
+        _shard['k'], _shard['block_elements'],
+    )
+    return start, neighbors, sims
+
+
+class ShardedNeighborIndex(ExactNeighborIndex):
+    """Precomputed top-k neighbour table built by a pool of worker processes
+
+    build() splits users into shards of shard_rows rows. Each worker maps
+    the normalised rating matrix (and its transpose) from shared memory,
+    scores its shard block by block and keeps only the n_neighbors best
+    neighbours per user, so neither the dense nor the sparse users x users
+    similarity matrix is ever held. Queries for up to n_neighbors
+    neighbours are then table lookups.
+
+    Rating updates stay exact: similarities to buffered users are scored
+    on the fly, and rows that lose too many table entries fall back to a
+    full search. compact() recomputes only the rows the updates touched.
+    """
+
+    _params = ('n_neighbors', 'n_workers', 'shard_rows') + ExactNeighborIndex._params
+    _arrays = ('neighbors', 'similarities')
+
+    def __init__(self, n_neighbors=50, n_workers=None, shard_rows=2048, block_elements=1 << 22,
+                 max_updates=1024):
+        super().__init__(block_elements, max_updates)
+        self.n_neighbors = n_neighbors
+        self.n_workers = n_workers
+        self.shard_rows = shard_rows
+
+    def build(self, user_item):
+        super().build(user_item)
+        n_users = self.n_users
+        n_workers = self.n_workers or os.cpu_count() or 1
+        if n_workers == 1 or n_users <= self.shard_rows:
+            self.neighbors, self.similarities = _top_k_for_rows(
+                self.vectors, self.vectors.T.tocsr(), np.arange(n_users),
+                self.n_neighbors, self.block_elements,
+            )
+            return self
+
+        transposed = self.vectors.T.tocsr()
+        segments, specs = _share({
+            'data': self.vectors.data, 'indices': self.vectors.indices,
+            'indptr': self.vectors.indptr, 't_data': transposed.data,
+            't_indices': transposed.indices, 't_indptr': transposed.indptr,
+        })
+        self.neighbors = np.empty((n_users, self.n_neighbors), dtype=np.int32)
+        self.similarities = np.empty((n_users, self.n_neighbors), dtype=np.float32)
+        starts = range(0, n_users, self.shard_rows)
+        try:
+            with ProcessPoolExecutor(
+                n_workers, initializer=_attach_shard,
+                initargs=(specs, self.vectors.shape, self.n_neighbors, self.block_elements),
+            ) as pool:
+                stops = [min(start + self.shard_rows, n_users) for start in starts]
+                for start, neighbors, sims in pool.map(_shard_top_k, starts, stops):
+                    self.neighbors[start:start + len(neighbors)] = neighbors
+                    self.similarities[start:start + len(neighbors)] = sims
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+        return self
+
+    def _reindex(self, user_rows):
+        # Rows that changed, rows that listed a changed user, and rows of
+        # everyone who now shares a rated item with one
+        vectors = self.vectors
+        co_raters = (vectors[user_rows] @ vectors.T).tocsc()
+        touched = np.zeros(self.n_users, dtype=bool)
+        touched[user_rows] = True
+        touched[np.flatnonzero(np.diff(co_raters.indptr))] = True
+        touched[:len(self.neighbors)] |= np.isin(self.neighbors, user_rows).any(axis=1)
+
+        if self.n_users > len(self.neighbors):
+            missing = self.n_users - len(self.neighbors)
+            self.neighbors = np.pad(self.neighbors, ((0, missing), (0, 0)), constant_values=-1)
+            self.similarities = np.pad(self.similarities, ((0, missing), (0, 0)))
+        self.neighbors = writable(self.neighbors)
+        self.similarities = writable(self.similarities)
+        rows = np.flatnonzero(touched)
+        self.neighbors[rows], self.similarities[rows] = _top_k_for_rows(
+            vectors, vectors.T.tocsr(), rows, self.n_neighbors, self.block_elements
+        )
+
+    def query(self, user_rows, k):
+        user_rows = np.asarray(user_rows)
+        if k > self.n_neighbors:
+            return super().query(user_rows, k)
+
+        # Users missing from the table or whose own vector changed need a
+        # full search
+        stale, _ = self._stale(user_rows)
+        exact = stale | (user_rows >= len(self.neighbors))
+        served = np.flatnonzero(~exact)
+        rows = user_rows[served]
+        table = self.neighbors[rows].astype(np.int64)
+        table_sims = self.similarities[rows].astype(np.float64)
+
+        short = np.zeros(len(rows), dtype=bool)
+        if self._updates:
+            # Swap table entries of buffered users for fresh scores. A full
+            # row left with fewer than k other entries may be missing its
+            # k-th best neighbour, so it is searched in full instead
+            ids, updated = self._updated_vectors()
+            moved = np.isin(table, ids)
+            short = (table[:, -1] >= 0) & (((table >= 0) & ~moved).sum(axis=1) < k)
+            fresh = (self._vectors_for(rows) @ updated.T).toarray()
+            fresh[ids[None, :] == rows[:, None]] = 0
+            table = np.hstack([np.where(moved, -1, table), np.broadcast_to(ids, fresh.shape)])
+            table_sims = np.hstack([np.where(moved, 0.0, table_sims), fresh])
+
+        top = top_k_rows(table_sims, k)
+        neighbors = np.full((len(user_rows), k), -1, dtype=np.int64)
+        sims = np.zeros((len(user_rows), k))
+        neighbors[served], sims[served] = _pad(
+            np.take_along_axis(table, top, axis=1), np.take_along_axis(table_sims, top, axis=1), k
+        )
+        exact[served[short]] = True
+        if exact.any():
+            neighbors[exact], sims[exact] = super().query(user_rows[exact], k)
+        return neighbors, sims
+
+
+INDEXES = {
+    index.__name__: index
+    for index in (ExactNeighborIndex, SimilarityMatrixIndex, LSHNeighborIndex, IVFNeighborIndex,
+                  ShardedNeighborIndex)
+}
+
+
+def load_index(path, mmap=True):
+    """Load any saved neighbour index, whatever its backend"""
+    return INDEXES[read_manifest(path)['kind']].load(path, mmap)
@@ -0,0 +1,348 @@
+import numpy as np
+import scipy.sparse as sp
+
+from catalog import StringColumn
+from model_store import load_model, save_model
+
+
+def _is_int(value):
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+def _encode_ids(ids, name):
+    """(column, is_int tags or None) to save a list of ids as
+
+    Integer ids become an int64 column and anything else a StringColumn.
+    A mix of both is saved as strings with a tag per id, so the integers
+    come back as integers.
+    """
+    is_int = np.fromiter((_is_int(value) for value in ids), dtype=bool, count=len(ids))
+    if is_int.all():
+        return np.array(ids, dtype=np.int64), None
+    for value in ids:
+        if not _is_int(value) and not isinstance(value, str):
+            raise ValueError(f"{name} must be integers or strings, not {type(value).__name__}")
+    return StringColumn.from_strings(ids), is_int if is_int.any() else None
+
+
+class _Ids:
+    """A store's user ids or item titles with their {id: position} index
+
+    A loaded store keeps the saved column (int64 for integer ids, else a
+    StringColumn) memory-mapped; the Python list and the index dict are
+    only built when something first reads or looks up an id.
+    """
+
+    def __init__(self, ids=None, column=None, is_int=None):
+        self._list = None if ids is None else list(ids)
+        self._column = column
+        self._is_int = is_int
+        self._index = None
+
+    @classmethod
+    def from_arrays(cls, arrays, name):
+        if name in arrays:
+            return cls(column=arrays[name])
+        return cls(column=StringColumn(arrays[f'{name}.data'], arrays[f'{name}.offsets']),
+                   is_int=arrays.get(f'{name}.is_int'))
+
+    def arrays(self, name):
+        """The column as arrays for save_model"""
+        if self._list is None:
+            column, is_int = self._column, self._is_int
+        else:
+            column, is_int = _encode_ids(self._list, name)
+        if not isinstance(column, StringColumn):
+            return {name: column}
+        arrays = {f'{name}.data': column.data, f'{name}.offsets': column.offsets}
+        if is_int is not None:
+            arrays[f'{name}.is_int'] = is_int
+        return arrays
+
+    def __len__(self):
+        return len(self._list) if self._list is not None else len(self._column)
+
+    @property
+    def list(self):
+        if self._list is None:
+            self._list = self._column.tolist()
+            if self._is_int is not None:
+                tags = self._is_int.tolist()
+                self._list = [int(value) if tag else value for value, tag in zip(self._list, tags)]
+        return self._list
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {value: i for i, value in enumerate(self.list)}
+        return self._index
+
+    def append(self, value):
+        index = self.index
+        self.list.append(value)
+        self._column = self._is_int = None
+        index[value] = len(self._list) - 1
+
+
+class RatingStore:
+    """Sparse user-item rating store backed by scipy CSR/CSC matrices
+
+    Ratings live in a users x items CSR matrix (row access per user) with a
+    lazily built CSC copy for column access per item. Only explicit ratings
+    are stored, so memory grows with the number of ratings rather than with
+    users x movies. A rating of 0 means "not rated" and is never stored.
+
+    Single-rating writes go to a small pending buffer instead of rebuilding
+    the CSR arrays. Per-user and per-item reads merge the buffer on the fly;
+    reading the whole matrix (or exceeding max_pending) folds it in.
+
+    save() / load() persist the store as memory-mappable arrays, the user
+    ids and item titles included. A loaded store reads straight from the
+    mapped files and decodes the ids only on first use; writes go to the
+    pending buffer and compaction builds fresh in-memory arrays.
+    """
+
+    def __init__(self, user_item, user_ids, item_titles, max_pending=10000):
+        self._users = user_ids if isinstance(user_ids, _Ids) else _Ids(user_ids)
+        self._items = item_titles if isinstance(item_titles, _Ids) else _Ids(item_titles)
+        self.max_pending = max_pending
+        self._pending_rows = {}
+        self._pending_cols = {}
+        self._n_pending = 0
+        self._set_matrix(user_item)
+
+    @classmethod
+    def from_triples(cls, users, items, ratings, user_ids, item_titles):
+        """Build a store from integer (user, item, rating) arrays
+
+        When the same (user, item) pair appears more than once the last
+        rating wins.
+        """
+        users = np.asarray(users, dtype=np.int32)
+        items = np.asarray(items, dtype=np.int32)
+        ratings = np.asarray(ratings, dtype=np.float32)
+        shape = (len(user_ids), len(item_titles))
+
+        # Sorting the (user, item) keys lays them out in CSR order; within a
+        # run of equal keys the largest input position is the last rating
+        keys = users.astype(np.int64) * shape[1] + items
+        order = np.argsort(keys)
+        keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        starts = np.flatnonzero(first)
+        keys = keys[starts]
+        ratings = ratings[np.maximum.reduceat(order, starts)] if len(starts) else ratings[:0]
+        del order
+
+        indptr = np.searchsorted(keys, np.arange(shape[0] + 1, dtype=np.int64) * shape[1])
+        matrix = sp.csr_matrix((ratings, (keys % shape[1]).astype(np.int32), indptr), shape=shape)
+        return cls(matrix, user_ids, item_titles)
+
+    @classmethod
+    def from_dataframe(cls, ratings):
+        """Build a store from a dense movies x users DataFrame (0 = not rated)"""
+        values = ratings.to_numpy()
+        items, users = np.nonzero(values)
+        return cls.from_triples(
+            users, items, values[items, users], ratings.columns, ratings.index
+        )
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a store written by save(), memory-mapped by default"""
+        manifest, arrays, matrices = load_model(path, 'RatingStore', mmap)
+        users = _Ids.from_arrays(arrays, 'user_ids')
+        items = _Ids.from_arrays(arrays, 'item_titles')
+        store = cls(sp.csr_matrix((len(users), len(items)), dtype=np.float32),
+                    users, items, **manifest['params'])
+        # Saved matrices are already canonical; keep the mapped buffers as is
+        store._user_item = matrices['user_item']
+        return store
+
+    def save(self, path):
+        """Write the ratings, with pending writes applied, to a model directory"""
+        save_model(
+            path, 'RatingStore',
+            params={'max_pending': self.max_pending},
+            arrays={**self._users.arrays('user_ids'), **self._items.arrays('item_titles')},
+            matrices={'user_item': self.user_item},
+        )
+
+    def _set_matrix(self, user_item):
+        matrix = sp.csr_matrix(user_item, dtype=np.float32)
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        self._user_item = matrix
+        self._item_user = None
+
+    @property
+    def user_item(self):
+        """Users x items CSR matrix with every pending write applied"""
+        if self._pending_rows:
+            self.compact()
+        return self._user_item
+
+    @property
+    def item_user(self):
+        """Column-oriented (CSC) view of the ratings for per-item access"""
+        matrix = self.user_item
+        if self._item_user is None:
+            self._item_user = matrix.tocsc()
+        return self._item_user
+
+    @property
+    def user_ids(self):
+        return self._users.list
+
+    @property
+    def item_titles(self):
+        return self._items.list
+
+    @property
+    def user_index(self):
+        return self._users.index
+
+    @property
+    def item_index(self):
+        return self._items.index
+
+    @property
+    def n_users(self):
+        return len(self._users)
+
+    @property
+    def n_items(self):
+        return len(self._items)
+
+    @property
+    def nnz(self):
+        return self.user_item.nnz
+
+    @property
+    def nbytes(self):
+        """Bytes held by the CSR buffers"""
+        matrix = self.user_item
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+    def add_user(self, user):
+        """Append a user with no ratings and return its integer id"""
+        if user in self.user_index:
+            return self.user_index[user]
+        matrix = self._user_item
+        indptr = np.append(matrix.indptr, matrix.indptr[-1])
+        self._users.append(user)
+        shape = (matrix.shape[0] + 1, matrix.shape[1])
+        self._user_item = sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+        if self._item_user is not None:
+            # An empty row leaves the column layout untouched
+            columns = self._item_user
+            self._item_user = sp.csc_matrix((columns.data, columns.indices, columns.indptr), shape=shape)
+        return self.user_index[user]
+
+    def user_row(self, row):
+        """(item ids, ratings) of one integer user id, pending writes merged"""
+        matrix = self._user_item
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        items, ratings = matrix.indices[start:end], matrix.data[start:end]
+        pending = self._pending_rows.get(row)
+        if not pending:
+            return items, ratings
+        edited = np.fromiter(pending, dtype=items.dtype, count=len(pending))
+        values = np.fromiter(pending.values(), dtype=np.float32, count=len(pending))
+        keep = ~np.isin(items, edited)
+        items = np.concatenate([items[keep], edited[values != 0]])
+        ratings = np.concatenate([ratings[keep], values[values != 0]])
+        order = np.argsort(items, kind='stable')
+        return items[order], ratings[order]
+
+    def user_ratings(self, user):
+        """Return (item ids, ratings) for everything the user has rated"""
+        return self.user_row(self.user_index[user])
+
+    def user_rows(self, rows):
+        """CSR matrix of the given user rows, pending writes included"""
+        rows = np.asarray(rows)
+        if not any(row in self._pending_rows for row in rows.tolist()):
+            return self._user_item[rows]
+        parts = [self.user_row(row) for row in rows.tolist()]
+        indptr = np.concatenate([[0], np.cumsum([len(items) for items, _ in parts])])
+        return sp.csr_matrix(
+            (np.concatenate([r for _, r in parts]), np.concatenate([i for i, _ in parts]), indptr),
+            shape=(len(rows), self.n_items),
+        )
+
+    def item_raters(self, title):
+        """Return (user ids, ratings) for everyone who rated a movie"""
+        return self.item_column(self.item_index[title])
+
+    def item_column(self, col):
+        """(user ids, ratings) of one integer item id, pending writes merged"""
+        if self._item_user is None:
+            self._item_user = self._user_item.tocsc()
+        matrix = self._item_user
+        start, end = matrix.indptr[col], matrix.indptr[col + 1]
+        users, ratings = matrix.indices[start:end], matrix.data[start:end]
+        pending = self._pending_cols.get(col)
+        if not pending:
+            return users, ratings
+        edited = np.fromiter(pending, dtype=users.dtype, count=len(pending))
+        values = np.fromiter(pending.values(), dtype=np.float32, count=len(pending))
+        keep = ~np.isin(users, edited)
+        users = np.concatenate([users[keep], edited[values != 0]])
+        ratings = np.concatenate([ratings[keep], values[values != 0]])
+        order = np.argsort(users, kind='stable')
+        return users[order], ratings[order]
+
+    def get_rating(self, user, title):
+        """Return the user's rating for a movie, 0 if not rated"""
+        items, ratings = self.user_ratings(user)
+        col = self.item_index[title]
+        pos = np.searchsorted(items, col)
+        if pos < len(items) and items[pos] == col:
+            return float(ratings[pos])
+        return 0.0
+
+    def set_rating(self, user, title, rating):
+        """Insert, update or (with rating 0) delete a single rating"""
+        row = self.user_index[user]
+        col = self.item_index[title]
+        edits = self._pending_rows.setdefault(row, {})
+        self._n_pending += col not in edits
+        edits[col] = float(rating)
+        self._pending_cols.setdefault(col, {})[row] = float(rating)
+        if self._n_pending > self.max_pending:
+            self.compact()
+
+    def compact(self):
+        """Fold pending writes into the CSR matrix with one O(nnz) rebuild"""
+        if not self._pending_rows:
+            return
+        edits = [
+            (row, col, rating)
+            for row, cols in self._pending_rows.items()
+            for col, rating in cols.items()
+        ]
+        rows, cols, ratings = (np.array(values) for values in zip(*edits))
+        self._pending_rows = {}
+        self._pending_cols = {}
+        self._n_pending = 0
+
+        matrix = self._user_item.tocoo()
+        n_items = matrix.shape[1]
+        edited = np.isin(matrix.row.astype(np.int64) * n_items + matrix.col,
+                         rows.astype(np.int64) * n_items + cols)
+        keep = ~edited
+        self._set_matrix(sp.csr_matrix(
+            (np.concatenate([matrix.data[keep], ratings]),
+             (np.concatenate([matrix.row[keep], rows]), np.concatenate([matrix.col[keep], cols]))),
+            shape=matrix.shape,
+        ))
+
+    def to_dataframe(self):
+        """Dense movies x users DataFrame; only sensible for small data"""
+        import pandas as pd
+
+        return pd.DataFrame(
+            self.user_item.T.toarray(), index=self.item_titles, columns=self.user_ids
+        )
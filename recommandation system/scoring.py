@@ -0,0 +1,144 @@
+import numpy as np
+import scipy.sparse as sp
+
+import metrics
+from topk import top_k
+
+
+class NeighborhoodScorer:
+    """Vectorized user-based collaborative filtering scores
+
+    Predicts every unrated item for a block of users with two sparse matrix
+    products instead of a Python loop per movie and neighbour:
+
+        weighted_sum   = W @ R
+        similarity_sum = |W| @ (R > 0)
+
+    where each row of W holds the similarities of one user's top neighbours
+    (as found by any index from neighbors.py) and R is the users x items
+    rating matrix. The prediction for an item is weighted_sum /
+    similarity_sum wherever at least one neighbour rated it.
+    """
+
+    def __init__(self, ratings, neighbor_index, n_neighbors=3):
+        self.ratings = ratings
+        self.neighbor_index = neighbor_index
+        self.n_neighbors = n_neighbors
+
+    def neighbor_weights(self, user_rows):
+        """Top-k neighbour similarities as (weights, neighbour user ids)
+
+        weights is a sparse (len(user_rows) x len(neighbour ids)) matrix, so
+        only the rating rows of users that actually act as neighbours are
+        ever read.
+        """
+        with metrics.timer('collaborative.neighbors'):
+            neighbors, sims = self.neighbor_index.query(user_rows, self.n_neighbors)
+        return self._weights(neighbors, sims)
+
+    def _weights(self, neighbors, sims):
+        # Users with nothing in common contribute nothing, so leave them out
+        keep = neighbors >= 0
+        rows = np.repeat(np.arange(len(neighbors)), neighbors.shape[1]).reshape(neighbors.shape)
+        users, columns = np.unique(neighbors[keep], return_inverse=True)
+        weights = sp.csr_matrix(
+            (sims[keep], (rows[keep], columns)), shape=(len(neighbors), len(users))
+        )
+        return weights, users
+
+    def score(self, user_rows):
+        """Predicted ratings for unrated items as a sparse (users x items) matrix"""
+        user_rows = np.asarray(user_rows)
+        return self._predict(self.neighbor_weights(user_rows), self.ratings.user_rows(user_rows))
+
+    def score_vectors(self, vectors):
+        """Predicted ratings for users given only as rating vectors
+
+        vectors is a (users x items) rating matrix of users the index has
+        never seen, e.g. a new user's first ratings. They are matched
+        against the stored users as they are, so neither the index nor the
+        rating store changes.
+        """
+        vectors = sp.csr_matrix(vectors, dtype=np.float32)
+        with metrics.timer('collaborative.neighbors'):
+            neighbors, sims = self.neighbor_index.query_vectors(vectors, self.n_neighbors)
+        return self._predict(self._weights(neighbors, sims), vectors)
+
+    def _predict(self, neighbor_weights, user_ratings):
+        weights, neighbors = neighbor_weights
+        metrics.count('collaborative.neighbors_used', weights.nnz)
+        with metrics.timer('collaborative.predict'):
+            ratings = self.ratings.user_rows(neighbors)
+
+            rated = ratings.copy()
+            rated.data = np.ones_like(rated.data)
+            weighted_sum = (weights @ ratings).tocsr()
+            similarity_sum = (weights @ rated).tocsr()
+            weighted_sum.sort_indices()
+            similarity_sum.sort_indices()
+
+            # Both products share one sparsity pattern, so divide the data arrays
+            predictions = weighted_sum.copy()
+            predictions.data = weighted_sum.data / similarity_sum.data
+
+            # Drop items the user has already rated
+            predictions = predictions - predictions.multiply(user_ratings != 0)
+            predictions.eliminate_zeros()
+        return predictions
+
+    def score_items(self, user_rows, items):
+        """Predicted ratings of chosen items as a dense (users x m) array
+
+        items is a (users x m) array of item ids, one row of candidates per
+        user, with -1 as padding. Only the candidate columns of the
+        neighbours' ratings are read. Padding, and items no neighbour rated,
+        score NaN.
+        """
+        items = np.asarray(items)
+        weights, neighbors = self.neighbor_weights(np.asarray(user_rows))
+        valid = items >= 0
+        columns, inverse = np.unique(np.where(valid, items, 0).ravel(), return_inverse=True)
+        ratings = self.ratings.user_rows(neighbors)[:, columns]
+
+        rated = ratings.copy()
+        rated.data = np.ones_like(rated.data)
+        weighted_sum = np.asarray((weights @ ratings).todense())
+        similarity_sum = np.asarray((weights @ rated).todense())
+
+        rows = np.arange(len(items))[:, None]
+        inverse = inverse.reshape(items.shape)
+        weighted_sum = weighted_sum[rows, inverse]
+        similarity_sum = similarity_sum[rows, inverse]
+        found = valid & (similarity_sum != 0)
+        predictions = np.full(items.shape, np.nan)
+        predictions[found] = weighted_sum[found] / similarity_sum[found]
+        return predictions
+
+    def score_columns(self, user_rows, items):
+        """score_items() for one item id array shared by every user"""
+        items = np.asarray(items)
+        return self.score_items(user_rows, np.broadcast_to(items, (len(user_rows), len(items))))
+
+    def update_rating(self, ratings, user_row, item, old, new):
+        """Keep the neighbour index in step with one changed rating"""
+        self.neighbor_index.update_rating(ratings, user_row, item, old, new)
+
+    def recommend_batch(self, user_rows, top_n=3):
+        """Top-n (item ids, scores) per user, highest predicted rating first"""
+        return self._top(self.score(user_rows), top_n)
+
+    def recommend_vectors(self, vectors, top_n=3):
+        """Top-n (item ids, scores) per unseen user's rating vector"""
+        return self._top(self.score_vectors(vectors), top_n)
+
+    def _top(self, predictions, top_n):
+        metrics.count('collaborative.candidates_scored', predictions.nnz)
+        results = []
+        with metrics.timer('collaborative.top_k'):
+            for row in range(predictions.shape[0]):
+                start, end = predictions.indptr[row], predictions.indptr[row + 1]
+                items = predictions.indices[start:end]
+                scores = predictions.data[start:end]
+                order = top_k(scores, top_n)
+                results.append((items[order], scores[order]))
+        return results
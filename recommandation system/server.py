@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Non-interactive HTTP service for both recommenders (asyncio, stdlib only)
+
+Endpoints (all return JSON):
+
+    GET  /health
+    GET  /stats
+    GET  /metrics           (Prometheus text; ?format=json for JSON)
+    GET  /recommend/content?q=Action,Sci-Fi&top_n=5
+    GET  /recommend/collaborative?user=User1&top_n=3
+    POST /recommend/batch   {"queries": [...]} or {"users": [...]}, "top_n": n
+
+Both recommend routes take optional filters: repeated genre= parameters
+(results must have every genre) and exclude= titles; a batch takes them
+as "genres" and "exclude" lists applying to every request in it.
+
+Scoring runs on a thread pool so the event loop never blocks, and
+concurrent single requests are coalesced into one batched scoring call.
+With --workers > 1 the models are loaded once in the parent and the
+workers are forked from it, sharing one listening socket and the
+(memory-mapped, read-only) model pages.
+SIGTERM or SIGINT stops accepting connections, finishes the requests in
+progress and exits; the parent passes SIGTERM on to the workers.
+
+--content-only skips the collaborative recommender; with --content-model
+the process then imports only NumPy and the standard library, which keeps
+worker start-up and memory small.
+
+--metrics turns on the stage timers and counters of metrics.py, and
+--profile-rate samples that fraction of scoring calls under cProfile
+into --profile-dir. Each worker keeps its own registry.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from catalog import Recommendation
+from filters import ItemFilter
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    """json.dumps fallback: result records become plain objects"""
+    if isinstance(value, Recommendation):
+        return value.to_dict()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class MicroBatcher:
+    """Coalesces concurrent single requests into one batched call
+
+    Requests sharing a key (e.g. the same top_n) that arrive within
+    max_delay seconds of the first one, up to max_batch of them, are
+    passed together to func(key, items) on the executor; each caller gets
+    its own entry of the returned list.
+    """
+
+    def __init__(self, func, executor, max_batch=64, max_delay=0.002):
+        self.func = func
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = {}
+        self.running = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, key, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if key not in self.pending:
+            timer = loop.call_later(self.max_delay, self._flush, key)
+            self.pending[key] = ([], timer)
+        batch, _ = self.pending[key]
+        batch.append((item, future))
+        if len(batch) >= self.max_batch:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        batch, timer = self.pending.pop(key, (None, None))
+        if batch:
+            timer.cancel()
+            task = asyncio.ensure_future(self._run(key, batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def drain(self):
+        """Run every queued batch now and wait until no batch is in flight"""
+        for key in list(self.pending):
+            self._flush(key)
+        if self.running:
+            await asyncio.gather(*self.running)
+
+    async def _run(self, key, batch):
+        self.batches += 1
+        self.items += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self.executor, self.func, key, [item for item, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'requests': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+        }
+
+
+class RecommendationServer:
+    """Routes HTTP requests to the recommenders through micro-batchers"""
+
+    def __init__(self, content=None, collaborative=None, threads=4, max_batch=64,
+                 max_delay=0.002):
+        self.content = content
+        self.collaborative = collaborative
+        self.executor = ThreadPoolExecutor(threads)
+        self.connections = {}
+        self.in_flight = 0
+        # Batches are keyed by (top_n, filter)
+        self.content_batcher = MicroBatcher(
+            lambda key, queries: self.content.recommend_batch(
+                queries, key[0], [key[1]] * len(queries)),
+            self.executor, max_batch, max_delay,
+        )
+        self.collaborative_batcher = MicroBatcher(
+            lambda key, users: self.collaborative.recommend_batch(
+                users, key[0], [key[1]] * len(users)),
+            self.executor, max_batch, max_delay,
+        )
+
+    async def start(self, host='127.0.0.1', port=8000, sock=None):
+        if sock is not None:
+            return await asyncio.start_server(self.handle, sock=sock)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def close(self, timeout=10.0):
+        """Finish the requests in progress, then drop idle connections
+
+        Call after closing the listener: queued batches run at once,
+        responses being written get up to timeout seconds, and the scoring
+        threads are shut down last.
+        """
+        await self.content_batcher.drain()
+        await self.collaborative_batcher.drain()
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.in_flight and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.005)
+        for writer in list(self.connections):
+            writer.close()
+        # Let the handlers see their connections close and return
+        if self.connections:
+            await asyncio.wait(list(self.connections.values()),
+                               timeout=max(deadline - asyncio.get_running_loop().time(), 0.1))
+        self.executor.shutdown(wait=True)
+
+    async def handle(self, reader, writer):
+        """Serve one keep-alive HTTP/1.1 connection"""
+        self.connections[writer] = asyncio.current_task()
+        busy = False
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                # A request counts as in flight until its response is written
+                self.in_flight += 1
+                busy = True
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    status, payload = 200, await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload, version = e.status, {'error': str(e)}, 'HTTP/1.1'
+                except ValueError as e:
+                    status, payload, version = 400, {'error': str(e)}, 'HTTP/1.1'
+                except Exception as e:
+                    status, payload, version = 500, {'error': repr(e)}, 'HTTP/1.1'
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                if isinstance(payload, str):
+                    content_type, data = 'text/plain; version=0.0.4', payload.encode()
+                else:
+                    content_type = 'application/json'
+                    data = json.dumps(payload, default=_json_default).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                self.in_flight -= 1
+                busy = False
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Client went away, or sent headers too broken to answer
+            pass
+        finally:
+            if busy:
+                self.in_flight -= 1
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        lists = parse_qs(url.query)
+        params = {name: values[-1] for name, values in lists.items()}
+        route = (method, url.path.rstrip('/'))
+
+        if route == ('GET', '/health'):
+            return {'status': 'ok'}
+        if route == ('GET', '/stats'):
+            return {
+                'content': self.content_batcher.stats(),
+                'collaborative': self.collaborative_batcher.stats(),
+                'cache': self.content.cache.stats() if self.content else None,
+            }
+        if route == ('GET', '/metrics'):
+            registry = metrics.registry()
+            if registry is None:
+                raise HTTPError(404, "metrics are disabled (start with --metrics)")
+            if params.get('format') == 'json':
+                return registry.snapshot()
+            return registry.prometheus()
+        if route == ('GET', '/recommend/content'):
+            query = self._require(self.content, params, 'q')
+            top_n = int(params.get('top_n', 5))
+            key = (top_n, self._item_filter(lists.get('genre'), lists.get('exclude')))
+            return {'recommendations': await self.content_batcher.submit(key, query)}
+        if route == ('GET', '/recommend/collaborative'):
+            user = self._require(self.collaborative, params, 'user')
+            self._check_users([user])
+            top_n = int(params.get('top_n', 3))
+            key = (top_n, self._item_filter(lists.get('genre'), lists.get('exclude')))
+            recommendations = await self.collaborative_batcher.submit(key, user)
+            return {'recommendations': [[title, score] for title, score in recommendations]}
+        if route == ('POST', '/recommend/batch'):
+            return await self._batch(json.loads(body or b'{}'))
+        if url.path.rstrip('/') in ('/health', '/stats', '/metrics', '/recommend/content',
+                                    '/recommend/collaborative', '/recommend/batch'):
+            raise HTTPError(405, f"{method} not allowed on {url.path}")
+        raise HTTPError(404, f"no route for {url.path}")
+
+    async def _batch(self, request):
+        """Explicit batches are already vectorized: one executor call each"""
+        loop = asyncio.get_running_loop()
+        results = {}
+        item_filter = self._item_filter(request.get('genres'), request.get('exclude'))
+        if 'queries' in request:
+            if self.content is None:
+                raise HTTPError(404, "content-based recommender not loaded")
+            top_n = int(request.get('top_n', 5))
+            queries = list(request['queries'])
+            results['queries'] = await loop.run_in_executor(
+                self.executor, self.content.recommend_batch, queries, top_n,
+                [item_filter] * len(queries)
+            )
+        if 'users' in request:
+            if self.collaborative is None:
+                raise HTTPError(404, "collaborative recommender not loaded")
+            self._check_users(request['users'])
+            top_n = int(request.get('top_n', 3))
+            users = list(request['users'])
+            batch = await loop.run_in_executor(
+                self.executor, self.collaborative.recommend_batch, users, top_n,
+                [item_filter] * len(users)
+            )
+            results['users'] = [[[title, score] for title, score in recs] for recs in batch]
+        if not results:
+            raise ValueError("batch request needs 'queries' or 'users'")
+        return results
+
+    def _require(self, recommender, params, name):
+        if recommender is None:
+            raise HTTPError(404, "recommender not loaded")
+        if name not in params:
+            raise ValueError(f"missing query parameter '{name}'")
+        return params[name]
+
+    def _item_filter(self, genres, exclude):
+        """An ItemFilter for genre / excluded title lists, or None without either"""
+        if not genres and not exclude:
+            return None
+        return ItemFilter(genres=genres or (), exclude_titles=exclude or ())
+
+    def _check_users(self, users):
+        # Validate up front so one unknown user cannot fail a shared batch
+        unknown = [user for user in users if user not in self.collaborative.ratings.user_index]
+        if unknown:
+            raise HTTPError(404, f"unknown users: {unknown[:10]}")
+
+
+def load_models(content_model=None, collaborative_model=None, content_only=False):
+    """Load saved (memory-mapped) models, or build the sample ones
+
+    With content_only the collaborative recommender is not loaded at all;
+    serving a saved content model that way imports nothing beyond NumPy.
+    """
+    from app import MovieRecommender
+
+    content = MovieRecommender.load(content_model) if content_model else MovieRecommender()
+    if content_only:
+        return content, None
+
+    from collaborative_filtering import CollaborativeRecommender
+
+    if collaborative_model:
+        collaborative = CollaborativeRecommender.load(collaborative_model)
+    else:
+        collaborative = CollaborativeRecommender()
+    # Lets genre filters apply to collaborative requests too
+    collaborative.attach_genres(content)
+    return content, collaborative
+
+
+def run_worker(sock, content, collaborative, args):
+    async def serve():
+        server = RecommendationServer(
+            content, collaborative, args.threads, args.max_batch, args.max_delay_ms / 1000
+        )
+        listener = await server.start(sock=sock)
+        # Signals only set the event, so no callback is ever interrupted;
+        # shutdown then runs as ordinary code on the loop
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+        listener.close()
+        await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve movie recommendations over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=1, help="forked worker processes")
+    parser.add_argument('--threads', type=int, default=4, help="scoring threads per worker")
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=2.0)
+    parser.add_argument('--content-model', help="directory written by MovieRecommender.save")
+    parser.add_argument('--collaborative-model',
+                        help="directory written by CollaborativeRecommender.save")
+    parser.add_argument('--content-only', action='store_true',
+                        help="serve only /recommend/content (needs just NumPy with --content-model)")
+    parser.add_argument('--metrics', action='store_true', help="record stage timers and counters")
+    parser.add_argument('--profile-rate', type=float, default=0.0,
+                        help="fraction of scoring calls to run under cProfile")
+    parser.add_argument('--profile-dir', default='profiles')
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+    if args.profile_rate > 0:
+        metrics.enable_profiling(args.profile_dir, args.profile_rate)
+
+    content, collaborative = load_models(args.content_model, args.collaborative_model,
+                                        args.content_only)
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} worker(s)", flush=True)
+
+    children = []
+    for _ in range(args.workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, content, collaborative, args)
+            os._exit(0)
+        children.append(pid)
+    try:
+        run_worker(sock, content, collaborative, args)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    main()
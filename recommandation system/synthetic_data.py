@@ -0,0 +1,57 @@
+import numpy as np
+
+from rating_store import RatingStore
+
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Drama', 'Fantasy', 'Horror',
+          'Mystery', 'Romance', 'Sci-Fi', 'Thriller', 'War', 'Music', 'History', 'Family']
+
+
+def synthetic_ratings(n_users, n_items, density, seed=0, n_groups=0, affinity=0.8):
+    """Random ratings store with a long-tail item popularity
+
+    Roughly density * n_users * n_items ratings between 1 and 5 are drawn;
+    duplicate (user, item) pairs collapse, so the real count is a bit lower.
+    With n_groups > 0 every user belongs to a taste group and draws a
+    fraction `affinity` of their ratings from that group's own popularity
+    order, which gives the data real neighbourhood structure.
+    """
+    rng = np.random.default_rng(seed)
+    n_ratings = max(1, int(density * n_users * n_items))
+
+    # Zipf-like popularity so a few titles collect most of the ratings
+    popularity = 1.0 / np.arange(1, n_items + 1) ** 0.8
+    popularity /= popularity.sum()
+
+    users = rng.integers(0, n_users, n_ratings)
+    items = rng.choice(n_items, n_ratings, p=popularity)
+    if n_groups:
+        # Each group ranks the catalog in its own order
+        group_orders = np.array([rng.permutation(n_items) for _ in range(n_groups)])
+        groups = rng.integers(0, n_groups, n_users)[users]
+        in_group = rng.random(n_ratings) < affinity
+        items[in_group] = group_orders[groups[in_group], items[in_group]]
+    ratings = rng.integers(1, 6, n_ratings)
+
+    user_ids = [f'User{i}' for i in range(n_users)]
+    item_titles = [f'Movie{i}' for i in range(n_items)]
+    return RatingStore.from_triples(users, items, ratings, user_ids, item_titles)
+
+
+class SyntheticMovies:
+    """Movie corpus source for MovieRecommender(source=...)
+
+    Every title gets one to three random genres.
+    """
+
+    def __init__(self, titles, seed=0):
+        import pandas as pd
+
+        rng = np.random.default_rng(seed)
+        self.frame = pd.DataFrame({
+            'title': list(titles),
+            'genres': [' '.join(rng.choice(GENRES, rng.integers(1, 4), replace=False))
+                       for _ in titles],
+        })
+
+    def movies(self):
+        return self.frame
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline batch job: chunked output and checkpoint / resume
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from batch_job import part_path, read_results, run_job
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from synthetic_data import synthetic_ratings
+
+
+def collect(output):
+    """The results of a finished job as whole (user_rows, items, scores) arrays"""
+    parts = list(read_results(output))
+    return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
+
+
+def test_job_matches_recommend_batch():
+    store = synthetic_ratings(300, 60, 0.05, n_groups=4)
+    for model in [None, ALSModel(n_factors=8, n_iter=5)]:
+        recommender = CollaborativeRecommender(store, model=model)
+        expected = recommender.recommend_batch(store.user_ids, top_n=5)
+        with tempfile.TemporaryDirectory() as path:
+            recommender.save(os.path.join(path, 'model'))
+            output = os.path.join(path, 'out')
+            result = run_job(os.path.join(path, 'model'), output, top_n=5, chunk_users=70,
+                             n_workers=2, block_users=32)
+            assert (result['chunks'], result['written'], result['users_scored']) == (5, 5, 300)
+            user_rows, items, scores = collect(output)
+
+        assert user_rows.tolist() == list(range(300))
+        for row, recommendations in enumerate(expected):
+            n = len(recommendations)
+            assert [store.item_titles[i] for i in items[row, :n]] == [t for t, _ in recommendations]
+            assert np.allclose(scores[row, :n], [s for _, s in recommendations], rtol=1e-5)
+            assert (items[row, n:] == -1).all() and np.isnan(scores[row, n:]).all()
+
+
+def test_job_resumes_after_interruption():
+    store = synthetic_ratings(200, 40, 0.05)
+    recommender = CollaborativeRecommender(store, model=ALSModel(n_factors=4, n_iter=3))
+    with tempfile.TemporaryDirectory() as path:
+        model = os.path.join(path, 'model')
+        recommender.save(model)
+        output = os.path.join(path, 'out')
+        run_job(model, output, top_n=3, chunk_users=50, n_workers=1)
+        complete = collect(output)
+
+        # A crash leaves some part files missing and maybe a partial one
+        os.remove(part_path(output, 1, 'npz'))
+        os.remove(part_path(output, 3, 'npz'))
+        with open(part_path(output, 3, 'npz') + '.tmp', 'wb') as f:
+            f.write(b'partial')
+        result = run_job(model, output, top_n=3, chunk_users=50, n_workers=1)
+        assert (result['written'], result['skipped'], result['users_scored']) == (2, 2, 100)
+        for resumed, original in zip(collect(output), complete):
+            assert np.array_equal(resumed, original, equal_nan=True)
+        assert not any(name.endswith('.tmp') for name in os.listdir(output))
+
+        # Other settings would mix two jobs' results in one directory
+        try:
+            run_job(model, output, top_n=5, chunk_users=50, n_workers=1)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("resumed a job with different settings")
+
+
+if __name__ == "__main__":
+    test_job_matches_recommend_batch()
+    test_job_resumes_after_interruption()
+    print("All batch job tests passed!")
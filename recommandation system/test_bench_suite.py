@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Tests for the benchmark regression suite
+"""
+
+from bench_suite import compare, measure, run
+
+BASELINE = {
+    'small/content/load': {'seconds': 0.010, 'peak_rss_mib': 10.0, 'alloc_peak_mib': 5.0},
+    'small/collaborative/load': {'seconds': 0.100, 'peak_rss_mib': None, 'alloc_peak_mib': 50.0},
+}
+
+
+def test_compare_flags_only_real_regressions():
+    results = {
+        # Within the threshold, and too small in absolute terms to count
+        'small/content/load': {'seconds': 0.012, 'peak_rss_mib': 13.0, 'alloc_peak_mib': 5.5},
+        'small/collaborative/load': {'seconds': 0.200, 'peak_rss_mib': 80.0,
+                                     'alloc_peak_mib': 70.0},
+        'small/content/tfidf_fit': {'seconds': 1.0, 'peak_rss_mib': 1.0, 'alloc_peak_mib': 1.0},
+    }
+    regressions = compare(results, BASELINE, threshold=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('small/collaborative/load: 200.00 ms')
+    assert 'MiB allocated' in regressions[1]
+    assert compare(results, BASELINE, threshold=1.5) == []
+
+
+def test_measure_and_run():
+    result = measure(lambda: bytearray(8 * 2 ** 20), repeats=2)
+    assert result['seconds'] <= result['median_seconds']
+    assert result['alloc_peak_mib'] >= 8
+    assert result['peak_rss_mib'] is None or result['peak_rss_mib'] >= 0
+
+    results = run(['tiny'], repeats=1, case_filter='load', report=lambda line: None)
+    assert sorted(results) == ['tiny/collaborative/load', 'tiny/content/load']
+    assert compare(results, results) == []
+
+
+if __name__ == "__main__":
+    test_compare_flags_only_real_regressions()
+    test_measure_and_run()
+    print("All benchmark suite tests passed!")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the integer-indexed item catalog and its result records
+"""
+
+import json
+import tempfile
+
+import numpy as np
+
+from app import MovieRecommender
+from catalog import ItemCatalog, Recommendation, StringColumn
+
+
+def test_string_column_round_trip():
+    strings = ['Amélie', '', 'Léon: The Professional', '千と千尋の神隠し', 'Up']
+    column = StringColumn.from_strings(strings)
+    assert column.data.dtype == np.uint8 and column.offsets.dtype == np.int64
+    assert len(column) == 5
+    assert column.tolist() == strings
+    assert column[3] == strings[3]
+    assert column.take(np.array([4, 0, 1])) == ['Up', 'Amélie', '']
+
+
+def test_catalog_lookup_and_records():
+    catalog = ItemCatalog.from_lists(['A', 'B', 'C'], ['Drama', 'Comedy', 'Drama Crime'])
+    assert catalog.ids.dtype == np.int32 and catalog.ids.tolist() == [0, 1, 2]
+    assert catalog.id_of('C') == 2
+    assert catalog.lookup(['B', 'missing', 'A']).tolist() == [1, -1, 0]
+
+    records = catalog.records(np.array([2, 0, -1]), np.array([0.9, 0.5, 0.0]))
+    assert len(records) == 2
+    assert records[0] == {'item': 2, 'title': 'C', 'genres': 'Drama Crime',
+                          'similarity_score': 0.9}
+    assert records[1]['title'] == 'A' and dict(records[1])['similarity_score'] == 0.5
+    assert not hasattr(records[0], '__dict__')
+    assert json.loads(json.dumps(records[0].to_dict()))['title'] == 'C'
+
+
+def test_results_resolve_to_the_same_movies():
+    recommender = MovieRecommender()
+    movies = recommender.movies
+    for query in ['Action, Sci-Fi', 'Animation Comedy', 'Horror']:
+        for rec in recommender.recommend_movies(query, top_n=5):
+            assert isinstance(rec, Recommendation)
+            assert movies['title'].iat[rec.item] == rec.title
+            assert movies['genres'].iat[rec.item] == rec.genres
+    # Cached responses are fresh records
+    first = recommender.recommend_movies('Drama')
+    first[0].title = 'changed'
+    assert recommender.recommend_movies('Drama')[0].title != 'changed'
+
+
+def test_saved_catalog_is_memory_mapped():
+    recommender = MovieRecommender()
+    with tempfile.TemporaryDirectory() as path:
+        recommender.save(path)
+        loaded = MovieRecommender.load(path)
+        assert isinstance(loaded.catalog.titles.data, np.memmap)
+        assert loaded.catalog.titles.tolist() == recommender.catalog.titles.tolist()
+        assert loaded.more_like_this('Up') == recommender.more_like_this('Up')
+
+
+if __name__ == "__main__":
+    test_string_column_round_trip()
+    test_catalog_lookup_and_records()
+    test_results_resolve_to_the_same_movies()
+    test_saved_catalog_is_memory_mapped()
+    print("All catalog tests passed!")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for folding in new users and the cold-start fallback ranking
+"""
+
+import numpy as np
+
+from app import MovieRecommender
+from cold_start import ColdStartRecommender
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from neighbors import ExactNeighborIndex
+from rating_store import RatingStore
+from synthetic_data import synthetic_ratings
+
+STORE = synthetic_ratings(300, 60, 0.08, n_groups=5)
+NEW_USERS = [
+    {'Movie0': 5, 'Movie3': 4, 'Movie17': 2},
+    {'Movie1': 1, 'Movie2': 5},
+    {'Movie42': 3, 'Unknown movie': 5},
+]
+
+
+def with_new_user(ratings):
+    """The store with one more user appended, as a full rebuild would see it"""
+    matrix = STORE.user_item.tocoo()
+    items = [STORE.item_index[title] for title in ratings]
+    return RatingStore.from_triples(
+        np.concatenate([matrix.row, np.full(len(items), STORE.n_users)]),
+        np.concatenate([matrix.col, items]),
+        np.concatenate([matrix.data, list(ratings.values())]),
+        STORE.user_ids + ['New'], STORE.item_titles,
+    )
+
+
+def test_fold_in_matches_rebuild():
+    recommender = CollaborativeRecommender(STORE, ExactNeighborIndex())
+    vectors = recommender.neighbor_index.vectors.copy()
+    for ratings in NEW_USERS[:2]:
+        rebuilt = CollaborativeRecommender(with_new_user(ratings), ExactNeighborIndex())
+        expected = rebuilt.recommend_movies(top_n=5, user='New')
+        got = recommender.recommend_for_ratings(ratings, top_n=5)
+        assert [title for title, _ in got] == [title for title, _ in expected]
+        assert np.allclose([score for _, score in got], [score for _, score in expected])
+    # Nothing stored changed
+    assert STORE.n_users == 300
+    assert (recommender.neighbor_index.vectors != vectors).nnz == 0
+
+    batch = recommender.recommend_for_ratings_batch(NEW_USERS, top_n=4)
+    assert batch == [recommender.recommend_for_ratings(ratings, top_n=4) for ratings in NEW_USERS]
+    assert recommender.recommend_for_ratings({}, top_n=4) == []
+
+
+def test_factor_fold_in():
+    model = ALSModel(n_factors=8, n_iter=5)
+    recommender = CollaborativeRecommender(STORE, model=model)
+    factors = model.user_factors.copy()
+    for ratings in NEW_USERS:
+        known = {title: rating for title, rating in ratings.items() if title in STORE.item_index}
+        items = np.array([STORE.item_index[title] for title in known])
+        scores = model.item_factors @ model.user_vector(items, list(known.values())) + model.mean
+        scores[items] = -np.inf
+        got = recommender.recommend_for_ratings(ratings, top_n=5)
+        assert [title for title, _ in got] == [STORE.item_titles[i] for i in np.argsort(-scores)[:5]]
+        assert not set(known) & {title for title, _ in got}
+    assert np.array_equal(model.user_factors, factors)
+
+
+def test_fallback_ranking():
+    recommender = CollaborativeRecommender(STORE, ExactNeighborIndex())
+    cold = ColdStartRecommender(recommender, prior_weight=5.0)
+    counts = STORE.user_item.getnnz(axis=0)
+    sums = np.asarray(STORE.user_item.sum(axis=0)).ravel()
+    damped = (sums + 5.0 * sums.sum() / counts.sum()) / (counts + 5.0)
+    assert np.allclose(cold.popularity, damped)
+
+    recommendations = cold.recommend(top_n=5)
+    scores = [score for _, score in recommendations]
+    assert scores == sorted(scores, reverse=True)
+    assert recommendations[0][0] == STORE.item_titles[np.argmax(damped)]
+
+    # A user whose fold-in finds too little is topped up by the fallback
+    ratings = {'Movie0': 5}
+    folded = recommender.recommend_for_ratings(ratings, top_n=len(STORE.item_titles))
+    recommendations = cold.recommend(ratings, top_n=len(folded) + 3)
+    assert recommendations[:len(folded)] == folded
+    titles = [title for title, _ in recommendations]
+    assert len(titles) == len(set(titles)) == len(folded) + 3
+    assert 'Movie0' not in titles
+
+
+def test_genre_fallback_reuses_content_model():
+    content = MovieRecommender()
+    recommender = CollaborativeRecommender()
+    cold = ColdStartRecommender(recommender, content)
+    recommendations = cold.recommend(genres='Sci-Fi', top_n=4)
+    # Sci-Fi titles of the rated catalog come first, by popularity
+    sci_fi = {'Inception', 'Interstellar', 'The Matrix'}
+    assert {title for title, _ in recommendations[:3]} == sci_fi
+    assert cold.recommend(genres='Sci-Fi', top_n=3) == recommendations[:3]
+    assert cold.recommend(top_n=4) == cold.recommend(genres='Nonexistent', top_n=4)
+
+
+if __name__ == "__main__":
+    test_fold_in_matches_rebuild()
+    test_factor_fold_in()
+    test_fallback_ranking()
+    test_genre_fallback_reuses_content_model()
+    print("All cold-start tests passed!")
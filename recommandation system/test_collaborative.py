@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the collaborative filtering recommender and its rating store
+"""
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from collaborative_filtering import CollaborativeRecommender, CURRENT_USER
+from rating_store import RatingStore
+from synthetic_data import synthetic_ratings
+
+SAMPLE_RATINGS = [5, 0, 4, 0, 0, 3, 0, 0, 2, 0]
+
+
+def reference_recommendations(ratings, top_n=3):
+    """The original dense DataFrame implementation, kept as an oracle"""
+    user_names = ratings.columns.tolist()
+    current_user_idx = user_names.index(CURRENT_USER)
+    similarities = cosine_similarity(ratings.T)[current_user_idx]
+    similarities[current_user_idx] = 0
+    similar_users = [user_names[i] for i in similarities.argsort()[-3:][::-1]]
+
+    predictions = {}
+    for movie in ratings.index:
+        if ratings.loc[movie, CURRENT_USER] == 0:
+            weighted_sum = 0
+            similarity_sum = 0
+            for user in similar_users:
+                rating = ratings.loc[movie, user]
+                if rating > 0:
+                    similarity = similarities[user_names.index(user)]
+                    weighted_sum += similarity * rating
+                    similarity_sum += abs(similarity)
+            if similarity_sum > 0:
+                predictions[movie] = weighted_sum / similarity_sum
+    return sorted(predictions.items(), key=lambda x: x[1], reverse=True)[:top_n]
+
+
+def rated_recommender():
+    recommender = CollaborativeRecommender()
+    for movie, rating in zip(recommender.movies, SAMPLE_RATINGS):
+        recommender.ratings.set_rating(CURRENT_USER, movie, rating)
+    recommender.calculate_similarity()
+    return recommender
+
+
+def test_store_round_trip():
+    """The sparse store holds exactly the non-zero sample ratings"""
+    ratings, movies = CollaborativeRecommender().create_sample_data()
+    store = RatingStore.from_dataframe(ratings)
+    assert store.nnz == np.count_nonzero(ratings.to_numpy())
+    assert store.item_titles == movies
+    assert (store.to_dataframe().to_numpy() == ratings.to_numpy()).all()
+
+
+def test_set_rating_insert_update_delete():
+    store = RatingStore.from_dataframe(CollaborativeRecommender().create_sample_data()[0])
+    movie = store.item_titles[2]
+    store.set_rating(CURRENT_USER, movie, 4)
+    assert store.get_rating(CURRENT_USER, movie) == 4
+    store.set_rating(CURRENT_USER, movie, 2)
+    assert store.get_rating(CURRENT_USER, movie) == 2
+    store.set_rating(CURRENT_USER, movie, 0)
+    assert store.get_rating(CURRENT_USER, movie) == 0
+    assert len(store.user_ratings(CURRENT_USER)[0]) == 0
+
+
+def test_recommendations_match_reference():
+    recommender = rated_recommender()
+    expected = reference_recommendations(recommender.ratings.to_dataframe())
+    actual = recommender.recommend_movies()
+    assert [movie for movie, _ in actual] == [movie for movie, _ in expected]
+    assert np.allclose([score for _, score in actual], [score for _, score in expected])
+
+
+def test_batch_matches_single_requests():
+    recommender = CollaborativeRecommender(synthetic_ratings(200, 80, 0.05))
+    users = recommender.ratings.user_ids[:50]
+    batch = recommender.recommend_batch(users, top_n=5)
+    assert batch == [recommender.recommend_movies(top_n=5, user=user) for user in users]
+
+
+def test_unrated_user_gets_no_recommendations():
+    assert CollaborativeRecommender().recommend_movies() == []
+
+
+if __name__ == "__main__":
+    test_store_round_trip()
+    test_set_rating_insert_update_delete()
+    test_recommendations_match_reference()
+    test_batch_matches_single_requests()
+    test_unrated_user_gets_no_recommendations()
+    print("All collaborative filtering tests passed!")
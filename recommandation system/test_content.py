@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-based recommender and its query cache
+"""
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app import MovieRecommender
+from query_cache import QueryCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_canonical_queries_share_a_cache_entry():
+    recommender = MovieRecommender()
+    first = recommender.recommend_movies("Action, Sci-Fi")
+    second = recommender.recommend_movies("sci-fi action")
+    assert first == second
+    assert recommender.cache.stats()['hits'] == 1
+    assert recommender.canonical_query("Drama Drama") != recommender.canonical_query("Drama")
+
+
+def test_cached_results_match_uncached():
+    cached = MovieRecommender()
+    uncached = MovieRecommender(cache_size=0)
+    for prefs in ["Comedy", "Horror, Thriller", "Comedy", "Drama, Romance"]:
+        assert cached.recommend_movies(prefs) == uncached.recommend_movies(prefs)
+
+
+def test_cache_lru_and_ttl_bounds():
+    clock = FakeClock()
+    cache = QueryCache(max_size=2, ttl=10, clock=clock)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1
+    clock.now = 11
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['expirations'] == 1
+
+
+def test_more_like_this_table_matches_brute_force():
+    recommender = MovieRecommender(similar_items_top_n=5)
+    similarity = cosine_similarity(recommender.genre_matrix)
+    for title in ['The Matrix', 'Toy Story', 'Dunkirk']:
+        idx = recommender.title_index[title]
+        scores = [rec['similarity_score'] for rec in recommender.more_like_this(title)]
+        expected = np.sort(np.delete(similarity[idx], idx))[::-1][:5]
+        assert np.allclose(scores, expected, atol=1e-6)
+        assert title not in [rec['title'] for rec in recommender.more_like_this(title)]
+
+
+if __name__ == "__main__":
+    test_canonical_queries_share_a_cache_entry()
+    test_cached_results_match_uncached()
+    test_cache_lru_and_ttl_bounds()
+    test_more_like_this_table_matches_brute_force()
+    print("All content-based tests passed!")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming CSV ingestion pipeline
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from data_sources import FileDataSource
+
+MOVIES = pd.DataFrame({
+    'movieId': [10, 20, 30, 40, 20],
+    'title': ['Alien', 'Up', 'Heat', 'Memento', 'Up (duplicate)'],
+    'genres': ['Horror|Sci-Fi', 'Animation|Adventure|Comedy', 'Action|Crime|Drama',
+               'Mystery|Thriller', 'Drama'],
+})
+
+
+def random_ratings(n_ratings=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'userId': rng.integers(1, 60, n_ratings),
+        'movieId': rng.choice([10, 20, 30, 40, 99], n_ratings),
+        'rating': rng.integers(1, 11, n_ratings) / 2,
+        'timestamp': rng.integers(0, 10 ** 9, n_ratings),
+    })
+
+
+def write_files(directory, ratings):
+    ratings_path = os.path.join(directory, 'ratings.csv')
+    movies_path = os.path.join(directory, 'movies.csv')
+    ratings.to_csv(ratings_path, index=False)
+    MOVIES.to_csv(movies_path, index=False)
+    return ratings_path, movies_path
+
+
+def test_streamed_store_matches_in_memory_load():
+    ratings = random_ratings()
+    with tempfile.TemporaryDirectory() as directory:
+        ratings_path, movies_path = write_files(directory, ratings)
+        reports = []
+        source = FileDataSource(ratings_path, movies_path, chunk_size=37, progress=reports.append)
+        store = source.ratings()
+
+    assert store.item_titles == ['Alien', 'Up', 'Heat', 'Memento']
+    assert source.dropped == int((ratings['movieId'] == 99).sum())
+    assert [r['rows'] for r in reports if r['name'] == 'ratings'][-1] == len(ratings) - source.dropped
+
+    # Last rating of a (user, movie) pair wins, as in RatingStore.from_triples
+    known = ratings[ratings['movieId'] != 99].drop_duplicates(['userId', 'movieId'], keep='last')
+    assert store.nnz == len(known)
+    for row in known.itertuples():
+        title = store.item_titles[[10, 20, 30, 40].index(row.movieId)]
+        assert store.get_rating(row.userId, title) == row.rating
+
+
+def test_recommenders_accept_a_source():
+    with tempfile.TemporaryDirectory() as directory:
+        source = FileDataSource(*write_files(directory, random_ratings()), chunk_size=50)
+        content = MovieRecommender(source=source)
+        collaborative = CollaborativeRecommender(source=source)
+
+    assert content.movies['genres'].tolist()[0] == 'Horror Sci-Fi'
+    assert content.recommend_movies('sci-fi horror', top_n=1)[0]['title'] == 'Alien'
+    assert collaborative.movies == content.movies['title'].tolist()
+    user = collaborative.ratings.user_ids[0]
+    assert all(title in collaborative.movies for title, _ in collaborative.recommend_movies(user=user))
+
+
+def test_without_movies_file_items_are_raw_ids():
+    ratings = random_ratings(200)
+    with tempfile.TemporaryDirectory() as directory:
+        ratings_path, _ = write_files(directory, ratings)
+        store = FileDataSource(ratings_path, chunk_size=16).ratings()
+    assert sorted(store.item_titles) == sorted(str(i) for i in ratings['movieId'].unique())
+    assert store.nnz == len(ratings.drop_duplicates(['userId', 'movieId']))
+
+
+if __name__ == "__main__":
+    test_streamed_store_matches_in_memory_load()
+    test_recommenders_accept_a_source()
+    test_without_movies_file_items_are_raw_ids()
+    print("All data source tests passed!")
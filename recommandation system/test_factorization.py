@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for the ALS matrix-factorization backend
+"""
+
+import tempfile
+
+import numpy as np
+
+from collaborative_filtering import CollaborativeRecommender, CURRENT_USER
+from factorization import ALSModel
+from rating_store import RatingStore
+from synthetic_data import synthetic_ratings
+
+
+def low_rank_store(n_users=1000, n_items=300, rank=5, density=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    ratings = rng.normal(0, 1, (n_users, rank)) @ rng.normal(0, 1, (rank, n_items)) + 3
+    users, items = np.nonzero(rng.random((n_users, n_items)) < density)
+    return RatingStore.from_triples(
+        users, items, ratings[users, items],
+        [f'User{i}' for i in range(n_users)], [f'Movie{i}' for i in range(n_items)],
+    )
+
+
+def test_solves_match_dense_normal_equations():
+    store = synthetic_ratings(100, 40, 0.2)
+    fixed = np.random.default_rng(1).normal(0, 1, (40, 8))
+    matrix = store.user_item
+    for implicit in [False, True]:
+        model = ALSModel(n_factors=8, regularization=0.5, implicit=implicit, block_elements=256)
+        gram = fixed.T @ fixed
+        solved = model._half_step(matrix, fixed)
+        for row in range(0, 100, 7):
+            dense = matrix[row].toarray().ravel().astype(np.float64)
+            rated = dense != 0
+            if implicit:
+                confidence = 1 + model.alpha * dense
+                A = fixed.T @ (confidence[:, None] * fixed) + 0.5 * np.eye(8)
+                b = fixed.T @ (confidence * rated)
+            else:
+                A = fixed[rated].T @ fixed[rated] + 0.5 * max(rated.sum(), 1) * np.eye(8)
+                b = fixed[rated].T @ dense[rated]
+            assert np.allclose(solved[row], np.linalg.solve(A, b))
+        assert np.allclose(gram, fixed.T @ fixed)
+
+
+def test_blocks_bound_ratings_and_rows():
+    model = ALSModel(n_factors=8, block_elements=512)
+    # Long rows, then many rows with no ratings at all
+    indptr = np.concatenate([np.arange(0, 600, 60), np.full(200, 540)])
+    blocks = model._blocks(indptr)
+    assert blocks[0][0] == 0 and blocks[-1][1] == len(indptr) - 1
+    assert all(a[1] == b[0] for a, b in zip(blocks, blocks[1:]))
+    for start, stop in blocks:
+        assert stop - start <= 512 // 8 ** 2
+        assert stop - start == 1 or indptr[stop] - indptr[start] <= 512 // 8
+
+
+def test_recovers_low_rank_ratings():
+    model = ALSModel(n_factors=10, regularization=0.01, n_iter=30, patience=30).fit(low_rank_store())
+    assert model.history[-1] < 0.1
+    assert min(model.history) == model.history[-1] or model.history[-1] - min(model.history) < 1e-3
+
+
+def test_early_stopping_keeps_best_factors():
+    store = synthetic_ratings(500, 100, 0.05)
+    model = ALSModel(n_factors=16, regularization=0.01, n_iter=20, patience=1).fit(store)
+    assert len(model.history) < 20
+    matrix = store.user_item.tocoo()
+    held_out = np.random.default_rng(model.seed).random(matrix.nnz) < model.validation
+    rmse = model._rmse(model.user_factors, model.item_factors,
+                       matrix.row[held_out], matrix.col[held_out], matrix.data[held_out])
+    assert np.isclose(rmse, min(model.history), atol=1e-4)
+
+
+def test_needs_at_least_one_sweep():
+    try:
+        ALSModel(n_iter=0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("accepted n_iter=0")
+    model = ALSModel(n_factors=4, n_iter=1, validation=0).fit(synthetic_ratings(50, 20, 0.2))
+    assert model.user_factors.shape == (50, 4) and model.history == []
+
+
+def test_recommender_backend():
+    recommender = CollaborativeRecommender(synthetic_ratings(300, 80, 0.05), model=ALSModel(n_factors=8))
+    users = recommender.ratings.user_ids[:30]
+    batch = recommender.recommend_batch(users, top_n=5)
+    for user, recommendations in zip(users, batch):
+        # Batched and single products may round differently in the last bit
+        single = recommender.recommend_movies(top_n=5, user=user)
+        assert [title for title, _ in single] == [title for title, _ in recommendations]
+        assert np.allclose([score for _, score in single], [score for _, score in recommendations])
+    for user, recommendations in zip(users, batch):
+        rated = {recommender.movies[i] for i in recommender.ratings.user_ratings(user)[0]}
+        assert len(recommendations) == (5 if rated else 0)
+        assert not rated & {title for title, _ in recommendations}
+    assert recommender.user_similarity is None
+
+
+def test_rating_folds_in_new_user():
+    recommender = CollaborativeRecommender(model=ALSModel(n_factors=4, validation=0))
+    assert recommender.recommend_movies() == []
+    recommender.rate(CURRENT_USER, recommender.movies[0], 5)
+    recommender.rate(CURRENT_USER, recommender.movies[4], 4)
+    recommendations = recommender.recommend_movies(top_n=10)
+    assert len(recommendations) == 8
+    items, ratings = recommender.ratings.user_ratings(CURRENT_USER)
+    row = recommender.ratings.user_index[CURRENT_USER]
+    assert np.allclose(recommender.model.user_factors[row], recommender.model.user_vector(items, ratings))
+
+
+def test_save_and_load():
+    recommender = CollaborativeRecommender(synthetic_ratings(200, 60, 0.05), model=ALSModel(n_factors=8))
+    users = recommender.ratings.user_ids[:20]
+    with tempfile.TemporaryDirectory() as path:
+        recommender.save(path)
+        loaded = CollaborativeRecommender.load(path)
+        assert isinstance(loaded.model, ALSModel)
+        assert loaded.recommend_batch(users, top_n=5) == recommender.recommend_batch(users, top_n=5)
+        loaded.rate(users[0], loaded.movies[0], 1)
+
+
+if __name__ == "__main__":
+    test_solves_match_dense_normal_equations()
+    test_blocks_bound_ratings_and_rows()
+    test_recovers_low_rank_ratings()
+    test_early_stopping_keeps_best_factors()
+    test_needs_at_least_one_sweep()
+    test_recommender_backend()
+    test_rating_folds_in_new_user()
+    test_save_and_load()
+    print("All factorization tests passed!")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for genre posting lists and pre-filtered recommendation queries
+"""
+
+import numpy as np
+
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from filters import ItemFilter
+from synthetic_data import SyntheticMovies, synthetic_ratings
+
+FILTERS = [
+    ItemFilter(genres=['Drama']),
+    ItemFilter(genres=['Sci-Fi', 'Action']),
+    ItemFilter(genres=['Comedy'], exclude_titles=['Up', 'Toy Story', 'Nowhere']),
+    ItemFilter(exclude_ids=[7, 19, 9, 10_000]),
+    ItemFilter(genres=['Western']),
+]
+
+
+def allowed(genres, titles, item_filter, title_ids):
+    """Brute-force: may item i be returned under the filter?"""
+    wanted = [set(genre.lower().replace('-', ' ').split()) for genre in item_filter.genres]
+    excluded = set(item_filter.exclude_ids)
+    excluded.update(title_ids.get(title) for title in item_filter.exclude_titles)
+    tokens = [set(genre.lower().replace('-', ' ').split()) for genre in genres]
+    return [all(w <= tokens[i] for w in wanted) and i not in excluded
+            for i in range(len(titles))]
+
+
+def test_posting_lists_match_the_genre_matrix():
+    recommender = MovieRecommender()
+    index = recommender.genre_index
+    dense = recommender.genre_matrix.toarray() != 0
+    for token, column in recommender.vectorizer.vocabulary_.items():
+        assert index.items(token).tolist() == np.flatnonzero(dense[:, column]).tolist()
+    columns = [index.vocabulary[token] for token in ['sci', 'fi', 'action']]
+    expected = np.flatnonzero(dense[:, columns].all(axis=1))
+    assert index.matching(['Sci-Fi', 'action']).tolist() == expected.tolist()
+    assert len(index.matching(['Western'])) == 0
+
+    # Item i becomes 2 * i in a catalog of twice the size; odd ids have no genres
+    ids = np.arange(len(dense)) * 2
+    remapped = index.remap(ids, 2 * len(dense))
+    assert remapped.matching(['Drama']).tolist() == (index.matching(['Drama']) * 2).tolist()
+    assert ItemFilter(genres=['Drama'], exclude_ids=[3]) == ItemFilter(['Drama'], (3,))
+
+
+def test_content_filters_match_brute_force():
+    recommender = MovieRecommender()
+    movies = recommender.movies
+    genres, titles = movies['genres'].tolist(), movies['title'].tolist()
+    title_ids = {title: i for i, title in enumerate(titles)}
+    for query in ['Action, Sci-Fi', 'Drama Romance', 'Animation']:
+        vector = recommender.featurizer.transform([query])
+        scores = recommender.featurizer.similarity(vector)[0]
+        for item_filter in FILTERS:
+            mask = allowed(genres, titles, item_filter, title_ids)
+            order = sorted(np.flatnonzero(mask), key=lambda i: (-scores[i], i))[:5]
+            got = recommender.recommend_movies(query, 5, item_filter)
+            assert [rec.item for rec in got] == order
+            assert recommender.recommend_movies(query, 5, item_filter) == got
+        # Filtered and unfiltered results are cached apart
+        recommender.recommend_movies(query, 5)
+        assert all('Drama' in rec.genres
+                   for rec in recommender.recommend_movies(query, 5, FILTERS[0]))
+
+
+def test_collaborative_filters_match_post_filtering():
+    store = synthetic_ratings(300, 60, 0.1, n_groups=4)
+    content = MovieRecommender(source=SyntheticMovies(store.item_titles[:45]))
+    genres = content.movies['genres'].tolist() + [''] * 15
+    title_ids = dict(store.item_index)
+    users = ['User0', 'User5', 'User17', 'User99']
+    for model in [None, ALSModel(n_factors=8, n_iter=5)]:
+        collaborative = CollaborativeRecommender(store, model=model)
+        collaborative.attach_genres(content)
+        everything = collaborative.recommend_batch(users, top_n=60)
+        for item_filter in [
+            ItemFilter(genres=['Drama']),
+            ItemFilter(genres=['Comedy', 'Crime']),
+            ItemFilter(exclude_ids=[1, 2, 3], exclude_titles=[store.item_titles[9]]),
+            ItemFilter(genres=['Drama'], exclude_ids=[0, 4, 8]),
+        ]:
+            mask = allowed(genres, store.item_titles, item_filter, title_ids)
+            batch = collaborative.recommend_batch(users, 4, [item_filter] * len(users))
+            for full, got in zip(everything, batch):
+                expected = [(t, s) for t, s in full if mask[title_ids[t]]][:4]
+                assert [t for t, _ in got] == [t for t, _ in expected]
+                assert np.allclose([s for _, s in got], [s for _, s in expected], rtol=1e-5)
+        mixed = collaborative.recommend_batch(users, 3, [None, FILTERS[0], None, FILTERS[0]])
+        for got, expected in [(mixed[0], collaborative.recommend_movies(3, users[0])),
+                              (mixed[1], collaborative.recommend_movies(3, users[1], FILTERS[0]))]:
+            assert [t for t, _ in got] == [t for t, _ in expected]
+            assert np.allclose([s for _, s in got], [s for _, s in expected], rtol=1e-5)
+
+
+if __name__ == "__main__":
+    test_posting_lists_match_the_genre_matrix()
+    test_content_filters_match_brute_force()
+    test_collaborative_filters_match_post_filtering()
+    print("All filter tests passed!")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the dense genre featurizer against sklearn's TF-IDF path
+"""
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app import MovieRecommender
+from synthetic_data import GENRES, SyntheticMovies, synthetic_ratings
+from topk import top_k_rows
+
+MESSY = ['Action, Sci-Fi', 'sci-fi ACTION', 'the drama and a crime', 'Drama Drama Romance',
+         'Anime', '', 'horror/thriller; mystery!', 'A Sci-Fi Comedy of the Family']
+
+
+def random_queries(n, seed=0):
+    rng = np.random.default_rng(seed)
+    words = GENRES + ['the', 'and', 'Unknown', 'ACTION', 'sci-fi,']
+    return [' '.join(rng.choice(words, rng.integers(0, 6))) for _ in range(n)]
+
+
+def test_tokens_and_vectors_match_tfidf():
+    recommender = MovieRecommender()
+    featurizer = recommender.featurizer
+    analyzer = recommender.vectorizer.build_analyzer()
+    vocabulary = recommender.vectorizer.vocabulary_
+    for query in MESSY:
+        assert featurizer.tokens(query) == [t for t in analyzer(query) if t in vocabulary]
+    expected = recommender.vectorizer.transform(MESSY).toarray()
+    vectors = featurizer.transform(MESSY)
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors, expected, atol=1e-6)
+    assert featurizer.item_vectors.dtype == np.float32
+    assert featurizer.item_vectors.flags.c_contiguous
+
+
+def test_rankings_match_tfidf():
+    store = synthetic_ratings(200, 3000, 0.01)
+    synthetic = MovieRecommender(source=SyntheticMovies(store.item_titles))
+    for recommender in [MovieRecommender(), synthetic]:
+        queries = MESSY + random_queries(300)
+        expected = cosine_similarity(recommender.vectorizer.transform(queries),
+                                     recommender.genre_matrix)
+        scores = recommender.featurizer.similarity(recommender.featurizer.transform(queries))
+        assert np.allclose(scores, expected, atol=1e-6)
+        # Same scores rank by rank; only equal-score movies may trade places
+        ranked = np.take_along_axis(expected, top_k_rows(expected, 20), axis=1)
+        got = np.take_along_axis(expected, top_k_rows(scores, 20), axis=1)
+        assert np.allclose(got, ranked, atol=1e-6)
+
+    recommender = MovieRecommender()
+    matrix = recommender.vectorizer.transform(['Action Sci-Fi'])
+    expected = top_k_rows(cosine_similarity(matrix, recommender.genre_matrix), 5)[0]
+    got = recommender.recommend_movies('Action Sci-Fi', top_n=5)
+    assert [rec.item for rec in got] == expected.tolist()
+
+
+if __name__ == "__main__":
+    test_tokens_and_vectors_match_tfidf()
+    test_rankings_match_tfidf()
+    print("All genre featurizer tests passed!")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged hybrid content + collaborative pipeline
+"""
+
+import itertools
+
+import numpy as np
+
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender, CURRENT_USER
+from factorization import ALSModel
+from hybrid import HybridRecommender, ItemSpace, merge_candidates
+from rating_store import RatingStore
+from synthetic_data import synthetic_ratings
+
+
+def sample_pipeline(**kwargs):
+    collaborative = CollaborativeRecommender()
+    for movie, rating in [('The Matrix', 5), ('Inception', 4), ('Goodfellas', 2)]:
+        collaborative.rate(CURRENT_USER, movie, rating)
+    return HybridRecommender(MovieRecommender(), collaborative, **kwargs)
+
+
+def test_item_space_maps_both_catalogs():
+    items = ItemSpace(['A', 'B', 'C'], ['C', 'D', 'A'])
+    assert items.titles == ['A', 'B', 'C', 'D']
+    assert items.from_content.tolist() == [0, 1, 2]
+    assert items.from_collaborative.tolist() == [2, 3, 0]
+    assert items.to_content.tolist() == [0, 1, 2, -1]
+    assert items.to_collaborative.tolist() == [2, -1, 0, 1]
+
+
+def test_merge_interleaves_dedupes_and_caps():
+    content = np.array([[5, 3, 9, -1], [1, 2, -1, -1]])
+    collaborative = np.array([[3, 7, 5], [-1, -1, -1]])
+    merged = merge_candidates(content, collaborative, 4)
+    assert merged.tolist() == [[5, 3, 7, 9], [1, 2, -1, -1]]
+
+
+def test_candidate_scores_match_full_scoring():
+    store = synthetic_ratings(200, 60, 0.1, n_groups=4)
+    rows = np.arange(0, 200, 9)
+    items = np.random.default_rng(0).integers(-1, 60, (len(rows), 15))
+    for model in [None, ALSModel(n_factors=8, n_iter=5)]:
+        scorer = CollaborativeRecommender(store, model=model).scorer
+        full = scorer.score(rows)
+        full = full.toarray() if hasattr(full, 'toarray') else full
+        got = scorer.score_items(rows, items)
+        assert np.isnan(got[items < 0]).all()
+        expected = np.take_along_axis(full, np.maximum(items, 0), axis=1)
+        # score() leaves out rated items; score_items() scores them too
+        rated = np.take_along_axis(store.user_rows(rows).toarray(), np.maximum(items, 0), axis=1)
+        unrated = (items >= 0) & (rated == 0)
+        known = ~np.isnan(got) & unrated
+        assert np.allclose(got[known], expected[known], rtol=1e-5)
+        if model is None:
+            # Sparse predictions are 0 exactly where no neighbour rated the item
+            assert np.array_equal(expected[unrated] != 0, known[unrated])
+
+
+def test_single_signal_requests_match_each_engine():
+    hybrid = sample_pipeline()
+    for query in ['Action Sci-Fi', 'Drama Crime', 'Animation Comedy']:
+        expected = hybrid.content.recommend_movies(query, top_n=5)
+        got = hybrid.recommend(preferences=query, top_n=5)
+        assert [rec['title'] for rec in got] == [rec['title'] for rec in expected]
+    for user in ['User1', 'User2', CURRENT_USER]:
+        expected = hybrid.collaborative.recommend_movies(top_n=3, user=user)
+        got = hybrid.recommend(user=user, top_n=3)
+        assert [(rec['title'], rec['collaborative_score']) for rec in got] == expected
+
+
+def test_blended_ranking():
+    hybrid = sample_pipeline()
+    recommendations = hybrid.recommend(CURRENT_USER, 'Action Sci-Fi', top_n=10)
+    titles = [rec['title'] for rec in recommendations]
+    scores = [rec['score'] for rec in recommendations]
+    assert len(titles) == len(set(titles)) == 10
+    assert scores == sorted(scores, reverse=True)
+    assert not {'The Matrix', 'Inception', 'Goodfellas'} & set(titles)
+    # Strong on both signals beats strong on one
+    assert titles[0] == 'Interstellar'
+
+    batch = hybrid.recommend_batch(
+        [CURRENT_USER, None, 'User3'], ['Action Sci-Fi', 'Drama', None], top_n=4)
+    assert batch[0] == hybrid.recommend(CURRENT_USER, 'Action Sci-Fi', top_n=4)
+    assert batch[1] == hybrid.recommend(None, 'Drama', top_n=4)
+    assert batch[2] == hybrid.recommend('User3', None, top_n=4)
+
+
+def test_candidate_caps_bound_the_reranked_set():
+    store = synthetic_ratings(300, 80, 0.1, n_groups=4)
+    content = MovieRecommender()
+    titles = content.movies['title'].tolist()
+    # Half the rated catalog overlaps the content catalog
+    store = RatingStore(store.user_item, store.user_ids, titles[:40] + store.item_titles[40:])
+    collaborative = CollaborativeRecommender(store, model=ALSModel(n_factors=8, n_iter=5))
+    hybrid = HybridRecommender(content, collaborative, content_candidates=6,
+                               collaborative_candidates=6, max_candidates=8)
+    assert len(hybrid.items) == 50 + 40
+    for user in ['User0', 'User7', 'User42']:
+        recommendations = hybrid.recommend(user, 'Comedy Drama', top_n=20)
+        assert 0 < len(recommendations) <= 8
+        rated = set(store.item_titles[i] for i in store.user_row(store.user_index[user])[0])
+        assert not rated & {rec['title'] for rec in recommendations}
+
+
+def test_budgets_skip_late_stages():
+    ticks = itertools.count()
+    # Every clock read advances one second, so each stage takes a second
+    hybrid = sample_pipeline(budgets={'content': 0.5, 'collaborative': 10.0},
+                             clock=lambda: float(next(ticks)))
+    recommendations = hybrid.recommend(CURRENT_USER, 'Action Sci-Fi', top_n=5)
+    stats = hybrid.stats()
+    assert stats['content'] == {'batches': 1, 'seconds': 1.0, 'skipped': 0, 'overruns': 1}
+    assert stats['collaborative']['skipped'] == 1
+    assert stats['rerank']['skipped'] == 0
+    # Without collaborative candidates only content matches are ranked
+    assert recommendations[0]['title'] == 'The Terminator'
+
+    hybrid.budgets = {'content': 0.5}
+    recommendations = hybrid.recommend(CURRENT_USER, 'Action Sci-Fi', top_n=5)
+    assert hybrid.stats()['rerank']['skipped'] == 1
+    assert all(rec['score'] is None for rec in recommendations)
+    assert 'The Matrix' not in [rec['title'] for rec in recommendations]
+
+
+if __name__ == "__main__":
+    test_item_space_maps_both_catalogs()
+    test_merge_interleaves_dedupes_and_caps()
+    test_candidate_scores_match_full_scoring()
+    test_single_signal_requests_match_each_engine()
+    test_blended_ranking()
+    test_candidate_caps_bound_the_reranked_set()
+    test_budgets_skip_late_stages()
+    print("All hybrid tests passed!")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental similarity updates on rating changes
+"""
+
+import numpy as np
+
+from collaborative_filtering import CollaborativeRecommender
+from neighbors import (ExactNeighborIndex, IVFNeighborIndex, LSHNeighborIndex, ShardedNeighborIndex,
+                       SimilarityMatrixIndex)
+from synthetic_data import synthetic_ratings
+
+
+def apply_random_ratings(recommender, n_changes, seed=0):
+    """Inserts, updates and deletes, including ratings from brand-new users"""
+    rng = np.random.default_rng(seed)
+    store = recommender.ratings
+    for i in range(n_changes):
+        if i % 10 == 0:
+            store.add_user(f'New{i}')
+        user = store.user_ids[rng.integers(store.n_users)]
+        movie = store.item_titles[rng.integers(store.n_items)]
+        recommender.rate(user, movie, int(rng.integers(0, 6)))
+
+
+def check_matches_rebuild(make_index, max_updates):
+    recommender = CollaborativeRecommender(
+        synthetic_ratings(120, 40, 0.1, n_groups=4), neighbor_index=make_index(max_updates)
+    )
+    apply_random_ratings(recommender, 60)
+    rebuilt = make_index(max_updates).build(recommender.ratings.user_item)
+    users = np.arange(recommender.ratings.n_users)
+    _, updated_sims = recommender.neighbor_index.query(users, 5)
+    _, rebuilt_sims = rebuilt.query(users, 5)
+    assert np.allclose(updated_sims, rebuilt_sims, atol=1e-5)
+
+
+def test_similarity_matrix_updates_match_rebuild():
+    check_matches_rebuild(lambda m: SimilarityMatrixIndex(max_updates=m), 1000)
+    check_matches_rebuild(lambda m: SimilarityMatrixIndex(max_updates=m), 7)
+
+
+def test_similarity_overlay_matches_rebuilt_matrix():
+    # A few users rated over and over, so overlay rows are replaced and
+    # patch each other's columns in every order
+    for max_patches in (1 << 20, 50):
+        recommender = CollaborativeRecommender(
+            synthetic_ratings(60, 20, 0.2, n_groups=3),
+            neighbor_index=SimilarityMatrixIndex(max_patches=max_patches),
+        )
+        store, index = recommender.ratings, recommender.neighbor_index
+        rng = np.random.default_rng(1)
+        for _ in range(80):
+            user, movie = store.user_ids[rng.integers(6)], store.item_titles[rng.integers(20)]
+            recommender.rate(user, movie, int(rng.integers(0, 6)))
+
+        expected = SimilarityMatrixIndex().build(store.user_item).similarity.toarray()
+        np.fill_diagonal(expected, 0)
+        block = index._block(np.arange(store.n_users))
+        np.fill_diagonal(block, 0)
+        assert np.allclose(block, expected, atol=1e-5)
+        for user in range(10):
+            cols, sims = index._current_row(user)
+            row = np.zeros(store.n_users)
+            row[cols] = sims
+            assert np.allclose(row, expected[user], atol=1e-5)
+        index.compact()
+        compacted = index.similarity.toarray()
+        np.fill_diagonal(compacted, 0)
+        assert np.allclose(compacted, expected, atol=1e-5)
+
+
+def test_exact_index_updates_match_rebuild():
+    check_matches_rebuild(lambda m: ExactNeighborIndex(max_updates=m), 1000)
+    check_matches_rebuild(lambda m: ExactNeighborIndex(max_updates=m), 7)
+
+
+def test_ivf_updates_match_rebuild_when_probing_every_list():
+    check_matches_rebuild(lambda m: IVFNeighborIndex(n_lists=4, n_probe=4, max_updates=m), 7)
+
+
+def test_sharded_table_updates_match_rebuild():
+    check_matches_rebuild(lambda m: ShardedNeighborIndex(n_neighbors=6, max_updates=m), 1000)
+    check_matches_rebuild(lambda m: ShardedNeighborIndex(n_neighbors=6, max_updates=m), 7)
+
+
+def test_lsh_updates_return_current_similarities():
+    for max_updates in (1000, 7):
+        recommender = CollaborativeRecommender(
+            synthetic_ratings(120, 40, 0.1, n_groups=4),
+            neighbor_index=LSHNeighborIndex(n_tables=4, n_bits=3, max_updates=max_updates),
+        )
+        apply_random_ratings(recommender, 60)
+        exact = SimilarityMatrixIndex().build(recommender.ratings.user_item)
+        users = np.arange(recommender.ratings.n_users)
+        neighbors, sims = recommender.neighbor_index.query(users, 5)
+        for user, found, found_sims in zip(users, neighbors, sims):
+            valid = found >= 0
+            expected = exact.similarity[user].toarray().ravel()[found[valid]]
+            assert np.allclose(found_sims[valid], expected, atol=1e-5)
+
+
+def test_rating_refreshes_recommendations():
+    recommender = CollaborativeRecommender()
+    assert recommender.recommend_movies() == []
+    recommender.rate('Current_User', 'The Shawshank Redemption', 5)
+    recommender.rate('Current_User', 'Inception', 5)
+    assert len(recommender.recommend_movies()) == 3
+
+
+def test_users_added_after_build_without_ratings():
+    for make_index in [ExactNeighborIndex, LSHNeighborIndex, IVFNeighborIndex,
+                       ShardedNeighborIndex, SimilarityMatrixIndex]:
+        store = synthetic_ratings(100, 40, 0.1)
+        recommender = CollaborativeRecommender(store, make_index())
+        expected = recommender.recommend_movies(3, 'User1')
+        store.add_user('New')
+        assert recommender.recommend_movies(3, 'New') == []
+        assert recommender.recommend_batch(['User1', 'New'], 3) == [expected, []]
+        # Once another user has a buffered update, both kinds of row mix
+        recommender.rate('User2', store.item_titles[0], 5)
+        assert recommender.recommend_batch(['New', 'User1'], 3)[0] == []
+        recommender.rate('New', store.item_titles[0], 4)
+        assert len(recommender.recommend_batch(['New', 'User1'], 3)) == 2
+
+
+if __name__ == "__main__":
+    test_similarity_matrix_updates_match_rebuild()
+    test_similarity_overlay_matches_rebuilt_matrix()
+    test_exact_index_updates_match_rebuild()
+    test_ivf_updates_match_rebuild_when_probing_every_list()
+    test_sharded_table_updates_match_rebuild()
+    test_lsh_updates_return_current_similarities()
+    test_rating_refreshes_recommendations()
+    test_users_added_after_build_without_ratings()
+    print("All incremental update tests passed!")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for the instrumentation registry, its exports and sampled profiling
+"""
+
+import asyncio
+import glob
+import json
+import os
+import pstats
+import tempfile
+
+import metrics
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from server import HTTPError, RecommendationServer
+from synthetic_data import synthetic_ratings
+
+STORE = synthetic_ratings(200, 50, 0.1)
+
+
+def test_disabled_by_default_is_a_no_op():
+    assert metrics.registry() is None
+    assert metrics.timer('content.vectorize') is metrics.profiled('content')
+    metrics.count('anything')
+    metrics.observe('anything', 3)
+    MovieRecommender().recommend_movies('Drama')
+
+
+def test_stage_timers_and_counters():
+    registry = metrics.enable()
+    try:
+        content = MovieRecommender()
+        content.recommend_batch(['Drama', 'Action', 'Drama'], 5)
+        content.recommend_movies('Drama')
+        CollaborativeRecommender(STORE).recommend_batch(['User1', 'User2'], 3)
+        CollaborativeRecommender(STORE, model=ALSModel(n_factors=4, n_iter=2)).recommend_movies(
+            3, 'User1')
+    finally:
+        metrics.disable()
+
+    snapshot = registry.snapshot()
+    counters, histograms = snapshot['counters'], snapshot['histograms']
+    # Only the second call finds 'Drama' cached
+    assert counters['content.cache_misses'] == 3
+    assert counters['content.cache_hits'] == 1
+    assert counters['content.candidates_scored'] == 3 * 50
+    assert counters['collaborative.neighbors_used'] > 0
+    assert counters['collaborative.candidates_scored'] > 0
+    for stage in ['content.vectorize', 'content.similarity', 'content.top_k',
+                  'collaborative.neighbors', 'collaborative.predict', 'collaborative.top_k']:
+        assert histograms[stage + '.seconds']['count'] >= 1
+    assert histograms['content.recommend.seconds']['count'] == 2
+    assert histograms['collaborative.recommend.seconds']['count'] == 2
+    assert histograms['content.batch_size']['buckets']['4'] == 2
+    assert histograms['content.batch_size']['buckets']['2'] == 1
+
+    text = registry.prometheus()
+    assert ('# TYPE recommender_content_cache_hits_total counter\n'
+            'recommender_content_cache_hits_total 1\n') in text
+    assert 'recommender_content_vectorize_seconds_bucket{le="+Inf"} 1\n' in text
+    assert 'recommender_content_vectorize_seconds_count 1\n' in text
+    with tempfile.TemporaryDirectory() as path:
+        registry.dump_json(os.path.join(path, 'metrics.json'))
+        with open(os.path.join(path, 'metrics.json')) as f:
+            assert json.load(f) == json.loads(json.dumps(snapshot))
+
+
+def test_sampled_profiles_are_written():
+    content = MovieRecommender()
+    with tempfile.TemporaryDirectory() as path:
+        sampler = metrics.enable_profiling(path, rate=1.0)
+        try:
+            content.recommend_batch(['Drama', 'Comedy'], 3)
+            CollaborativeRecommender(STORE).recommend_movies(3, 'User1')
+        finally:
+            metrics.disable_profiling()
+        files = sorted(glob.glob(os.path.join(path, '*.prof')))
+        assert sampler.written == len(files) == 2
+        assert os.path.basename(files[0]).startswith('collaborative-')
+        stats = pstats.Stats(files[1])
+        assert any(name == '_recommend_batch' for _, _, name in stats.stats)
+
+        sampler = metrics.enable_profiling(path, rate=0.0)
+        try:
+            content.recommend_movies('Horror')
+        finally:
+            metrics.disable_profiling()
+        assert sampler.written == 0
+
+
+def test_server_metrics_endpoint():
+    server = RecommendationServer(MovieRecommender(), CollaborativeRecommender(STORE))
+    try:
+        asyncio.run(server.dispatch('GET', '/metrics', b''))
+        assert False, "metrics should be disabled"
+    except HTTPError as e:
+        assert e.status == 404
+    metrics.enable()
+    try:
+        server.content.recommend_movies('Drama')
+        text = asyncio.run(server.dispatch('GET', '/metrics', b''))
+        snapshot = asyncio.run(server.dispatch('GET', '/metrics?format=json', b''))
+    finally:
+        metrics.disable()
+    assert 'recommender_content_cache_misses_total 1' in text
+    assert snapshot['counters']['content.cache_misses'] == 1
+
+
+if __name__ == "__main__":
+    test_disabled_by_default_is_a_no_op()
+    test_stage_timers_and_counters()
+    test_sampled_profiles_are_written()
+    test_server_metrics_endpoint()
+    print("All metrics tests passed!")
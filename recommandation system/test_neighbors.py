@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the neighbour index backends
+"""
+
+import numpy as np
+
+from bench_neighbors import recall_at_k
+from collaborative_filtering import CollaborativeRecommender
+from neighbors import (ExactNeighborIndex, IVFNeighborIndex, LSHNeighborIndex, ShardedNeighborIndex,
+                       SimilarityMatrixIndex)
+from synthetic_data import synthetic_ratings
+
+STORE = synthetic_ratings(300, 60, 0.08, n_groups=5)
+QUERIES = np.arange(0, 300, 7)
+
+
+def test_exact_matches_similarity_matrix():
+    exact = ExactNeighborIndex(block_elements=1000).build(STORE.user_item)
+    matrix = SimilarityMatrixIndex().build(STORE.user_item)
+    exact_sims = exact.query(QUERIES, 5)[1]
+    matrix_sims = matrix.query(QUERIES, 5)[1]
+    assert np.allclose(exact_sims, matrix_sims)
+
+
+def test_ivf_probing_every_list_is_exact():
+    exact = ExactNeighborIndex().build(STORE.user_item)
+    ivf = IVFNeighborIndex(n_lists=8, n_probe=8).build(STORE.user_item)
+    assert np.allclose(ivf.query(QUERIES, 5)[1], exact.query(QUERIES, 5)[1])
+
+
+def test_lsh_returns_true_similarities_without_self():
+    lsh = LSHNeighborIndex(n_tables=4, n_bits=4).build(STORE.user_item)
+    exact = SimilarityMatrixIndex().build(STORE.user_item)
+    neighbors, sims = lsh.query(QUERIES, 5)
+    for user, found, found_sims in zip(QUERIES, neighbors, sims):
+        assert user not in found
+        valid = found >= 0
+        expected = exact.similarity[user].toarray().ravel()[found[valid]]
+        assert np.allclose(found_sims[valid], expected, atol=1e-6)
+        assert (np.diff(found_sims[valid]) <= 0).all()
+
+
+def test_lsh_default_recall():
+    store = synthetic_ratings(2000, 500, 0.03, n_groups=20)
+    queries = np.arange(0, 2000, 7)
+    truth, _ = ExactNeighborIndex().build(store.user_item).query(queries, 10)
+    lsh = LSHNeighborIndex().build(store.user_item)
+    assert recall_at_k(lsh.query(queries, 10)[0], truth) >= 0.7
+    # ... while re-ranking well under half of the users
+    candidates = lsh._candidates(lsh.vectors[queries])
+    assert np.mean([len(users) for users in candidates]) < 1000
+
+
+def test_rerank_pair_and_union_scoring_agree():
+    # Small candidate sets spread over many queries are scored pair by pair,
+    # one query at a time against the union of its own candidates
+    rng = np.random.default_rng(0)
+    candidates = [np.sort(rng.choice(300, 10, replace=False)) for _ in QUERIES]
+    matrix = SimilarityMatrixIndex().build(STORE.user_item).similarity.toarray()
+    np.fill_diagonal(matrix, 0)
+    for block_elements in (1 << 22, 10):
+        index = ExactNeighborIndex(block_elements=block_elements).build(STORE.user_item)
+        neighbors, sims = index._rerank(index.vectors[QUERIES], candidates, 5, exclude=QUERIES)
+        for user, found, found_sims, users in zip(QUERIES, neighbors, sims, candidates):
+            expected = np.sort(matrix[user, users])[::-1][:5]
+            assert np.allclose(found_sims, np.where(expected > 0, expected, 0), atol=1e-6)
+            assert np.allclose(matrix[user, found[found >= 0]], found_sims[found >= 0], atol=1e-6)
+
+
+def test_sharded_table_matches_exact_search():
+    exact = ExactNeighborIndex().build(STORE.user_item)
+    for n_workers in (1, 2):
+        sharded = ShardedNeighborIndex(n_neighbors=8, n_workers=n_workers, shard_rows=64)
+        sharded.build(STORE.user_item)
+        assert sharded.neighbors.shape == (300, 8)
+        assert np.allclose(sharded.query(QUERIES, 5)[1], exact.query(QUERIES, 5)[1])
+        # More neighbours than the table holds falls back to a full search
+        assert np.allclose(sharded.query(QUERIES, 12)[1], exact.query(QUERIES, 12)[1])
+
+
+def test_recommender_with_pluggable_index():
+    default = CollaborativeRecommender(STORE)
+    exact = CollaborativeRecommender(STORE, neighbor_index=ExactNeighborIndex())
+    users = STORE.user_ids[:30]
+    assert exact.user_similarity is None
+    for expected, actual in zip(default.recommend_batch(users), exact.recommend_batch(users)):
+        assert np.allclose([score for _, score in expected], [score for _, score in actual])
+
+
+if __name__ == "__main__":
+    test_exact_matches_similarity_matrix()
+    test_ivf_probing_every_list_is_exact()
+    test_lsh_returns_true_similarities_without_self()
+    test_lsh_default_recall()
+    test_rerank_pair_and_union_scoring_agree()
+    test_sharded_table_matches_exact_search()
+    test_recommender_with_pluggable_index()
+    print("All neighbour index tests passed!")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Tests for saving models and loading them back memory-mapped
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from factorization import ALSModel
+from filters import ItemFilter
+from neighbors import ExactNeighborIndex, IVFNeighborIndex, LSHNeighborIndex, SimilarityMatrixIndex
+from rating_store import RatingStore
+from synthetic_data import synthetic_ratings
+
+
+def test_content_model_round_trip():
+    recommender = MovieRecommender(similar_items_top_n=5)
+    with tempfile.TemporaryDirectory() as path:
+        recommender.save(path)
+        loaded = MovieRecommender.load(path)
+        assert not loaded.genre_matrix.data.flags.writeable
+        for query in ['Action, Sci-Fi', 'drama romance', 'Animation Comedy']:
+            assert loaded.recommend_movies(query) == recommender.recommend_movies(query)
+            for item_filter in [ItemFilter(genres=['Drama']), ItemFilter(exclude_titles=['Up'])]:
+                assert (loaded.recommend_movies(query, 5, item_filter)
+                        == recommender.recommend_movies(query, 5, item_filter))
+        assert loaded.catalog.genres.tolist() == recommender.catalog.genres.tolist()
+        assert loaded.more_like_this('Inception') == recommender.more_like_this('Inception')
+
+
+def test_collaborative_model_round_trip():
+    for index in [ExactNeighborIndex(), SimilarityMatrixIndex(), LSHNeighborIndex(n_tables=4, n_bits=4),
+                  IVFNeighborIndex(n_lists=8, n_probe=2)]:
+        recommender = CollaborativeRecommender(synthetic_ratings(300, 60, 0.05), index)
+        users = recommender.ratings.user_ids[:40]
+        with tempfile.TemporaryDirectory() as path:
+            recommender.save(path)
+            loaded = CollaborativeRecommender.load(path)
+            assert type(loaded.neighbor_index) is type(index)
+            assert not loaded.ratings.user_item.data.flags.writeable
+            assert loaded.recommend_batch(users, top_n=5) == recommender.recommend_batch(users, top_n=5)
+
+
+def test_loaded_model_accepts_ratings():
+    """Writes never touch the mapped files; they go to private copies"""
+    for index in [SimilarityMatrixIndex(), LSHNeighborIndex(n_tables=4, n_bits=4),
+                  IVFNeighborIndex(n_lists=8, n_probe=2)]:
+        recommender = CollaborativeRecommender(synthetic_ratings(200, 50, 0.05), index)
+        with tempfile.TemporaryDirectory() as path:
+            recommender.save(path)
+            saved = recommender.ratings.user_item.copy()
+            loaded = CollaborativeRecommender.load(path)
+            user = loaded.ratings.user_ids[0]
+            for movie in loaded.movies[:10]:
+                loaded.rate(user, movie, 5)
+                recommender.rate(user, movie, 5)
+            loaded.neighbor_index.compact()
+            recommender.neighbor_index.compact()
+            assert loaded.recommend_movies(5, user) == recommender.recommend_movies(5, user)
+            on_disk = CollaborativeRecommender.load(path).ratings.user_item
+            assert (on_disk != saved).nnz == 0
+
+
+def test_save_over_own_directory():
+    """A memory-mapped model saved back to the directory it was loaded from"""
+    content = MovieRecommender(similar_items_top_n=5)
+    with tempfile.TemporaryDirectory() as path:
+        content.save(path)
+        MovieRecommender.load(path).save(path)
+        loaded = MovieRecommender.load(path)
+        for query in ['Action, Sci-Fi', 'drama romance']:
+            assert loaded.recommend_movies(query) == content.recommend_movies(query)
+        assert loaded.more_like_this('Inception') == content.more_like_this('Inception')
+        assert not any(name.endswith('.tmp') for name in os.listdir(path))
+
+    for index, model in [(SimilarityMatrixIndex(), None),
+                         (IVFNeighborIndex(n_lists=8, n_probe=2), None),
+                         (None, ALSModel(n_factors=4, n_iter=3))]:
+        recommender = CollaborativeRecommender(synthetic_ratings(200, 50, 0.05), index, model=model)
+        users = recommender.ratings.user_ids[:40]
+        with tempfile.TemporaryDirectory() as path:
+            recommender.save(path)
+            loaded = CollaborativeRecommender.load(path)
+            user = loaded.ratings.user_ids[0]
+            for movie in loaded.movies[:10]:
+                loaded.rate(user, movie, 5)
+                recommender.rate(user, movie, 5)
+            loaded.save(path)
+            reloaded = CollaborativeRecommender.load(path)
+            assert (reloaded.ratings.user_item != recommender.ratings.user_item).nnz == 0
+            if model is None:
+                assert (reloaded.recommend_batch(users, top_n=5)
+                        == loaded.recommend_batch(users, top_n=5))
+            else:
+                assert np.array_equal(reloaded.model.item_factors, loaded.model.item_factors)
+            if isinstance(index, IVFNeighborIndex):
+                assert np.array_equal(reloaded.neighbor_index.centroids,
+                                      loaded.neighbor_index.centroids)
+                assert np.count_nonzero(reloaded.neighbor_index.centroids)
+
+
+def test_rating_store_ids_stay_mapped_until_used():
+    for user_ids, titles in [(['Ann', 'Bo', 'Zoë'], ['Up', 'Heat']), ([17, 3, 2**40], [101, 7])]:
+        store = RatingStore.from_triples([0, 1, 2, 2], [0, 1, 0, 1], [5, 3, 4, 1], user_ids, titles)
+        with tempfile.TemporaryDirectory() as path:
+            store.save(path)
+            with open(os.path.join(path, 'model.json')) as f:
+                assert str(user_ids[2]) not in f.read()
+            loaded = RatingStore.load(path)
+            assert (loaded.n_users, loaded.n_items) == (3, 2)
+            assert loaded._users._list is None and loaded._users._index is None
+            assert loaded.user_ids == user_ids and loaded.item_titles == titles
+            assert loaded.user_index[user_ids[2]] == 2 and loaded.item_index[titles[1]] == 1
+            new = user_ids[0] * 2
+            assert loaded.add_user(new) == 3 and loaded.user_index[new] == 3
+            loaded.save(path)
+            assert RatingStore.load(path).user_ids == user_ids + [new]
+
+
+def test_rating_store_mixed_ids_keep_their_types():
+    # MovieLens user ids are integers; a live session adds a named user
+    store = RatingStore.from_triples([0, 1, 2], [0, 1, 0], [5, 3, 4], [17, 3, 2**40], ['Up', 'Heat'])
+    store.add_user('Current_User')
+    store.add_user('17')
+    with tempfile.TemporaryDirectory() as path:
+        store.save(path)
+        loaded = RatingStore.load(path)
+        assert loaded.user_ids == [17, 3, 2**40, 'Current_User', '17']
+        assert loaded.user_index[17] == 0 and loaded.user_index['17'] == 4
+        loaded.add_user(5)
+        loaded.save(path)
+        assert RatingStore.load(path).user_ids == [17, 3, 2**40, 'Current_User', '17', 5]
+
+        # Other id types would not survive the round trip
+        store.add_user(1.5)
+        try:
+            store.save(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("saved a float user id")
+
+
+def test_older_format_is_rejected():
+    with tempfile.TemporaryDirectory() as path:
+        MovieRecommender().save(os.path.join(path, 'content'))
+        synthetic_ratings(20, 10, 0.2).save(os.path.join(path, 'ratings'))
+        for name, load in [('content', MovieRecommender.load), ('ratings', RatingStore.load)]:
+            manifest_path = os.path.join(path, name, 'model.json')
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            with open(manifest_path, 'w') as f:
+                json.dump({**manifest, 'format': 1}, f)
+            try:
+                load(os.path.join(path, name))
+            except ValueError as e:
+                assert 'save the model again' in str(e)
+            else:
+                raise AssertionError(f"loaded a format 1 {name} model")
+
+
+if __name__ == "__main__":
+    test_content_model_round_trip()
+    test_collaborative_model_round_trip()
+    test_loaded_model_accepts_ratings()
+    test_save_over_own_directory()
+    test_rating_store_ids_stay_mapped_until_used()
+    test_rating_store_mixed_ids_keep_their_types()
+    test_older_format_is_rejected()
+    print("All persistence tests passed!")
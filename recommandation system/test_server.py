@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for the asyncio HTTP service
+"""
+
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+from urllib.parse import quote
+
+from app import MovieRecommender
+from collaborative_filtering import CollaborativeRecommender
+from filters import ItemFilter
+from server import RecommendationServer
+from synthetic_data import synthetic_ratings
+
+
+async def call(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(payload)
+
+
+def serve(test, **kwargs):
+    """Run test(server, port) against a server on an ephemeral port"""
+    content = MovieRecommender()
+    collaborative = CollaborativeRecommender(synthetic_ratings(200, 50, 0.1))
+    server = RecommendationServer(content, collaborative, **kwargs)
+
+    async def run():
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            await test(server, port)
+
+    asyncio.run(run())
+
+
+def test_endpoints_match_direct_calls():
+    async def check(server, port):
+        status, body = await call(port, 'GET', f"/recommend/content?q={quote('Action, Sci-Fi')}&top_n=4")
+        assert status == 200
+        assert body['recommendations'] == server.content.recommend_movies('Action, Sci-Fi', 4)
+
+        status, body = await call(port, 'GET', '/recommend/collaborative?user=User3&top_n=5')
+        assert status == 200
+        expected = server.collaborative.recommend_movies(5, 'User3')
+        assert body['recommendations'] == [[title, score] for title, score in expected]
+
+        users = ['User1', 'User7', 'User9']
+        status, body = await call(port, 'POST', '/recommend/batch',
+                                  {'users': users, 'queries': ['Drama'], 'top_n': 3})
+        assert status == 200
+        assert body['users'] == [[[t, s] for t, s in recs]
+                                 for recs in server.collaborative.recommend_batch(users, 3)]
+        assert body['queries'] == server.content.recommend_batch(['Drama'], 3)
+
+    serve(check)
+
+
+def test_filtered_requests():
+    async def check(server, port):
+        status, body = await call(
+            port, 'GET', "/recommend/content?q=Drama&genre=Comedy&exclude=Parasite&top_n=3")
+        assert status == 200
+        item_filter = ItemFilter(genres=['Comedy'], exclude_titles=['Parasite'])
+        assert body['recommendations'] == server.content.recommend_movies('Drama', 3, item_filter)
+        assert 'Parasite' not in [rec['title'] for rec in body['recommendations']]
+
+        status, body = await call(port, 'POST', '/recommend/batch',
+                                  {'queries': ['Action', 'Drama'], 'genres': ['Sci-Fi'],
+                                   'top_n': 2})
+        assert status == 200
+        assert all('Sci-Fi' in rec['genres'] for recs in body['queries'] for rec in recs)
+
+        # Without attach_genres() the collaborative side has no genres to filter on
+        status, _ = await call(port, 'GET', '/recommend/collaborative?user=User1&genre=Drama')
+        assert status == 400
+
+    serve(check)
+
+
+def test_concurrent_requests_are_coalesced():
+    async def check(server, port):
+        users = [f'User{i}' for i in range(40)]
+        responses = await asyncio.gather(*[
+            call(port, 'GET', f'/recommend/collaborative?user={user}&top_n=3') for user in users
+        ])
+        assert all(status == 200 for status, _ in responses)
+        for user, (_, body) in zip(users, responses):
+            expected = server.collaborative.recommend_movies(3, user)
+            assert body['recommendations'] == [[title, score] for title, score in expected]
+        stats = server.collaborative_batcher.stats()
+        assert stats['requests'] == 40 and stats['batches'] < 40
+
+    serve(check, max_delay=0.05)
+
+
+def test_errors():
+    async def check(server, port):
+        assert (await call(port, 'GET', '/recommend/collaborative?user=Nobody'))[0] == 404
+        assert (await call(port, 'GET', '/recommend/content'))[0] == 400
+        assert (await call(port, 'GET', '/recommend/content?q=drama&top_n=x'))[0] == 400
+        assert (await call(port, 'GET', '/nowhere'))[0] == 404
+        assert (await call(port, 'POST', '/recommend/content'))[0] == 405
+        assert (await call(port, 'POST', '/recommend/batch', {}))[0] == 400
+        assert (await call(port, 'GET', '/health')) == (200, {'status': 'ok'})
+
+    serve(check)
+
+
+def test_close_finishes_queued_requests():
+    async def check(server, port):
+        # A long batching window keeps the requests queued when close() starts
+        requests = [
+            asyncio.ensure_future(call(port, 'GET', f'/recommend/collaborative?user=User{i}'))
+            for i in range(4)
+        ]
+        await asyncio.sleep(0.1)
+        idle = await asyncio.open_connection('127.0.0.1', port)
+        await server.close()
+        assert [status for status, _ in await asyncio.gather(*requests)] == [200] * 4
+        assert await idle[0].read() == b''
+        assert server.collaborative_batcher.stats()['batches'] == 1
+
+    serve(check, max_delay=5.0)
+
+
+def test_sigterm_shuts_down_cleanly():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, 'server.py', '--content-only', '--workers', '2', '--port', str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, text=True,
+    )
+    assert process.stdout.readline().startswith('Serving on')
+
+    async def stop_while_connected():
+        # Keep-alive connections stay open while the server shuts down
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"GET /recommend/content?q=Drama HTTP/1.1\r\n\r\n")
+        assert (await reader.readuntil(b'\r\n\r\n')).startswith(b'HTTP/1.1 200')
+        process.send_signal(signal.SIGTERM)
+        await asyncio.get_running_loop().run_in_executor(None, process.wait, 30)
+        writer.close()
+
+    asyncio.run(stop_while_connected())
+    _, stderr = process.communicate(timeout=30)
+    assert process.returncode == 0
+    assert 'Traceback' not in stderr, stderr
+
+
+if __name__ == "__main__":
+    test_endpoints_match_direct_calls()
+    test_filtered_requests()
+    test_concurrent_requests_are_coalesced()
+    test_errors()
+    test_close_finishes_queued_requests()
+    test_sigterm_shuts_down_cleanly()
+    print("All server tests passed!")
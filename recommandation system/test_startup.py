@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for start-up cost: the modules each entry point imports, measured
+in a fresh interpreter with python -X importtime
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from app import MovieRecommender
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEAVY = ('pandas', 'sklearn', 'scipy')
+
+
+def import_times(code):
+    """(total µs, {module: cumulative µs}) of the imports a fresh interpreter running code makes"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=HERE,
+                            capture_output=True, text=True, check=True)
+    total, modules = 0, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+        if not name[1:].startswith(' '):
+            # Top-level imports; nested ones are indented and already counted
+            total += int(cumulative)
+    return total, modules
+
+
+def heavy(modules):
+    return sorted({name.split('.')[0] for name in modules} & set(HEAVY))
+
+
+def test_content_serving_imports_only_numpy():
+    with tempfile.TemporaryDirectory() as path:
+        MovieRecommender(similar_items_top_n=5).save(path)
+        total, modules = import_times(
+            "import server\n"
+            "from filters import ItemFilter\n"
+            f"content, _ = server.load_models({path!r}, content_only=True)\n"
+            "content.recommend_movies('Action Sci-Fi', 5, ItemFilter(genres=['Drama']))\n"
+            "content.recommend_batch(['Comedy', 'Horror'], 3)\n"
+            "content.more_like_this('Inception')\n"
+        )
+    assert heavy(modules) == []
+    assert 'numpy' in modules and 'app' in modules
+
+    fitting, _ = import_times("import pandas, sklearn.feature_extraction.text")
+    assert total < fitting
+
+
+def library_modules():
+    """Every module of the project except tests and benchmarks"""
+    return sorted(name[:-3] for name in os.listdir(HERE)
+                  if name.endswith('.py') and not name.startswith(('test_', 'bench_'))
+                  and name != 'simple_test.py')
+
+
+def test_heavy_imports_are_deferred():
+    names = library_modules()
+    assert {'app', 'batch_job', 'data_sources', 'hybrid', 'server'} <= set(names)
+    for name in names:
+        _, modules = import_times(f"import {name}")
+        # The collaborative side keeps its sparse rating matrices
+        assert heavy(modules) in ([], ['scipy']), (name, heavy(modules))
+    _, modules = import_times("import app, filters, model_store\n"
+                              "app.MovieRecommender().recommend_movies('Drama')")
+    assert 'sklearn' in modules and 'pandas' in modules
+
+
+if __name__ == "__main__":
+    test_content_serving_imports_only_numpy()
+    test_heavy_imports_are_deferred()
+    print("All start-up tests passed!")
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared top-k selection utility
+"""
+
+import numpy as np
+
+from topk import top_k, top_k_rows
+
+
+def sorted_reference(scores, k, exclude):
+    """Full stable sort: best score first, ties to the lower index"""
+    order = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+    return [i for i in order if not exclude[i]][:k]
+
+
+def test_top_k_matches_full_sort_with_ties_and_exclusions():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        n = int(rng.integers(1, 30))
+        scores = rng.integers(0, 4, n).astype(float)
+        exclude = rng.random(n) < 0.3
+        k = int(rng.integers(0, 35))
+        assert list(top_k(scores, k, exclude)) == sorted_reference(scores, k, exclude)
+        assert list(top_k(scores, k, np.flatnonzero(exclude))) == sorted_reference(scores, k, exclude)
+
+
+def test_top_k_rows_matches_full_sort():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        n = int(rng.integers(1, 30))
+        scores = rng.integers(0, 4, (4, n)).astype(float)
+        exclude = rng.random((4, n)) < 0.3
+        k = int(rng.integers(1, 35))
+        result = top_k_rows(scores, k, exclude)
+        for row in range(4):
+            found = result[row][result[row] >= 0]
+            assert list(found) == sorted_reference(scores[row], k, exclude[row])
+
+
+if __name__ == "__main__":
+    test_top_k_matches_full_sort_with_ties_and_exclusions()
+    test_top_k_rows_matches_full_sort()
+    print("All top-k tests passed!")
@@ -0,0 +1,71 @@
+import numpy as np
+
+
+def top_k(scores, k, exclude=None):
+    """Indices of the k highest scores, best first
+
+    Selection runs in O(n + k log k) through np.partition instead of a full
+    O(n log n) sort. Ties go to the lower index, so results are stable.
+    exclude is a boolean mask or an index array of items that must never be
+    returned (already rated or blocked); -inf scores are never returned
+    either, so fewer than k indices may come back.
+    """
+    scores = np.asarray(scores)
+    if exclude is not None:
+        exclude = np.asarray(exclude)
+        if exclude.dtype == bool:
+            scores = np.where(exclude, -np.inf, scores)
+        else:
+            scores = scores.astype(np.float64)
+            scores[exclude] = -np.inf
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < n:
+        # Everything above the k-th best value, then the lowest-index ties
+        threshold = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    result = candidates[order]
+    return result[scores[result] > -np.inf]
+
+
+def top_k_rows(scores, k, exclude=None):
+    """Row-wise top_k for a 2-D block of scores
+
+    Returns an (n_rows x k) index array, best first with ties to the lower
+    index. exclude is an optional boolean mask of the same shape; slots a
+    row cannot fill with an eligible score hold -1.
+    """
+    scores = np.asarray(scores)
+    if exclude is not None:
+        scores = np.where(exclude, -np.inf, scores)
+    n_rows, n = scores.shape
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+
+    # Per-row threshold, then exactly k picks: all scores above it plus the
+    # first ties in index order. Usually nothing ties with the threshold,
+    # so only rows with surplus ties pay for the running count
+    threshold = np.partition(scores, n - k, axis=1)[:, n - k, None]
+    selected = scores >= threshold
+    surplus = np.flatnonzero(selected.sum(axis=1) > k)
+    if len(surplus):
+        rows = scores[surplus]
+        ties = rows == threshold[surplus]
+        needed = k - (rows > threshold[surplus]).sum(axis=1, keepdims=True)
+        selected[surplus] &= ~ties | (np.cumsum(ties, axis=1) <= needed)
+    cols = np.nonzero(selected)[1].reshape(n_rows, k)
+
+    values = np.take_along_axis(scores, cols, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    top = np.take_along_axis(cols, order, axis=1)
+    return np.where(np.take_along_axis(values, order, axis=1) > -np.inf, top, -1)